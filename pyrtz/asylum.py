@@ -2,13 +2,22 @@ import igor2.binarywave as bw
 import numpy as np
 import pandas as pd
 import pyrtz.curves
+import pyrtz.utils
 import re
 import os
+import json
+import struct
+import time
+import io
+import zipfile
+import tarfile
+import functools
+import hashlib
+import collections
+
+def _parse_notes(note_raw):
+    '''Utility function for processing the raw bytes of the 'notes' section of a .ibw file, the end user should not call this function'''
 
-def _get_notes(wave):
-    '''Utility function for processing the 'notes' section of a .ibw file, the end user should not call this function'''
-    
-    note_raw=wave['wave']['note']
     note_raw=note_raw.replace(b'\xb0',b'deg') #Asylum seems to store the degree sign in a broken way that python can't parse, replace all occurances of this invalid byte sequence with 'deg'
     all_notes=note_raw.split(b'\r')
     note_dict=dict()
@@ -19,6 +28,85 @@ def _get_notes(wave):
         note_dict[key.decode()]=value.decode()
     return note_dict
 
+def _get_notes(wave):
+    '''Utility function for processing the 'notes' section of a .ibw file, the end user should not call this function'''
+    
+    return _parse_notes(wave['wave']['note'])
+
+#Igor number type codes, see Wavemetrics technical note 003
+_ibw_types={2:np.float32,4:np.float64,8:np.int8,0x10:np.int16,0x20:np.int32,
+            0x48:np.uint8,0x50:np.uint16,0x60:np.uint32}
+
+def _read_ibw_header(raw):
+    '''Utility function for decoding the binary and wave headers of a version 5 .ibw file, the end user should not call this function
+
+    raw should contain (at least) the first 384 bytes of the file. Returns a
+    dict describing the layout of the file or None if this is not a version
+    5 binary wave'''
+
+    if len(raw)<384:
+        return None
+    for byte_order in '<>':
+        if struct.unpack(byte_order+'h',raw[:2])[0]==5:
+            break
+    else:
+        return None
+
+    (version,checksum,wfm_size,formula_size,note_size,data_e_units_size,*rest)=struct.unpack(byte_order+'hhiiii4i4iiii',raw[:64])
+    dim_e_units_size=rest[0:4]
+    dim_labels_size=rest[4:8]
+    npnts,=struct.unpack_from(byte_order+'i',raw,64+12)
+    wave_type,=struct.unpack_from(byte_order+'h',raw,64+16)
+    n_dim=struct.unpack_from(byte_order+'4i',raw,64+68)
+    sfA=struct.unpack_from(byte_order+'4d',raw,64+84)
+
+    note_offset=64+wfm_size+formula_size
+    labels_offset=note_offset+note_size+data_e_units_size+sum(dim_e_units_size)
+    return dict(byte_order=byte_order,
+                npnts=npnts,
+                type=wave_type,
+                shape=tuple([n for n in n_dim if n>0]),
+                sfA=sfA,
+                data_offset=384,
+                data_size=wfm_size-320,
+                note_offset=note_offset,
+                note_size=note_size,
+                labels_offset=labels_offset,
+                dim_labels_size=dim_labels_size)
+
+def load_ibw_notes(filename)->dict:
+    '''Load only the notes section of a .ibw file without
+    decoding the force curve itself
+
+    --------------------Arguments--------------------
+    filename: File path to load. Should be a .ibw 
+    file created by an Asylum AFM
+
+    ---------------------Returns---------------------
+    A dict containing the information stored in the
+    notes section of the file, the same as the
+    parameters attribute of the Curve returned by
+    load_ibw'''
+
+    return _read_ibw_metadata(filename)[0]
+
+def _read_ibw_metadata(filename):
+    '''Utility function for reading the notes and header of a .ibw file, the end user should not call this function
+
+    Returns a (notes,header) tuple'''
+
+    with open(filename,'rb') as f:
+        header=_read_ibw_header(f.read(384))
+        if header is not None:
+            f.seek(header['note_offset'])
+            return _parse_notes(f.read(header['note_size'])),header
+
+    #not a version 5 file, fall back to a full decode
+    wave=bw.load(filename)
+    wave_header=wave['wave']['wave_header']
+    header=dict(npnts=wave_header['npnts'],shape=wave['wave']['wData'].shape,sfA=wave_header['sfA'])
+    return _get_notes(wave),header
+
 def _get_data(wave):
     '''Utility function for processing the 'data' section of a .ibw file, the end user should not call this function'''
     
@@ -32,26 +120,260 @@ def _get_data(wave):
     wave_frame.loc[:,'ind']=wave_frame.z-wave_frame.defl
     return wave_frame
 
-def load_ibw(filename)->pyrtz.curves.Curve:
+def _parse_ibw_igor2(filename):
+    '''Utility function for decoding a .ibw file into its data columns and notes using igor2, the end user should not call this function'''
+
+    wave=bw.load(filename)
+    data=_get_data(wave)
+    notes=_get_notes(wave)
+
+    sample_time=wave['wave']['wave_header']['sfA'][0]
+    t=np.arange(data.shape[0])*sample_time
+    data.loc[:,'t']=t
+
+    k=float(notes['SpringConstant'])
+    data.loc[:,'f']=data.loc[:,'defl']*k
+    return data,notes
+
+def _parse_ibw_native(buf):
+    '''Utility function for decoding a version 5 .ibw file held in a uint8 array, the end user should not call this function
+
+    The rawz, z and defl columns of the returned DataFrame are views into buf.
+    Returns None if buf does not hold a 2D, real valued version 5 wave'''
+
+    header=_read_ibw_header(buf[:384].tobytes())
+    if header is None or len(header['shape'])!=2 or header['type'] not in _ibw_types:
+        return None
+    n_rows,n_cols=header['shape']
+
+    #Igor stores multidimensional waves in column-major order, so each column is contiguous
+    dtype=np.dtype(_ibw_types[header['type']]).newbyteorder(header['byte_order'])
+    if header['data_size']<n_rows*n_cols*dtype.itemsize:
+        return None
+    w_data=np.ndarray(shape=(n_cols,n_rows),dtype=dtype,buffer=buf,offset=header['data_offset'])
+
+    note_start=header['note_offset']
+    notes=_parse_notes(buf[note_start:note_start+header['note_size']].tobytes())
+
+    #dimension labels are 32 byte null-terminated chunks, the first is the label of the dimension itself
+    labels_start=header['labels_offset']+header['dim_labels_size'][0]
+    labels_raw=buf[labels_start:labels_start+header['dim_labels_size'][1]].tobytes()
+    labels=[labels_raw[i:i+32].split(b'\x00',1)[0].decode() for i in range(0,len(labels_raw),32)]
+    labels=[a for a in labels if a]
+    try:
+        rawz=w_data[labels.index('Raw')]
+        defl=w_data[labels.index('Defl')]
+        z=w_data[labels.index('ZSnsr')]
+    except (ValueError,IndexError):
+        return None
+
+    k=float(notes['SpringConstant'])
+    data=pd.DataFrame(dict(rawz=rawz,z=z,defl=defl,
+                           ind=z-defl,
+                           t=np.arange(n_rows)*header['sfA'][0],
+                           f=defl*np.asarray(k,dtype=defl.dtype)),copy=False)
+    return data,notes
+
+def _parse_ibw(filename,engine='native',mmap=False):
+    '''Utility function for decoding a .ibw file into its data columns and notes, the end user should not call this function'''
+
+    if engine=='native':
+        #a mapping holds a file descriptor for as long as the curve lives, so it is only used on request.
+        #copy-on-write, changes to the curve never reach the file
+        buf=np.memmap(filename,dtype=np.uint8,mode='c') if mmap else np.fromfile(filename,dtype=np.uint8)
+        parsed=_parse_ibw_native(buf)
+        if parsed is not None:
+            return parsed
+    elif engine!='igor2':
+        raise Exception(f"engine must be 'native' or 'igor2', not {engine}")
+    return _parse_ibw_igor2(filename)
+
+#Directory used to cache parsed .ibw files, see set_cache_dir
+_cache_dir=os.path.abspath(os.environ['PYRTZ_CACHE_DIR']) if os.environ.get('PYRTZ_CACHE_DIR') else None
+
+#Version of the layout of cache entries, entries written with another layout are parsed again
+_cache_format_version=3
+
+def get_cache_dir():
+    '''Get the directory used to cache parsed .ibw files
+
+    ---------------------Returns---------------------
+    The path of the cache directory, or None if
+    caching is disabled'''
+
+    return _cache_dir
+
+def set_cache_dir(cache_dir):
+    '''Set the directory used to cache parsed .ibw files.
+    Once set, load_ibw and load_curveset_ibw store the
+    decoded columns and notes of every file they parse
+    in this directory and reuse them the next time
+    the same file is loaded.
+    Entries are keyed by the path, size and modification
+    time of the original file, so edited files are
+    parsed again. The initial cache directory is read
+    from the PYRTZ_CACHE_DIR environment variable when
+    pyrtz is imported. load_curveset_ibw passes the
+    cache directory to its worker processes
+
+    --------------------Arguments--------------------
+    cache_dir: Path to a directory to hold the cache,
+    it is created if it does not exist. None disables
+    caching
+
+    ---------------------Returns---------------------
+    None'''
+
+    global _cache_dir
+    if cache_dir is None:
+        _cache_dir=None
+    else:
+        os.makedirs(cache_dir,exist_ok=True)
+        _cache_dir=os.path.abspath(cache_dir)
+
+def clear_cache():
+    '''Delete every entry in the parsed .ibw cache
+
+    ---------------------Returns---------------------
+    None'''
+
+    cache_dir=get_cache_dir()
+    if cache_dir is None or not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if name.endswith('.npy') or name.endswith('.json'):
+            os.remove(os.path.join(cache_dir,name))
+
+def _cache_path(cache_dir,filename,member=None):
+    '''Utility function for finding the cache entry of a .ibw file (or a member of an archive), the end user should not call this function'''
+
+    stat=os.stat(filename)
+    key=f'{os.path.abspath(filename)}|{stat.st_size}|{stat.st_mtime_ns}'
+    if member is not None:
+        key=f'{key}|{member}'
+    return os.path.join(cache_dir,hashlib.sha1(key.encode()).hexdigest())
+
+def _read_cache(entry,mmap=False):
+    '''Utility function for loading a cached .ibw file, the end user should not call this function'''
+
+    if not os.path.exists(entry+'.json'):
+        return None
+    try:
+        with open(entry+'.json','rt') as nf:
+            index=json.load(nf)
+        if index.get('version')!=_cache_format_version:
+            return None
+        #a mapping holds a file descriptor for as long as the curve lives, so it is only used on request.
+        #copy-on-write, changes to the curve never reach the cache file
+        raw=np.load(entry+'.npy',mmap_mode='c' if mmap else None,allow_pickle=False)
+        #every column is a contiguous region of the entry, viewed without copying
+        columns={name:raw[offset:offset+length*np.dtype(dtype).itemsize].view(dtype) for name,dtype,offset,length in index['columns']}
+    except FileNotFoundError:
+        #removed by clear_cache (or another process) while being read
+        return None
+    except (EOFError,ValueError,KeyError,TypeError):
+        #a corrupt or incomplete entry, it is parsed again and replaced
+        return None
+    data=pd.DataFrame(columns,copy=False)
+    return data,index['notes']
+
+def _write_cache(entry,data,notes):
+    '''Utility function for storing a parsed .ibw file in the cache, the end user should not call this function'''
+
+    #the columns are stored back to back, each starting on an aligned byte
+    columns=[]
+    arrays=[]
+    offset=0
+    for c in data.columns:
+        array=np.ascontiguousarray(data[c].to_numpy())
+        offset=-(-offset//16)*16
+        columns.append([str(c),array.dtype.str,offset,len(array)])
+        arrays.append(array)
+        offset+=array.nbytes
+    raw=np.zeros(offset,dtype=np.uint8)
+    for (name,dtype,start,length),array in zip(columns,arrays):
+        raw[start:start+array.nbytes]=array.view(np.uint8)
+
+    #write to temporary files first so concurrent loaders never see a partial entry
+    tmp=f'{entry}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(entry),exist_ok=True)
+        with open(tmp,'wb') as cf:
+            np.save(cf,raw)
+        os.replace(tmp,entry+'.npy')
+        #written last, an entry without a matching index is never read
+        with open(tmp,'wt') as nf:
+            json.dump(dict(version=_cache_format_version,columns=columns,notes=notes),nf)
+        os.replace(tmp,entry+'.json')
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def _resolve_cache_dir(use_cache,cache_dir):
+    '''Utility function for choosing the cache directory a load uses, the end user should not call this function'''
+
+    if not use_cache:
+        return None
+    return cache_dir if cache_dir is not None else get_cache_dir()
+
+def load_ibw(filename,use_cache=True,engine='native',dtype=None,compact=False,cache_dir=None,mmap=False)->pyrtz.curves.Curve:
     '''Load a .ibw file as a Curve object
 
     --------------------Arguments--------------------
     filename: File path to load. Should be a .ibw 
     file created by an Asylum AFM
 
+    use_cache: If True and a cache directory has been
+    set with pyrtz.asylum.set_cache_dir, reuse (or
+    create) the cached copy of this file
+
+    engine: Either 'native' or 'igor2'. The native
+    reader reads the file once and builds the curve on
+    views of the stored data without copying it again.
+    Files it cannot read (such as older wave versions)
+    are passed to igor2 automatically
+
+    dtype: A numpy dtype (for example 'float32') to
+    store every column of the curve in. None keeps the
+    dtype used in the file
+
+    compact: If True, return a pyrtz.curves.CompactCurve
+    which stores its columns as numpy arrays instead of
+    a pandas.DataFrame
+
+    cache_dir: The cache directory to use. None uses
+    the directory set with pyrtz.asylum.set_cache_dir
+
+    mmap: If True, the native reader memory maps the
+    file (or its cache entry) instead of reading it.
+    The curve then holds
+    an open file descriptor for as long as it exists,
+    so loading many mapped curves can exceed the
+    limit on open files
+
     ---------------------Returns---------------------
     A pyrtz.cuves.Curve object which contains the 
     force curve stored in the .ibw file located at 
     filename.'''
     
-    wave=bw.load(filename)
-    data=_get_data(wave)
-    notes=_get_notes(wave)
-    trigger_index=np.argmax(data.loc[:,'defl'])
+    cache_dir=_resolve_cache_dir(use_cache,cache_dir)
+    parsed=None
+    if cache_dir is not None:
+        entry=_cache_path(cache_dir,filename)
+        parsed=_read_cache(entry,mmap)
+    if parsed is None:
+        parsed=_parse_ibw(filename,engine,mmap)
+        if cache_dir is not None:
+            _write_cache(entry,*parsed)
+    return _curve_from_parsed(filename.split(os.path.sep)[-1],*parsed,dtype,compact)
 
-    sample_time=wave['wave']['wave_header']['sfA'][0]
-    t=np.arange(data.shape[0])*sample_time
-    data.loc[:,'t']=t
+def _curve_from_parsed(filename,data,notes,dtype=None,compact=False):
+    '''Utility function for building a Curve from decoded .ibw data and notes, the end user should not call this function'''
+
+    if dtype is not None:
+        data=data.astype(dtype,copy=False)
+
+    trigger_index=np.argmax(data.loc[:,'defl'])
 
     dwell_time=float(notes['DwellTime'])
     dwell_start_time=data.loc[trigger_index,'t']
@@ -60,21 +382,221 @@ def load_ibw(filename)->pyrtz.curves.Curve:
     dwell_end_index=np.argmin(np.abs(data.loc[:,'t']-dwell_end_time))
     dwell_range=[trigger_index,dwell_end_index]
     k=float(notes['SpringConstant'])
-
-    data.loc[:,'f']=data.loc[:,'defl']*k
     
     invOLS=float(notes['InvOLS'])
 
-    this_curve=pyrtz.curves.Curve(filename=filename.split(os.path.sep)[-1],data=data,parameters=notes,z_col='z',t_col='t',f_col='f',ind_col='ind',invOLS=invOLS,k=k,dwell_range=dwell_range)
+    if compact:
+        columns={str(c):data[c].to_numpy() for c in data.columns}
+        return pyrtz.curves.CompactCurve(filename=filename,columns=columns,parameters=notes,z_col='z',t_col='t',f_col='f',ind_col='ind',invOLS=invOLS,k=k,dwell_range=dwell_range)
+
+    this_curve=pyrtz.curves.Curve(filename=filename,data=data,parameters=notes,z_col='z',t_col='t',f_col='f',ind_col='ind',invOLS=invOLS,k=k,dwell_range=dwell_range)
     
     return this_curve
 
-def load_curveset_ibw(folder,ident_labels)->pyrtz.curves.CurveSet:
+def _parse_ibw_bytes(raw,engine='native'):
+    '''Utility function for decoding a .ibw file which has already been read into memory, the end user should not call this function'''
+
+    if engine=='native':
+        #bytearray so the resulting columns are writable
+        parsed=_parse_ibw_native(np.frombuffer(bytearray(raw),dtype=np.uint8))
+        if parsed is not None:
+            return parsed
+    elif engine!='igor2':
+        raise Exception(f"engine must be 'native' or 'igor2', not {engine}")
+    return _parse_ibw_igor2(io.BytesIO(raw))
+
+#The most zip archives kept open between member reads, see close_archives
+max_open_zips=8
+
+#ZipFile objects already opened, keyed by (process id,path,modification time), least
+#recently used first. The process id keeps forked workers from sharing (and corrupting)
+#the parent's file handle
+_open_zips=collections.OrderedDict()
+
+def _get_zip(archive_path):
+    '''Utility function for reusing an open zip archive between member reads, the end user should not call this function'''
+
+    path=os.path.abspath(archive_path)
+    key=(os.getpid(),path,os.stat(archive_path).st_mtime_ns)
+    if key in _open_zips:
+        _open_zips.move_to_end(key)
+        return _open_zips[key]
+    #handles of an older version of the archive, or inherited from the parent process, are never used again
+    for old in [k for k in _open_zips if k[1]==path or k[0]!=key[0]]:
+        _open_zips.pop(old).close()
+    _open_zips[key]=zipfile.ZipFile(archive_path)
+    while len(_open_zips)>max_open_zips:
+        _open_zips.popitem(last=False)[1].close()
+    return _open_zips[key]
+
+def close_archives(archive_path=None):
+    '''Close the zip archives kept open by this process to
+    read their members. Lazily loaded CurveSets read from a
+    zip archive keep it open (at most max_open_zips
+    archives at once) until this is called; it is reopened
+    if another curve is read
+
+    --------------------Arguments--------------------
+    archive_path: The path of the archive to close. None
+    closes every open archive
+
+    ---------------------Returns---------------------
+    None'''
+
+    path=None if archive_path is None else os.path.abspath(archive_path)
+    for key in [k for k in _open_zips if path is None or k[1]==path]:
+        _open_zips.pop(key).close()
+
+def load_ibw_zip_member(source,use_cache=True,engine='native',dtype=None,compact=False,cache_dir=None,mmap=False)->pyrtz.curves.Curve:
+    '''Load a single .ibw file stored in a zip archive as a
+    Curve object without extracting it
+
+    --------------------Arguments--------------------
+    source: A two entry tuple containing the path of
+    the zip archive and the name of the member to load
+
+    use_cache: If True and a cache directory has been
+    set with pyrtz.asylum.set_cache_dir, reuse (or
+    create) the cached copy of this member
+
+    engine: Either 'native' or 'igor2', as for load_ibw
+
+    dtype: A numpy dtype to store every column of the
+    curve in. None keeps the dtype used in the file
+
+    compact: If True, return a pyrtz.curves.CompactCurve
+
+    cache_dir: The cache directory to use. None uses
+    the directory set with pyrtz.asylum.set_cache_dir
+
+    mmap: If True, memory map the cache entry of this
+    member instead of reading it, as for load_ibw.
+    Members themselves are always read into memory
+
+    ---------------------Returns---------------------
+    A pyrtz.cuves.Curve object which contains the 
+    force curve stored in the archive member'''
+
+    archive_path,member=source
+    cache_dir=_resolve_cache_dir(use_cache,cache_dir)
+    parsed=None
+    if cache_dir is not None:
+        entry=_cache_path(cache_dir,archive_path,member)
+        parsed=_read_cache(entry,mmap)
+    if parsed is None:
+        parsed=_parse_ibw_bytes(_get_zip(archive_path).read(member),engine)
+        if cache_dir is not None:
+            _write_cache(entry,*parsed)
+    return _curve_from_parsed(member.split('/')[-1],*parsed,dtype,compact)
+
+def _match_ident_files(filenames,ident_labels):
+    '''Utility function for matching filenames against a list of ident_labels, the end user should not call this function
+
+    Returns a list of (idents,filename) tuples sorted by filename so that
+    the resulting CurveSet is the same regardless of directory order'''
+
+    regex_str=""
+    for l in ident_labels:
+        regex_str=regex_str+l+f'(?P<{l}>.*)'
+    regex_str=regex_str+r'\.ibw'
+    regex=re.compile(regex_str)
+
+    matched=[]
+    for filename in sorted(filenames):
+        m=regex.match(filename)
+        if not m:
+            continue
+        idents=tuple([m.group(a) for a in ident_labels])
+        matched.append((idents,m.group(0)))
+    return matched
+
+def _load_or_error(task):
+    '''Utility function for loading a single curve inside a worker pool, the end user should not call this function
+
+    task is a (loader,source) tuple. Returns a (curve,exception) tuple,
+    exactly one of which is None'''
+
+    loader,source=task
+    try:
+        return loader(source),None
+    except Exception as e:
+        return None,e
+
+def _match_archive_members(archive_path,ident_labels):
+    '''Utility function for matching the members of a zip or tar archive against a list of ident_labels, the end user should not call this function
+
+    Members are matched on their name without any leading directories.
+    Returns a (kind,matched) tuple where kind is 'zip' or 'tar' and matched
+    is a list of (idents,member) tuples'''
+
+    if zipfile.is_zipfile(archive_path):
+        kind='zip'
+        with zipfile.ZipFile(archive_path) as zf:
+            names=[info.filename for info in zf.infolist() if not info.is_dir()]
+    elif tarfile.is_tarfile(archive_path):
+        kind='tar'
+        with tarfile.open(archive_path) as tf:
+            names=[info.name for info in tf.getmembers() if info.isfile()]
+    else:
+        raise Exception(f'{archive_path} is not a directory, zip archive or tar archive')
+
+    by_basename=dict()
+    for name in sorted(names):
+        by_basename.setdefault(name.split('/')[-1],name)
+    matched=[]
+    for idents,filename in _match_ident_files(by_basename.keys(),ident_labels):
+        if filename in by_basename:
+            matched.append((idents,by_basename[filename]))
+    return kind,matched
+
+def _iter_tar_curves(archive_path,members,load_kwargs):
+    '''Utility function for decoding the requested members of a tar archive in a single streaming pass, the end user should not call this function
+
+    Members found in the cache are read from it first, the archive is only
+    opened if some are missing. Yields (member,(curve,exception)) tuples'''
+
+    cache_dir=_resolve_cache_dir(load_kwargs.get('use_cache',True),load_kwargs.get('cache_dir'))
+    engine=load_kwargs.get('engine','native')
+
+    def build(member,parsed):
+        return _curve_from_parsed(member.split('/')[-1],*parsed,load_kwargs.get('dtype'),load_kwargs.get('compact',False))
+
+    wanted=set()
+    for member in members:
+        parsed=None if cache_dir is None else _read_cache(_cache_path(cache_dir,archive_path,member),load_kwargs.get('mmap',False))
+        if parsed is None:
+            wanted.add(member)
+            continue
+        try:
+            yield member,(build(member,parsed),None)
+        except Exception as e:
+            yield member,(None,e)
+    if not wanted:
+        return
+    #stream mode, compressed archives are decompressed exactly once
+    with tarfile.open(archive_path,'r|*') as tf:
+        for info in tf:
+            if info.name not in wanted:
+                continue
+            try:
+                parsed=_parse_ibw_bytes(tf.extractfile(info).read(),engine)
+                if cache_dir is not None:
+                    _write_cache(_cache_path(cache_dir,archive_path,info.name),*parsed)
+                yield info.name,(build(info.name,parsed),None)
+            except Exception as e:
+                yield info.name,(None,e)
+
+def load_curveset_ibw(folder,ident_labels,workers=1,executor='process',on_error='raise',lazy=False,cache_size=128,**load_kwargs)->pyrtz.curves.CurveSet:
     '''Load a folder of .ibw files as a pyrtz.curves.CurveSet
 
     --------------------Arguments--------------------
     folder: Path to a directory containing .ibw files
-    created by an Asylum AFM to be loaded
+    created by an Asylum AFM to be loaded. This can
+    also be the path of a zip or tar archive (optionally
+    compressed) containing the .ibw files, which are
+    then read straight from the archive without
+    extracting it. Files in subdirectories of an
+    archive are matched on their name alone
 
     ident_labels: A list of character sequences always
     found (in the order given) in the files of
@@ -92,29 +614,358 @@ def load_curveset_ibw(folder,ident_labels)->pyrtz.curves.CurveSet:
     pyrtz.asylum.load_curveset_ibw('~/experiment',
     ['Sample','Measurement'])
 
+    workers: The number of workers used to load files.
+    The default of 1 loads every file in the calling
+    process, None uses one worker per available cpu
+
+    executor: Either 'process' or 'thread', the kind of
+    worker pool used when workers is not 1
+
+    on_error: Either 'raise' or 'record'. If 'raise',
+    the first file which cannot be loaded raises an
+    exception. If 'record', files which cannot be
+    loaded are left out of the CurveSet and the
+    exceptions are stored in its load_errors
+    attribute, keyed by unique identifier
+
+    lazy: If True, only index the matching files and
+    parse each one the first time its curve is
+    accessed. workers, executor and on_error are
+    ignored in this mode, errors are raised on access
+
+    cache_size: When lazy is True, the maximum number
+    of parsed curves kept in memory. The least recently
+    used curves are dropped past this limit; their
+    contact points and fit results are kept. Lazy
+    loading is not available for tar archives
+
+    load_kwargs: Additional keyword arguments passed
+    to pyrtz.asylum.load_ibw, such as dtype or compact
+
+    Members of zip archives are decoded by the worker
+    pool like ordinary files. Tar archives can only be
+    read sequentially, so their members are decoded in
+    a single streaming pass in the calling process.
+    Members of both kinds of archive are cached like
+    ordinary files (see set_cache_dir). Lazily loaded
+    zip archives stay open until
+    pyrtz.asylum.close_archives is called
+
     ---------------------Returns---------------------
     A pyrtz.curves.CurveSet object containing all
     force curves with matching filenames contained
     in the directory located at folder'''
     
+    if on_error not in ('raise','record'):
+        raise Exception(f"on_error must be 'raise' or 'record', not {on_error}")
+
     ident_labels=tuple(ident_labels)
-    regex_str=""
-    for l in ident_labels:
-        regex_str=regex_str+l+f'(?P<{l}>.*)'
-    regex_str=regex_str+'\.ibw'
-    regex=re.compile(regex_str)
-    
-    all_filenames=os.listdir(folder)
-    all_matches=[regex.match(a) for a in all_filenames]
+    if load_kwargs.get('use_cache',True) and load_kwargs.get('cache_dir') is None and get_cache_dir() is not None:
+        #worker processes do not share the settings of this process
+        load_kwargs['cache_dir']=get_cache_dir()
+    if os.path.isdir(folder):
+        kind='folder'
+        matched=_match_ident_files(os.listdir(folder),ident_labels)
+        sources=[os.path.join(folder,filename) for idents,filename in matched]
+        loader=functools.partial(load_ibw,**load_kwargs) if load_kwargs else load_ibw
+    else:
+        kind,matched=_match_archive_members(folder,ident_labels)
+        sources=[(folder,member) for idents,member in matched]
+        loader=functools.partial(load_ibw_zip_member,**load_kwargs) if load_kwargs else load_ibw_zip_member
+
+    if lazy:
+        if kind=='tar':
+            raise Exception('Lazy loading is not supported for tar archives, use a zip archive or a folder instead')
+        curve_dict=pyrtz.curves.LazyCurveDict({idents:source for (idents,name),source in zip(matched,sources)},loader,cache_size)
+        this_curveset=pyrtz.curves.CurveSet(ident_labels=ident_labels,curve_dict=curve_dict)
+        this_curveset.load_errors=dict()
+        return this_curveset
+
+    if kind=='tar':
+        by_member=dict(_iter_tar_curves(folder,[member for idents,member in matched],load_kwargs))
+        results=[by_member[member] for idents,member in matched]
+    else:
+        results=pyrtz.utils.map_parallel(_load_or_error,[(loader,source) for source in sources],workers,executor)
+        if kind=='zip':
+            #every member has been read, do not keep the archive open
+            close_archives(folder)
 
     curve_dict=dict()
-    for m in all_matches:
-        if not m:
+    load_errors=dict()
+    for (idents,name),(curve,error) in zip(matched,results):
+        if error is not None:
+            if on_error=='raise':
+                raise error
+            load_errors[idents]=error
             continue
-        idents=tuple([m.group(a) for a in ident_labels])
-        filename=m.group(0)
-        filepath=os.path.join(folder,filename)
-        curve_dict[idents]=load_ibw(filepath)
+        curve_dict[idents]=curve
 
     this_curveset=pyrtz.curves.CurveSet(ident_labels=ident_labels,curve_dict=curve_dict)
+    this_curveset.load_errors=load_errors
     return this_curveset
+
+def _scan_row(filepath):
+    '''Utility function for reading the metadata of a single file inside a worker pool, the end user should not call this function'''
+
+    notes,header=_read_ibw_metadata(filepath)
+    row=dict(n_samples=header['shape'][0] if header['shape'] else 0,
+             sample_time=header['sfA'][0])
+    row.update(notes)
+    return row
+
+def scan_curveset_ibw(folder,ident_labels,workers=1,executor='thread')->pd.DataFrame:
+    '''Read the notes section of every matching .ibw file
+    in a folder without loading the force curves. This is
+    much faster than load_curveset_ibw and can be used to
+    decide which curves to analyze
+
+    --------------------Arguments--------------------
+    folder: Path to a directory containing .ibw files
+    created by an Asylum AFM
+
+    ident_labels: A list of character sequences always
+    found (in the order given) in the files of
+    interest in folder, as for load_curveset_ibw
+
+    workers: The number of workers used to read files.
+    The default of 1 reads every file in the calling
+    process, None uses one worker per available cpu
+
+    executor: Either 'process' or 'thread', the kind of
+    worker pool used when workers is not 1
+
+    ---------------------Returns---------------------
+    A pandas.DataFrame with one row per file, one
+    column per ident_label, a filename column, the
+    number of samples and sample interval of each curve
+    and one column per entry in the notes section.
+    Columns whose values are all numbers (such as
+    SpringConstant, InvOLS or DwellTime) are converted
+    to numeric types'''
+
+    ident_labels=tuple(ident_labels)
+    matched=_match_ident_files(os.listdir(folder),ident_labels)
+    filepaths=[os.path.join(folder,filename) for idents,filename in matched]
+
+    rows=pyrtz.utils.map_parallel(_scan_row,filepaths,workers,executor)
+    for (idents,filename),row in zip(matched,rows):
+        row.pop('',None)
+        for label,ident in zip(ident_labels,idents):
+            row[label]=ident
+        row['filename']=filename
+
+    first_cols=[*ident_labels,'filename','n_samples','sample_time']
+    table=pd.DataFrame(rows)
+    if table.empty:
+        return pd.DataFrame(columns=first_cols)
+    table=table.loc[:,first_cols+[c for c in table.columns if c not in first_cols]]
+    for col in table.columns[len(ident_labels)+1:]:
+        try:
+            table[col]=pd.to_numeric(table[col])
+        except (ValueError,TypeError):
+            pass
+    return table
+
+class CurveSetWatcher:
+    '''Grow a CurveSet from a folder which is still being
+    written to by the AFM'''
+
+    #Curve methods which need a contact point, one is detected before they are run on a new curve
+    contact_methods=('correct_virt_defl','fit_stiffness','contact_sensitivity','fit_range_sweep')
+
+    def __init__(self,folder,ident_labels,curveset=None,fits=None,settle_time=1.0,max_retries=3,**load_kwargs):
+        '''Construct a new pyrtz.asylum.CurveSetWatcher. New
+        files are only picked up when poll or watch is called
+
+        --------------------Arguments--------------------
+        folder: Path to the directory the AFM is writing
+        .ibw files into
+
+        ident_labels: A list of character sequences always
+        found (in the order given) in the files of
+        interest in folder, as for load_curveset_ibw
+
+        curveset: An existing pyrtz.curves.CurveSet to add
+        new curves to. If None, a new, empty CurveSet is
+        created. Curves already in the CurveSet are not
+        loaded again
+
+        fits: A dict whose keys are names of Curve fit
+        methods and whose values are dicts of keyword
+        arguments for that method. Each fit is run on
+        every new curve as soon as it is loaded, in the
+        order given, e.g.
+        {'fit_biexponential':{},'fit_exponential':{}}.
+        New curves have no contact point, so one is found
+        with Curve.detect_contact_index before running any
+        of CurveSetWatcher.contact_methods, e.g.
+        {'correct_virt_defl':{},
+        'fit_stiffness':{'probe_diameter':5e-6}}. The
+        detected contact points can be reviewed later with
+        CurveSet.export_cp_annotations
+
+        settle_time: Files modified more recently than
+        this many seconds ago, or whose size is still
+        changing, are assumed to be incomplete and are
+        left for a later poll
+
+        max_retries: Files which cannot be loaded are tried
+        again on later polls, up to this many times in
+        total
+
+        load_kwargs: Additional keyword arguments passed
+        to pyrtz.asylum.load_ibw
+
+        ---------------------Returns---------------------
+        A new pyrtz.asylum.CurveSetWatcher object'''
+
+        self.folder=folder
+        self.ident_labels=tuple(ident_labels)
+        if curveset is None:
+            curveset=pyrtz.curves.CurveSet(ident_labels=self.ident_labels,curve_dict=dict())
+            curveset.load_errors=dict()
+        self.curveset=curveset
+        self.fits=fits if fits is not None else dict()
+        self.settle_time=settle_time
+        self.max_retries=max_retries
+        self.load_kwargs=load_kwargs
+        self.errors=dict()
+        self._seen=set(curveset.keys())
+        self._sizes=dict()
+        self._failures=dict()
+
+    def poll(self)->list:
+        '''Load every new, completely written file in the
+        folder, add it to self.curveset and run the
+        configured fits on it. Files which cannot be loaded
+        and fits which fail are recorded in self.errors,
+        a dict whose keys are unique identifiers and whose
+        values are dicts mapping 'load', the fit method name
+        or 'detect_contact_index' (in which case the fits
+        needing a contact point are skipped) to the
+        exception raised.
+        Files which cannot be loaded are tried again on the
+        next poll until max_retries attempts have failed
+
+        ---------------------Returns---------------------
+        A list of the unique identifiers of the curves
+        added by this call'''
+
+        now=time.time()
+        added=[]
+        for idents,filename in _match_ident_files(os.listdir(self.folder),self.ident_labels):
+            if idents in self._seen:
+                continue
+            filepath=os.path.join(self.folder,filename)
+            try:
+                stat=os.stat(filepath)
+            except OSError:
+                continue
+            previous_size=self._sizes.get(idents)
+            self._sizes[idents]=stat.st_size
+            if stat.st_size==0 or previous_size!=stat.st_size or now-stat.st_mtime<self.settle_time:
+                continue
+
+            self._sizes.pop(idents)
+            try:
+                curve=load_ibw(filepath,**self.load_kwargs)
+            except Exception as e:
+                self.errors[idents]={'load':e}
+                self._failures[idents]=self._failures.get(idents,0)+1
+                #the file may still be in use by the AFM software, try again on a later poll
+                if self._failures[idents]>=self.max_retries:
+                    self._seen.add(idents)
+                continue
+            self._seen.add(idents)
+            self._failures.pop(idents,None)
+            self.errors.pop(idents,None)
+            for method,kwargs in self.fits.items():
+                if method in self.contact_methods and not curve.contact_index:
+                    try:
+                        curve.detect_contact_index()
+                    except Exception as e:
+                        #the fit is skipped, it cannot run without a contact point
+                        self.errors.setdefault(idents,dict())['detect_contact_index']=e
+                        continue
+                try:
+                    getattr(curve,method)(**kwargs)
+                except Exception as e:
+                    self.errors.setdefault(idents,dict())[method]=e
+            self.curveset.add_curve(idents,curve)
+            added.append(idents)
+        return added
+
+    def watch(self,interval=5.0,idle_timeout=None,callback=None)->pyrtz.curves.CurveSet:
+        '''Repeatedly poll the folder until no new files
+        have appeared for idle_timeout seconds (or until
+        interrupted with Ctrl-C)
+
+        --------------------Arguments--------------------
+        interval: Number of seconds to wait between polls
+
+        idle_timeout: Stop watching after this many
+        seconds without a new curve. None watches until
+        interrupted
+
+        callback: A function called as
+        callback(curveset,new_keys) after every poll
+        which added at least one curve
+
+        ---------------------Returns---------------------
+        self.curveset, containing every curve loaded so
+        far'''
+
+        last_new=time.time()
+        try:
+            while True:
+                added=self.poll()
+                if added:
+                    last_new=time.time()
+                    if callback is not None:
+                        callback(self.curveset,added)
+                elif idle_timeout is not None and time.time()-last_new>idle_timeout:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        return self.curveset
+
+def watch_curveset_ibw(folder,ident_labels,fits=None,interval=5.0,idle_timeout=None,callback=None,**kwargs)->pyrtz.curves.CurveSet:
+    '''Load a folder of .ibw files as a pyrtz.curves.CurveSet
+    while the AFM is still acquiring, loading (and
+    optionally fitting) each curve shortly after its file
+    is written. This is a shortcut for creating a
+    pyrtz.asylum.CurveSetWatcher and calling its watch
+    method
+
+    --------------------Arguments--------------------
+    folder: Path to the directory the AFM is writing
+    .ibw files into
+
+    ident_labels: A list of character sequences always
+    found (in the order given) in the files of
+    interest in folder, as for load_curveset_ibw
+
+    fits: A dict whose keys are names of Curve fit
+    methods and whose values are dicts of keyword
+    arguments for that method, run on every new curve
+
+    interval: Number of seconds to wait between polls
+
+    idle_timeout: Stop watching after this many
+    seconds without a new curve. None watches until
+    interrupted with Ctrl-C
+
+    callback: A function called as
+    callback(curveset,new_keys) whenever new curves
+    are added
+
+    kwargs: Additional keyword arguments passed to
+    pyrtz.asylum.CurveSetWatcher
+
+    ---------------------Returns---------------------
+    A pyrtz.curves.CurveSet object containing every
+    curve loaded before watching stopped'''
+
+    watcher=CurveSetWatcher(folder,ident_labels,fits=fits,**kwargs)
+    return watcher.watch(interval,idle_timeout,callback)
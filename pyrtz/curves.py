@@ -1,14 +1,22 @@
 import pickle
+import collections.abc
 import pandas as pd
 from plotly import graph_objs as go
 from plotly import offline as py
 import numpy as np
 import json
 import ast
-import scipy.optimize
 from plotly import express as px
 import io
 import PyPDF2 as pdf
+import os
+import sys
+import uuid
+import weakref
+import multiprocessing.shared_memory
+import pyrtz.fitting
+import pyrtz.utils
+import pyrtz.fitcache
 
 dark_colors=['rgb(31, 119, 180)', 'rgb(255, 127, 14)',
              'rgb(44, 160, 44)', 'rgb(214, 39, 40)',
@@ -22,10 +30,108 @@ light_colors=['rgba(31, 119, 180, .2)', 'rgba(255, 127, 14, .2)',
               'rgba(227, 119, 194, .2)', 'rgba(127, 127, 127, .2)',
               'rgba(188, 189, 34, .2)', 'rgba(23, 190, 207, .2)']
 
+#Version of the on-disk format written by CurveSet.save
+curveset_format_version=1
+
+#CurveSet.save and open_curveset store these Curve attributes under these model names
+fit_models={'stiff':'stiff_fit','biexponential':'biexponential_fit','exponential':'exponential_fit'}
+
+#The number of curves whose stiffness fits CurveSet.fit_all_stiff solves together
+stiff_fit_block=256
+
+#The parameters of each model reported by CurveSet.get_*_results
+result_params={'stiff':['estar','estar_err'],
+               'biexponential':['tau1','tau2','tau_fast','tau_slow','A','C'],
+               'exponential':['tau0','C0']}
+
+#The Curve method which runs each model
+fit_methods={'stiff':'fit_stiffness','biexponential':'fit_biexponential','exponential':'fit_exponential'}
+
+def _fit_changed(curve):
+    '''Utility function for recording that a fit was run directly on a curve, the end user should not call this function'''
+
+    #CompactCurves pickled before track_fits existed do not have it
+    if getattr(curve,'track_fits',True):
+        curve.fit_generation=getattr(curve,'fit_generation',0)+1
+
+def _stiff_window(indent_raw,force_raw,fit_range):
+    '''Utility function for selecting the rows of a contact region used in a stiffness fit, the end user should not call this function
+
+    Returns (indent_norm_fit,force_norm_fit,imin,imax), the indentation and
+    force relative to the contact point of rows imin to imax of the contact
+    region'''
+
+    force_norm=np.asarray(force_raw,dtype=float)-force_raw[0]
+    imin,imax=pyrtz.fitting.hertz_window(force_norm,fit_range)
+    indent_norm_fit=np.asarray(indent_raw[imin:imax],dtype=float)-indent_raw[0]
+    return indent_norm_fit,force_norm[imin:imax],int(imin),int(imax)
+
+def _stiff_fit_curve(curve)->pd.DataFrame:
+    '''Utility function for evaluating the stiffness fit of a curve over the rows it was fit to, the end user should not call this function'''
+
+    fit=curve.stiff_fit
+    if 'curve' in fit:
+        return fit['curve']
+    if 'fit_start' not in fit:
+        raise Exception('The fitted curve is not available (this fit was saved by an older version of pyrtz). Run fit_stiffness again')
+    contact_index=int(fit['contact_index'])
+    approach_end=curve.dwell_range[0]+1
+    indent_raw=curve.get_array('ind')[contact_index:approach_end]
+    force_raw=curve.get_array('f')[contact_index:approach_end]
+    indent_fit=np.asarray(indent_raw[int(fit['fit_start']):int(fit['fit_stop'])],dtype=float)
+    force_fit=pyrtz.fitting.hertz_force(indent_fit-indent_raw[0],fit['estar'],fit['r'])+force_raw[0]
+    return pd.DataFrame(dict(ind=indent_fit,f=force_fit))
+
+def _dwell_fit_curve(dwell,t_col,f_col,model,fit)->pd.DataFrame:
+    '''Utility function for evaluating a fitted dwell region model at every time in the dwell region, the end user should not call this function'''
+
+    t_raw=dwell[t_col].to_numpy()
+    f0=dwell[f_col].to_numpy()[0]
+    #adjust time to start at zero when the dwell begins
+    t_norm=t_raw-t_raw[0]
+    if model=='biexponential':
+        f=pyrtz.fitting.biexponential_model(t_norm,f0,fit['tau1'],fit['tau2'],fit['A'],fit['C'])
+    else:
+        f=pyrtz.fitting.exponential_model(t_norm,f0,fit['tau0'],fit['C0'])
+    return pd.DataFrame(dict(t=dwell[t_col],f=f))
+
+def _warm_start_fit(fit_function,t_norm,f_raw,f0,p0,params):
+    '''Utility function for attempting a dwell region fit from supplied initial guesses, the end user should not call this function
+
+    Returns the fit dict, or None if the fit raised or produced non-finite
+    values for any of params'''
+
+    try:
+        fit=fit_function(t_norm,f_raw,f0,p0)
+    except Exception:
+        return None
+    if not np.all(np.isfinite([fit[name] for name in params])):
+        return None
+    fit['warm_start']=True
+    return fit
+
+def _warm_start_params(model,fit):
+    '''Utility function for extracting the initial guesses used to warm start a dwell region fit from an existing fit, the end user should not call this function
+
+    Returns None if fit is missing or not finite'''
+
+    if not fit:
+        return None
+    if model=='biexponential':
+        #order the rates so guesses from different curves can be combined
+        a_fast=fit['A'] if fit['tau1']>=fit['tau2'] else 1-fit['A']
+        params=[fit['tau_fast'],fit['tau_slow'],a_fast]
+    else:
+        params=[fit['tau0']]
+    params=np.asarray(params,dtype=float)
+    return params if np.all(np.isfinite(params)) else None
+
 class Curve:
     '''A class representing a single force curve'''
 
     contact_index=None
+    contact_confidence=None
+    virt_defl_fit=None
     approach_range=[]
     dwell_range=[]
     k=None
@@ -36,6 +142,10 @@ class Curve:
     stiff_fit=None
     biexponential_fit=None
     exponential_fit=None
+    #False for the temporary curves fit by workers, whose results are stored by the CurveSet itself
+    track_fits=True
+    #The number of fits run directly on this curve, see CurveSet._get_fit_table
+    fit_generation=0
 
     def __init__(self,filename,data,parameters,z_col,t_col,f_col,ind_col,invOLS,k,dwell_range):
         '''Construct a new pyrtz.curves.Curve object. This method should not be called
@@ -84,6 +194,17 @@ class Curve:
         self.cols={'z':z_col,'t':t_col,'f':f_col,'ind':ind_col}
         self.filename=filename
 
+    def get_array(self,col)->np.ndarray:
+        '''Get one column of the force curve as a numpy array
+
+        --------------------Arguments--------------------
+        col: One of 'z', 't', 'f' or 'ind'
+
+        ---------------------Returns---------------------
+        A numpy array containing the whole column'''
+
+        return self.data[self.cols[col]].to_numpy()
+
     def get_approach(self)->pd.DataFrame:
         '''Get the approach section of the force curve
 
@@ -127,6 +248,39 @@ class Curve:
 
         self.contact_index=cp
 
+    def detect_contact_index(self,baseline_fraction=0.25):
+        '''Automatically find the row index corresponding
+        to this curve's contact point and store it in
+        self.contact_index. A line is fit to the force before
+        contact (as in correct_virt_defl) and every row of
+        the approach is scored as the contact point, using a
+        model which is constant before contact and follows
+        the hertz model after it. See
+        pyrtz.fitting.detect_contact
+
+        --------------------Arguments--------------------
+
+        baseline_fraction: The fraction of the approach
+        used for the initial fit of the line before contact
+
+        ---------------------Returns---------------------
+
+        A (contact_index,confidence) tuple. The confidence,
+        between 0 and 1, is also stored in
+        self.contact_confidence. Curves with a low confidence
+        should be checked using pyrtz.annocp'''
+
+        approach_end=self.dwell_range[0]+1
+        contact_index,confidence=pyrtz.fitting.detect_contact(self.get_array('z')[:approach_end],
+                                                              self.get_array('ind')[:approach_end],
+                                                              self.get_array('f')[:approach_end],
+                                                              baseline_fraction)
+        if contact_index is None:
+            raise Exception('No contact point could be detected')
+        self.contact_index=contact_index
+        self.contact_confidence=confidence
+        return contact_index,confidence
+
     def correct_virt_defl(self):
         '''Correct for non-zero slope of approach curves
         before contact point. This function fits a line
@@ -136,22 +290,76 @@ class Curve:
         in place. Note: this function will only update
         the 'f' column of self.data.
 
+        The slope and intercept of the line (and the
+        contact point used) are stored in
+        self.virt_defl_fit. Calling this function again
+        with the same contact point does nothing, and with
+        a different contact point replaces the previous
+        correction rather than adding to it. The
+        uncorrected force is returned by get_raw_force
+
         ---------------------Returns---------------------
 
         None'''
 
         if self.contact_index==None:
             raise Exception('Contact index has not been set. Please update contact point annotations')
+        if self.virt_defl_fit is not None and self.virt_defl_fit['contact_index']==self.contact_index:
+            return
+
+        z=self.get_array('z')[:self.contact_index]
+        f=self.get_raw_force()[:self.contact_index]
+        slope,intercept=pyrtz.fitting.line_fit(z,f)
+        if not np.isfinite(slope):
+            raise Exception('There are not enough points before the contact point to correct the virtual deflection')
+        self._set_virt_defl(dict(slope=slope,intercept=intercept,contact_index=self.contact_index))
+
+    def get_raw_force(self)->np.ndarray:
+        '''Get the force before any correction by
+        correct_virt_defl
+
+        ---------------------Returns---------------------
+
+        A numpy array containing the uncorrected force
+        (to within rounding) at every row'''
+
+        f=self.get_array('f')
+        if self.virt_defl_fit is None:
+            return f
+        line=self.virt_defl_fit['slope']*self.get_array('z')+self.virt_defl_fit['intercept']
+        return (f+line).astype(f.dtype,copy=False)
+
+    def undo_virt_defl(self):
+        '''Remove the correction applied by
+        correct_virt_defl, restoring the raw force
+
+        ---------------------Returns---------------------
 
-        fit_data=self.data.iloc[:self.contact_index,:]
-        model_func=lambda x,m,b: m*x+b
-        x_data=fit_data.loc[:,self.cols['z']].to_numpy()
-        y_data=fit_data.loc[:,self.cols['f']].to_numpy()
-        popt,pconv=scipy.optimize.curve_fit(model_func,x_data,y_data)
+        None'''
+
+        if self.virt_defl_fit is not None:
+            self._set_virt_defl(None)
+
+    def _set_virt_defl(self,virt_defl_fit):
+        '''Utility function for replacing the virtual deflection correction applied to the force, the end user should not call this function
 
-        f_line=model_func(self.data.loc[:,self.cols['z']],*popt)
+        virt_defl_fit is a dict containing the slope and intercept of the new
+        line, or None to restore the raw force'''
 
-        self.data.loc[:,self.cols['f']]=self.data.loc[:,self.cols['f']]-f_line
+        f=self.get_array('f')
+        z=self.get_array('z')
+        values=np.asarray(f,dtype=float)
+        if self.virt_defl_fit is not None:
+            values=values+(self.virt_defl_fit['slope']*z+self.virt_defl_fit['intercept'])
+        if virt_defl_fit is not None:
+            values=values-(virt_defl_fit['slope']*z+virt_defl_fit['intercept'])
+        self._set_force(values.astype(f.dtype,copy=False))
+        self.virt_defl_fit=virt_defl_fit
+
+    def _set_force(self,values):
+        '''Utility function for replacing the force column, the end user should not call this function'''
+
+        self.data[self.cols['f']]=values
 
     def fit_stiffness(self,probe_diameter,fit_range=[0,1]):
         '''Fit this force curve using the hertz contact model
@@ -176,6 +384,12 @@ class Curve:
         long as the second number is larger than the
         first
 
+        The fitted reduced modulus and its standard error
+        are stored in self.stiff_fit['estar'] and
+        self.stiff_fit['estar_err'], along with the contact
+        point, the rows of the contact region which were
+        fit (fit_start to fit_stop) and the probe radius r
+
         ---------------------Returns---------------------
 
         None'''
@@ -187,32 +401,84 @@ class Curve:
         #Get only contact region and adjust force and indentation so values at contact are 0
         indent_raw=self.get_approach().loc[self.contact_index:,self.cols['ind']].to_numpy()
         force_raw=self.get_approach().loc[self.contact_index:,self.cols['f']].to_numpy()
-        indent_norm=indent_raw-indent_raw[0]
-        force_norm=force_raw-force_raw[0]
-        def get_force(indentation,e_star):
-            return (4/3)*e_star*(r**0.5)*(indentation**1.5)
+        indent_norm_fit,force_norm_fit,imin,imax=_stiff_window(indent_raw,force_raw,fit_range)
+        if imax<=imin:
+            raise Exception('No data points fall inside fit_range, stiffness fits cannot continue')
+
+        #the model is linear in e_star, so the least squares fit has a closed form
+        estar_fit,estar_err,sse=pyrtz.fitting.hertz_fit(indent_norm_fit,force_norm_fit,r)
+        self.stiff_fit=dict(estar=estar_fit,estar_err=estar_err,contact_index=int(self.contact_index),fit_start=imin,fit_stop=imax,r=r)
+        _fit_changed(self)
+
+    def contact_sensitivity(self,probe_diameter,fit_range=[0,1],window=50):
+        '''Repeat the stiffness fit of fit_stiffness for every
+        contact point within window rows of
+        self.contact_index, to show how sensitive the fitted
+        modulus is to the choice of contact point. All of the
+        fits are computed together, see
+        pyrtz.fitting.hertz_contact_sweep. self.stiff_fit is
+        not changed
+
+        --------------------Arguments--------------------
+
+        probe_diameter: The diameter of the indenting
+        sphere, in meters
+
+        fit_range: The portion of the force curve to fit,
+        as in fit_stiffness
 
-        #Figure out data subset for fitting
-        fmin=force_norm[-1]*fit_range[0]
-        fmax=force_norm[-1]*fit_range[1]
+        window: The number of rows either side of
+        self.contact_index to try
 
-        imin=0
-        imax=0
-        for i in list(range(len(force_norm)))[::-1]: #iterate through force readings backwards (trigger first)
-            if force_norm[i]>=fmin:
-                imin=i
-            if force_norm[i]>=fmax:
-                imax=i
+        ---------------------Returns---------------------
+
+        A pandas.DataFrame with one row per candidate
+        contact point containing the contact_index, its
+        offset from self.contact_index, and the fitted
+        estar, estar_err, sse and n_points'''
+
+        if self.contact_index==None:
+            raise Exception('Contact index has not been set, the contact point sensitivity cannot be computed')
+
+        approach_end=self.dwell_range[0]+1
+        candidates=np.arange(max(0,self.contact_index-window),min(approach_end,self.contact_index+window+1))
+        sweep=pyrtz.fitting.hertz_contact_sweep(self.get_array('ind')[:approach_end],self.get_array('f')[:approach_end],
+                                                candidates,probe_diameter/2,fit_range)
+        return pd.DataFrame(dict(contact_index=candidates,offset=candidates-self.contact_index,**sweep))
+
+    def fit_range_sweep(self,probe_diameter,fit_ranges):
+        '''Repeat the stiffness fit of fit_stiffness for many
+        fit_range windows, for example to look at how the
+        modulus changes with indentation depth. All of the
+        fits are computed together, see
+        pyrtz.fitting.hertz_range_sweep. self.stiff_fit is
+        not changed
+
+        --------------------Arguments--------------------
 
-        indent_norm_fit=indent_norm[imin:imax]
-        force_norm_fit=force_norm[imin:imax]
+        probe_diameter: The diameter of the indenting
+        sphere, in meters
+
+        fit_ranges: A sequence of fit_range windows, each
+        a [start,stop] pair as in fit_stiffness. For
+        example [[0,0.25],[0.25,0.5],[0.5,0.75],[0.75,1]]
 
-        #run fit
-        popt,pcov=scipy.optimize.curve_fit(get_force,indent_norm_fit,force_norm_fit)
+        ---------------------Returns---------------------
 
-        estar_fit=popt[0]
-        fit_curve=pd.DataFrame(dict(ind=indent_norm_fit+indent_raw[0],f=get_force(indent_norm_fit,estar_fit)+force_raw[0]))
-        self.stiff_fit=dict(curve=fit_curve,estar=estar_fit)
+        A pandas.DataFrame with one row per fit range
+        containing range_start, range_stop and the fitted
+        estar, estar_err, sse and n_points'''
+
+        if self.contact_index==None:
+            raise Exception('Contact index has not been set, stiffness fits cannot continue')
+
+        approach_end=self.dwell_range[0]+1
+        fit_ranges=np.asarray(fit_ranges,dtype=float).reshape(-1,2)
+        sweep=pyrtz.fitting.hertz_range_sweep(self.get_array('ind')[self.contact_index:approach_end],
+                                              self.get_array('f')[self.contact_index:approach_end],
+                                              fit_ranges,probe_diameter/2)
+        return pd.DataFrame(dict(range_start=fit_ranges[:,0],range_stop=fit_ranges[:,1],estar=sweep['estar'],
+                                 estar_err=sweep['estar_err'],sse=sweep['sse'],n_points=sweep['n_points']))
 
     def get_stiffness_fit_figure(self):
         '''Get a figure illustrating the fit resulting from
@@ -227,7 +493,7 @@ class Curve:
 
         measured_curve=self.get_approach().rename(columns={self.cols['z']:'z',self.cols['ind']:'ind',self.cols['t']:'t',self.cols['f']:'f'})
         measured_curve.loc[:,'curve']='measured'
-        fit_curve=self.stiff_fit['curve'].copy()
+        fit_curve=_stiff_fit_curve(self).copy()
         fit_curve.loc[:,'curve']='fit'
         all_curves=pd.concat([measured_curve,fit_curve],ignore_index=True)
         fig=px.scatter(all_curves,x='ind',y='f',color='curve')
@@ -236,8 +502,20 @@ class Curve:
         fig.add_vline(x=measured_curve.loc[self.contact_index,'ind'])
         return fig
 
-    def fit_biexponential(self):
-        '''Fit a biexponential decay function to the dwell region of this force curve
+    def fit_biexponential(self,p0=None):
+        '''Fit a biexponential decay function to the dwell region of this force curve.
+        The number of function (nfev) and jacobian (njev) evaluations used
+        are stored in self.biexponential_fit along with the fit parameters
+
+        --------------------Arguments--------------------
+
+        p0: Optional initial guesses [tau1,tau2,A] for the
+        fit, for example the fitted parameters of a similar
+        curve. If the fit fails from these guesses it is
+        repeated from guesses based on the time taken to
+        relax by 63%, which are always used if p0 is None.
+        self.biexponential_fit['warm_start'] records whether
+        p0 was used
 
         ---------------------Returns---------------------
 
@@ -252,29 +530,27 @@ class Curve:
 
         #make some good initial guesses
         c_guess=f_raw[-1]
-        #force value corresponding to ~63% relaxation
-        e_threshold=f0-0.63*(f0-c_guess)
-        #corresponding time
-        e_time=fit_data.loc[fit_data.loc[:,'f']<e_threshold,'t'].to_numpy()[0]
-        tau1_guess=e_time
-        tau2_guess=0.1*tau1_guess
-        a_guess=0.4 #arbitrary
-
-        def calc_force(t,tau1,tau2,A,C):
-            return (f0-C)*(A*np.exp(-1*t*tau1)+(1-A)*np.exp(-1*t*tau2))+C
-
-        bounds=([0,0,0,-np.inf],[np.inf,np.inf,1,np.inf])
-        p0=[tau1_guess,tau2_guess,a_guess,c_guess]
-
-        popt,pconv=scipy.optimize.curve_fit(calc_force,t_norm,f_raw,bounds=bounds,p0=p0,jac='3-point')
-        biexponential_fit=dict(tau1=popt[0],tau2=popt[1],A=popt[2],C=popt[3])
-
-        fit_curve=pd.DataFrame(dict(t=fit_data['t'],f=calc_force(t_norm,biexponential_fit['tau1'],biexponential_fit['tau2'],biexponential_fit['A'],biexponential_fit['C'])))
-
-        biexponential_fit['curve']=fit_curve
+        #the amplitude and offset are linear parameters and are solved for by variable projection
+        biexponential_fit=None
+        if p0 is not None:
+            biexponential_fit=_warm_start_fit(pyrtz.fitting.fit_biexponential,t_norm,f_raw,f0,[p0[0],p0[1],p0[2],c_guess],('tau1','tau2','A','C'))
+        if biexponential_fit is None:
+            #force value corresponding to ~63% relaxation
+            e_threshold=f0-0.63*(f0-c_guess)
+            #corresponding time
+            e_time=fit_data.loc[fit_data.loc[:,'f']<e_threshold,'t'].to_numpy()[0]
+            tau1_guess=e_time
+            tau2_guess=0.1*tau1_guess
+            a_guess=0.4 #arbitrary
+
+            biexponential_fit=pyrtz.fitting.fit_biexponential(t_norm,f_raw,f0,[tau1_guess,tau2_guess,a_guess,c_guess])
+            biexponential_fit['warm_start']=False
+
+        biexponential_fit['curve']=_dwell_fit_curve(fit_data,'t','f','biexponential',biexponential_fit)
         biexponential_fit['tau_fast']=max(biexponential_fit['tau1'],biexponential_fit['tau2'])
         biexponential_fit['tau_slow']=min(biexponential_fit['tau1'],biexponential_fit['tau2'])
         self.biexponential_fit=biexponential_fit
+        _fit_changed(self)
 
     def get_biexponential_fit_figure(self):
         '''Get a figure illustrating the fit resulting from
@@ -290,6 +566,8 @@ class Curve:
         measured_curve=self.get_dwell().rename(columns={self.cols['z']:'z',self.cols['ind']:'ind',self.cols['t']:'t',self.cols['f']:'f'})
         measured_curve.loc[:,'curve']='measured'
 
+        if 'curve' not in self.biexponential_fit:
+            raise Exception('The fitted curve is not available (fitted curves are not saved by CurveSet.save or kept by CurveSet.iter_chunks). Run fit_biexponential again')
         fit_curve=self.biexponential_fit['curve'].copy()
         fit_curve.loc[:,'curve']='fit'
 
@@ -299,8 +577,20 @@ class Curve:
         fig.update_yaxes(title={'text':'Force (N)'})
         return fig
 
-    def fit_exponential(self):
-        '''Fit an exponential decay function to the dwell region of this force curve
+    def fit_exponential(self,p0=None):
+        '''Fit an exponential decay function to the dwell region of this force curve.
+        The number of function (nfev) and jacobian (njev) evaluations used
+        are stored in self.exponential_fit along with the fit parameters
+
+        --------------------Arguments--------------------
+
+        p0: Optional initial guess [tau0] for the fit, for
+        example the fitted decay rate of a similar curve.
+        If the fit fails from this guess it is repeated
+        from a guess based on the time taken to relax by
+        63%, which is always used if p0 is None.
+        self.exponential_fit['warm_start'] records whether
+        p0 was used
 
         ---------------------Returns---------------------
 
@@ -313,57 +603,1101 @@ class Curve:
         #adjust time to start at zero when the dwell begins
         t_norm=t_raw-t_raw[0]
 
-        #make some good initial guesses
-        c_guess=f_raw[-1]
-        #force value corresponding to ~63% relaxation
-        e_threshold=f0-0.63*(f0-c_guess)
-        #corresponding time
-        e_time=fit_data.loc[fit_data.loc[:,'f']<e_threshold,'t'].to_numpy()[0]
-        tau0_guess=1/e_time
+        #the offset is a linear parameter and is solved for by variable projection
+        exponential_fit=None
+        if p0 is not None:
+            exponential_fit=_warm_start_fit(pyrtz.fitting.fit_exponential,t_norm,f_raw,f0,p0[0],('tau0','C0'))
+        if exponential_fit is None:
+            #make some good initial guesses
+            c_guess=f_raw[-1]
+            #force value corresponding to ~63% relaxation
+            e_threshold=f0-0.63*(f0-c_guess)
+            #corresponding time
+            e_time=fit_data.loc[fit_data.loc[:,'f']<e_threshold,'t'].to_numpy()[0]
+            tau0_guess=1/e_time
 
-        def calc_force(t,tau0,C):
-            return (f0-C)*np.exp(-1*t*tau0)+C
+            exponential_fit=pyrtz.fitting.fit_exponential(t_norm,f_raw,f0,tau0_guess)
+            exponential_fit['warm_start']=False
 
-        bounds=([0,-np.inf],[np.inf,np.inf])
-        p0=[tau0_guess,c_guess]
+        exponential_fit['curve']=_dwell_fit_curve(fit_data,'t','f','exponential',exponential_fit)
 
-        popt,pconv=scipy.optimize.curve_fit(calc_force,t_norm,f_raw,bounds=bounds,p0=p0,jac='3-point')
-        exponential_fit=dict(tau0=popt[0],C0=popt[1])
+        self.exponential_fit=exponential_fit
+        _fit_changed(self)
 
-        fit_curve=pd.DataFrame(dict(t=fit_data['t'],f=calc_force(t_norm,exponential_fit['tau0'],exponential_fit['C0'])))
+    def get_exponential_fit_figure(self):
+        '''Get a figure illustrating the fit resulting from
+        the last call to self.fit_exponential
 
-        exponential_fit['curve']=fit_curve
+        ---------------------Returns---------------------
+        A plotly.graph_objs._figure.Figure object
+        illustrating the current fit'''
 
-        self.exponential_fit=exponential_fit
+        if not self.exponential_fit:
+            raise Exception('No exponential fit has yet been performed. Run fit_exponential method')
+
+        measured_curve=self.get_dwell().rename(columns={self.cols['z']:'z',self.cols['ind']:'ind',self.cols['t']:'t',self.cols['f']:'f'})
+        measured_curve.loc[:,'curve']='measured'
+
+        if 'curve' not in self.exponential_fit:
+            raise Exception('The fitted curve is not available (fitted curves are not saved by CurveSet.save or kept by CurveSet.iter_chunks). Run fit_exponential again')
+        fit_curve=self.exponential_fit['curve'].copy()
+        fit_curve.loc[:,'curve']='fit'
+
+        all_curves=pd.concat([measured_curve,fit_curve],ignore_index=True)
+        fig=px.scatter(all_curves,x='t',y='f',color='curve')
+        fig.update_xaxes(title={'text':'Time (s)'})
+        fig.update_yaxes(title={'text':'Force (N)'})
+        return fig
+
+class CompactCurve:
+    '''A memory efficient representation of a single force
+    curve which stores each column as a numpy array and only
+    builds pandas.DataFrames when they are requested'''
+
+    __slots__=('filename','columns','parameters','cols','k','invOLS','dwell_range',
+               'contact_index','contact_confidence','virt_defl_fit','stiff_fit','biexponential_fit','exponential_fit','track_fits','fit_generation')
+
+    def __init__(self,filename,columns,parameters,z_col,t_col,f_col,ind_col,invOLS,k,dwell_range,dtype=None):
+        '''Construct a new pyrtz.curves.CompactCurve object.
+        This method should not usually be called directly
+        by the end user. Instead use
+        pyrtz.curves.CompactCurve.from_curve or pass
+        compact=True to pyrtz.asylum.load_ibw
+
+        --------------------Arguments--------------------
+        filename: A string containing the original .ibw
+        file's name
+
+        columns: A dict whose keys are column names and
+        whose values are equal length, one dimensional
+        numpy arrays containing the force curve itself
+
+        parameters: A dict containing additional
+        information from the .ibw file's notes section
+
+        z_col, t_col, f_col, ind_col: The (string) names
+        of the columns containing z position, time, force
+        and indentation data
+
+        invOLS: The inverse optical lever sensitivity
+        of the lever used for this measurement
+
+        k: The spring constant of the lever used for
+        this measurement
+
+        dwell_range: A two entry list containing the row
+        indices at which the dwell region begins and ends
+
+        dtype: A numpy dtype (for example 'float32') to
+        store every column in. None keeps the dtype of
+        each array in columns
+
+        ---------------------Returns---------------------
+        A new pyrtz.curves.CompactCurve object'''
+
+        if dtype is not None:
+            columns={c:np.asarray(a).astype(dtype,copy=False) for c,a in columns.items()}
+        self.filename=filename
+        self.columns=dict(columns)
+        self.parameters=parameters
+        self.cols={'z':z_col,'t':t_col,'f':f_col,'ind':ind_col}
+        self.k=k
+        self.invOLS=invOLS
+        self.dwell_range=[int(dwell_range[0]),int(dwell_range[1])]
+        self.contact_index=None
+        self.contact_confidence=None
+        self.virt_defl_fit=None
+        self.stiff_fit=None
+        self.biexponential_fit=None
+        self.exponential_fit=None
+        self.track_fits=True
+        self.fit_generation=0
+
+    @classmethod
+    def from_curve(cls,curve,dtype=None):
+        '''Create a CompactCurve holding the same force curve,
+        contact point and fit results as a Curve
+
+        --------------------Arguments--------------------
+        curve: The pyrtz.curves.Curve to convert
+
+        dtype: A numpy dtype (for example 'float32') to
+        store every column in. None keeps the dtype of
+        each column of curve.data
+
+        ---------------------Returns---------------------
+        A new pyrtz.curves.CompactCurve object'''
+
+        if isinstance(curve,CompactCurve):
+            columns=curve.columns
+        else:
+            columns={str(c):curve.data[c].to_numpy() for c in curve.data.columns}
+        compact=cls(filename=curve.filename,columns=columns,parameters=curve.parameters,
+                    z_col=curve.cols['z'],t_col=curve.cols['t'],f_col=curve.cols['f'],ind_col=curve.cols['ind'],
+                    invOLS=curve.invOLS,k=curve.k,dwell_range=curve.dwell_range,dtype=dtype)
+        compact.contact_index=curve.contact_index
+        compact.contact_confidence=curve.contact_confidence
+        compact.virt_defl_fit=curve.virt_defl_fit
+        compact.stiff_fit=curve.stiff_fit
+        compact.biexponential_fit=curve.biexponential_fit
+        compact.exponential_fit=curve.exponential_fit
+        return compact
+
+    def to_curve(self)->Curve:
+        '''Convert this CompactCurve into a DataFrame backed
+        pyrtz.curves.Curve
+
+        ---------------------Returns---------------------
+        A new pyrtz.curves.Curve object'''
+
+        curve=Curve(filename=self.filename,data=self.data.copy(),parameters=self.parameters,
+                    z_col=self.cols['z'],t_col=self.cols['t'],f_col=self.cols['f'],ind_col=self.cols['ind'],
+                    invOLS=self.invOLS,k=self.k,dwell_range=list(self.dwell_range))
+        curve.contact_index=self.contact_index
+        curve.contact_confidence=self.contact_confidence
+        curve.virt_defl_fit=self.virt_defl_fit
+        curve.stiff_fit=self.stiff_fit
+        curve.biexponential_fit=self.biexponential_fit
+        curve.exponential_fit=self.exponential_fit
+        return curve
+
+    def _frame(self,start,stop)->pd.DataFrame:
+        '''Utility function for building a DataFrame view of rows start (inclusive) to stop (exclusive), the end user should not call this function'''
+
+        start=max(start,0)
+        stop=min(stop,len(self))
+        return pd.DataFrame({c:a[start:stop] for c,a in self.columns.items()},index=pd.RangeIndex(start,stop),copy=False)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def get_array(self,col)->np.ndarray:
+        '''Get one column of the force curve as a numpy array
+
+        --------------------Arguments--------------------
+        col: One of 'z', 't', 'f' or 'ind'
+
+        ---------------------Returns---------------------
+        The array holding the whole column (not a copy)'''
+
+        return self.columns[self.cols[col]]
+
+    @property
+    def data(self)->pd.DataFrame:
+        '''The whole force curve as a pandas.DataFrame. A
+        new DataFrame is built every time this is accessed,
+        so changes to it are not stored in the curve'''
+
+        return self._frame(0,len(self))
+
+    def get_approach(self)->pd.DataFrame:
+        '''Get the approach section of the force curve
+
+        ---------------------Returns---------------------
+        A pandas.DataFrame containing the approach
+        region of the force curve'''
+
+        return self._frame(0,self.dwell_range[0]+1)
+
+    def get_dwell(self)->pd.DataFrame:
+        '''Get the dwell section of the force curve
+
+        ---------------------Returns---------------------
+        A pandas.DataFrame containing the dwellregion of
+        the force curve'''
+
+        return self._frame(self.dwell_range[0],self.dwell_range[1]+1)
+
+    def get_retract(self)->pd.DataFrame:
+        '''Get the retract section of the force curve
+
+        ---------------------Returns---------------------
+        A pandas.DataFrame containing the retract region
+        of the force curve'''
+
+        return self._frame(self.dwell_range[1],len(self))
+
+    def _set_force(self,values):
+        '''Utility function for replacing the force column, the end user should not call this function'''
+
+        f=self.columns[self.cols['f']]
+        if f.flags.writeable:
+            f[:]=values
+        else:
+            self.columns[self.cols['f']]=values
+
+    set_contact_index=Curve.set_contact_index
+    correct_virt_defl=Curve.correct_virt_defl
+    get_raw_force=Curve.get_raw_force
+    undo_virt_defl=Curve.undo_virt_defl
+    _set_virt_defl=Curve._set_virt_defl
+    detect_contact_index=Curve.detect_contact_index
+    fit_stiffness=Curve.fit_stiffness
+    contact_sensitivity=Curve.contact_sensitivity
+    fit_range_sweep=Curve.fit_range_sweep
+    get_stiffness_fit_figure=Curve.get_stiffness_fit_figure
+    fit_biexponential=Curve.fit_biexponential
+    get_biexponential_fit_figure=Curve.get_biexponential_fit_figure
+    fit_exponential=Curve.fit_exponential
+    get_exponential_fit_figure=Curve.get_exponential_fit_figure
+
+class PackedCurves:
+    '''Contiguous storage for the columns of many force
+    curves. Each column of every curve is stored in a single
+    array, curve i occupying rows offsets[i] to offsets[i+1]'''
+
+    def __init__(self,keys,columns,offsets,dwell_ranges):
+        '''Construct a new pyrtz.curves.PackedCurves object.
+        This constructor should not usually be called by an
+        end user. Instead use pyrtz.curves.CurveSet.pack
+
+        --------------------Arguments--------------------
+
+        keys: A list of the unique identifiers of the
+        packed curves, in storage order
+
+        columns: A dict whose keys are column names and
+        whose values are one dimensional arrays holding
+        that column of every curve back to back
+
+        offsets: An integer array of length len(keys)+1
+        giving the first row of each curve, followed by
+        the total number of rows
+
+        dwell_ranges: An integer array with one row per
+        curve containing the (per curve) row indices at
+        which the dwell region begins and ends
+
+        ---------------------Returns---------------------
+
+        A new pyrtz.curves.PackedCurves object'''
+
+        self.keys=list(keys)
+        self.columns=columns
+        self.offsets=np.asarray(offsets,dtype=np.int64)
+        self.dwell_ranges=np.asarray(dwell_ranges,dtype=np.int64).reshape(-1,2)
+        self.views=[self.curve_columns(i) for i in range(len(self.keys))]
+
+    @classmethod
+    def from_curves(cls,keys,curves,dtype=None):
+        '''Pack the columns of a sequence of curves
+
+        --------------------Arguments--------------------
+
+        keys: The unique identifiers of the curves
+
+        curves: A sequence of pyrtz.curves.Curve or
+        pyrtz.curves.CompactCurve objects, all with the
+        same columns
+
+        dtype: A numpy dtype to store every column in.
+        None uses the common dtype of each column
+
+        ---------------------Returns---------------------
+
+        A new pyrtz.curves.PackedCurves object'''
+
+        curve_columns=[]
+        for curve in curves:
+            if isinstance(curve,CompactCurve):
+                curve_columns.append(curve.columns)
+            else:
+                curve_columns.append({str(c):curve.data[c].to_numpy() for c in curve.data.columns})
+        if not curve_columns:
+            raise Exception('Cannot pack an empty set of curves')
+        names=list(curve_columns[0].keys())
+        lengths=[len(c[names[0]]) for c in curve_columns]
+        offsets=np.concatenate([[0],np.cumsum(lengths)])
+
+        columns=dict()
+        for name in names:
+            columns[name]=np.concatenate([c[name] for c in curve_columns])
+            if dtype is not None:
+                columns[name]=columns[name].astype(dtype,copy=False)
+        dwell_ranges=[curve.dwell_range for curve in curves]
+        return cls(keys,columns,offsets,dwell_ranges)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lengths(self)->np.ndarray:
+        '''Get the number of rows of every packed curve
+
+        ---------------------Returns---------------------
+
+        An integer array with one entry per curve'''
+
+        return np.diff(self.offsets)
+
+    def curve_columns(self,i)->dict:
+        '''Get views of the columns of a single curve
+
+        --------------------Arguments--------------------
+
+        i: The position of the curve in self.keys
+
+        ---------------------Returns---------------------
+
+        A dict whose keys are column names and whose values
+        are views into the packed arrays'''
+
+        start,stop=self.offsets[i],self.offsets[i+1]
+        return {name:column[start:stop] for name,column in self.columns.items()}
+
+    def segment_bounds(self,segment)->tuple:
+        '''Get the packed row indices bounding one segment
+        of every curve
+
+        --------------------Arguments--------------------
+
+        segment: One of 'approach', 'dwell' or 'retract'
+
+        ---------------------Returns---------------------
+
+        A (starts,stops) tuple of integer arrays, segment
+        i occupying packed rows starts[i] to stops[i]
+        (exclusive), matching the rows returned by
+        get_approach, get_dwell and get_retract'''
+
+        first=self.offsets[:-1]
+        if segment=='approach':
+            return first,first+self.dwell_ranges[:,0]+1
+        elif segment=='dwell':
+            return first+self.dwell_ranges[:,0],first+self.dwell_ranges[:,1]+1
+        elif segment=='retract':
+            return first+self.dwell_ranges[:,1],self.offsets[1:]
+        raise Exception(f"segment must be 'approach', 'dwell' or 'retract', not {segment}")
+
+    def ident_columns(self,ident_labels)->dict:
+        '''Build one categorical column per ident_label with
+        an entry for every packed row
+
+        --------------------Arguments--------------------
+
+        ident_labels: The ident_labels of the CurveSet
+        these curves belong to
+
+        ---------------------Returns---------------------
+
+        A dict whose keys are ident_labels and whose values
+        are pandas.Categorical objects'''
+
+        lengths=self.lengths()
+        idents=dict()
+        for j,label in enumerate(ident_labels):
+            values=[key[j] for key in self.keys]
+            categories=list(dict.fromkeys(values))
+            lookup={v:c for c,v in enumerate(categories)}
+            codes=np.repeat(np.array([lookup[v] for v in values],dtype=np.int32),lengths)
+            idents[label]=pd.Categorical.from_codes(codes,categories=categories)
+        return idents
+
+class SharedCurves:
+    '''The columns of many force curves published in
+    multiprocessing.shared_memory blocks so that worker
+    processes can read them without copying. The process
+    which creates a SharedCurves owns the blocks and must
+    call close (or use it as a context manager) to free
+    them'''
+
+    def __init__(self,keys,dtypes,offsets,headers=None):
+        '''Construct a new pyrtz.curves.SharedCurves object
+        whose column blocks have not been filled in yet. This
+        constructor should not usually be called by an end
+        user. Instead use pyrtz.curves.CurveSet.share
+
+        --------------------Arguments--------------------
+
+        keys: A list of the unique identifiers of the
+        shared curves, in storage order
+
+        dtypes: A dict whose keys are column names and
+        whose values are the numpy dtype of that column
+
+        offsets: An integer array of length len(keys)+1
+        giving the first row of each curve, followed by
+        the total number of rows
+
+        headers: A list holding the attributes of each
+        curve which are not stored in its columns, or None
+
+        ---------------------Returns---------------------
+
+        A new pyrtz.curves.SharedCurves object'''
+
+        self.keys=list(keys)
+        self.headers=headers
+        self.blocks=[]
+        self.dtypes=[]
+        offsets=np.asarray(offsets,dtype=np.int64)
+        columns=dict()
+        for name,dtype in [*dtypes.items(),(None,offsets.dtype)]:
+            dtype=np.dtype(dtype)
+            length=len(offsets) if name is None else int(offsets[-1])
+            #shared memory blocks must not be empty
+            block=multiprocessing.shared_memory.SharedMemory(create=True,size=max(length*dtype.itemsize,1))
+            self.blocks.append(block)
+            self.dtypes.append(dtype)
+            columns[name]=(block.name,dtype.str,length)
+        self._write(len(self.blocks)-1,0,offsets)
+        offsets=columns.pop(None)
+        #everything a worker needs to find the blocks, this is small and cheap to pickle
+        self.descriptor=dict(id=uuid.uuid4().hex,columns=columns,offsets=offsets)
+
+    @classmethod
+    def from_packed(cls,packed,headers=None):
+        '''Copy packed curves into shared memory
+
+        --------------------Arguments--------------------
+
+        packed: A pyrtz.curves.PackedCurves object
+
+        headers: A list holding the attributes of each
+        curve which are not stored in its columns, or None
+
+        ---------------------Returns---------------------
+
+        A new pyrtz.curves.SharedCurves object'''
+
+        shared=cls(packed.keys,{name:column.dtype for name,column in packed.columns.items()},packed.offsets,headers)
+        for j,column in enumerate(packed.columns.values()):
+            shared._write(j,0,column)
+        return shared
+
+    @classmethod
+    def from_curves(cls,keys,curves,dtype=None):
+        '''Copy the columns of many curves into shared
+        memory. The curves are read one at a time, twice:
+        once to size the blocks and once to fill them in,
+        so lazily loaded curves never need to be in memory
+        together
+
+        --------------------Arguments--------------------
+
+        keys: The unique identifiers of the curves
+
+        curves: An object (such as a pyrtz.curves.CurveSet)
+        which returns the pyrtz.curves.Curve or
+        pyrtz.curves.CompactCurve for a key when indexed,
+        all with the same columns
+
+        dtype: A numpy dtype to store every column in.
+        None uses the common dtype of each column
+
+        ---------------------Returns---------------------
+
+        A new pyrtz.curves.SharedCurves object'''
+
+        def columns_of(curve):
+            if isinstance(curve,CompactCurve):
+                return curve.columns
+            return {str(c):curve.data[c].to_numpy() for c in curve.data.columns}
+
+        keys=list(keys)
+        if not keys:
+            raise Exception('Cannot share an empty set of curves')
+        lengths=[]
+        dtypes=dict()
+        headers=[]
+        for key in keys:
+            curve=curves[key]
+            columns=columns_of(curve)
+            lengths.append(len(next(iter(columns.values()))))
+            for name,column in columns.items():
+                dtypes[name]=column.dtype if name not in dtypes else np.result_type(dtypes[name],column.dtype)
+            headers.append(_curve_header(curve))
+            del curve,columns
+        if dtype is not None:
+            dtypes={name:np.dtype(dtype) for name in dtypes}
+        offsets=np.concatenate([[0],np.cumsum(lengths)])
+        shared=cls(keys,dtypes,offsets,headers)
+        for key,start in zip(keys,offsets):
+            columns=columns_of(curves[key])
+            for j,name in enumerate(dtypes):
+                shared._write(j,start,columns[name])
+        return shared
+
+    def _write(self,j,start,array):
+        '''Utility function for copying an array into block j starting at row start, the end user should not call this function'''
+
+        dtype=self.dtypes[j]
+        view=np.ndarray((len(array),),dtype=dtype,buffer=self.blocks[j].buf,offset=int(start)*dtype.itemsize)
+        view[:]=array
+        #no views may be left when the block is closed
+        del view
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def close(self):
+        '''Release and delete the shared memory blocks. Any
+        worker still attached keeps its mapping until it
+        detaches, but no new worker can attach
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks=[]
+
+#Blocks attached by this process, see attach_shared_curves
+_attached_shared=dict()
+
+def _attach_block(name):
+    '''Utility function for attaching an existing shared memory block without handing it to the resource tracker, the end user should not call this function'''
+
+    if sys.version_info>=(3,13):
+        return multiprocessing.shared_memory.SharedMemory(name=name,track=False)
+    #older pythons always register the block. Worker pools share the resource
+    #tracker of the process which created it, so this does not unlink it early
+    return multiprocessing.shared_memory.SharedMemory(name=name)
+
+def attach_shared_curves(descriptor)->PackedCurves:
+    '''Attach to curves published by
+    pyrtz.curves.CurveSet.share from another process. The
+    blocks stay attached until a different descriptor is
+    attached by the same process
+
+    --------------------Arguments--------------------
+
+    descriptor: The descriptor attribute of a
+    pyrtz.curves.SharedCurves object
+
+    ---------------------Returns---------------------
+
+    A pyrtz.curves.PackedCurves object whose columns are
+    read only views into the shared memory blocks. Its
+    keys and dwell_ranges are not filled in'''
+
+    if _attached_shared.get('id')==descriptor['id']:
+        return _attached_shared['packed']
+    _attached_shared.clear()
+    blocks=[]
+
+    def view(entry):
+        name,dtype,length=entry
+        block=_attach_block(name)
+        blocks.append(block)
+        array=np.ndarray((length,),dtype=np.dtype(dtype),buffer=block.buf)
+        array.flags.writeable=False
+        return array
+
+    columns={name:view(entry) for name,entry in descriptor['columns'].items()}
+    offsets=view(descriptor['offsets'])
+    n=len(offsets)-1
+    packed=PackedCurves([None]*n,columns,offsets,np.zeros((n,2)))
+    _attached_shared.update(id=descriptor['id'],packed=packed,blocks=blocks)
+    return packed
+
+def _curve_header(curve)->dict:
+    '''Utility function for collecting the attributes of a curve which are not stored in its columns, the end user should not call this function'''
+
+    return dict(filename=curve.filename,cols=dict(curve.cols),k=curve.k,invOLS=curve.invOLS,
+                dwell_range=list(curve.dwell_range),contact_index=curve.contact_index)
+
+def _shared_curve(descriptor,i,header)->CompactCurve:
+    '''Utility function for building a CompactCurve from curves published by CurveSet.share, the end user should not call this function
+
+    The curve has no parameters, they are not sent to workers'''
+
+    packed=attach_shared_curves(descriptor)
+    cols=header['cols']
+    curve=CompactCurve(filename=header['filename'],columns=packed.views[i],parameters=dict(),
+                       z_col=cols['z'],t_col=cols['t'],f_col=cols['f'],ind_col=cols['ind'],
+                       invOLS=header['invOLS'],k=header['k'],dwell_range=header['dwell_range'])
+    curve.contact_index=header['contact_index']
+    curve.track_fits=False
+    return curve
+
+class LazyCurveDict(collections.abc.MutableMapping):
+    '''A dict-like container of Curve objects which only
+    loads each curve the first time it is accessed and keeps
+    a bounded number of loaded curves in memory'''
+
+    #Curve attributes which are kept when a curve is evicted and restored when it is reloaded
+    preserved_attributes=('contact_index','contact_confidence','virt_defl_fit','stiff_fit','biexponential_fit','exponential_fit','fit_generation')
+
+    def __init__(self,sources,loader,cache_size=128):
+        '''Construct a new pyrtz.curves.LazyCurveDict. This
+        constructor should not usually be called by an end
+        user. Instead pass lazy=True to
+        pyrtz.asylum.load_curveset_ibw
+
+        --------------------Arguments--------------------
+
+        sources: A dict whose keys are unique identifiers
+        and whose values are passed to loader to create
+        the corresponding Curve (usually a file path)
+
+        loader: A function which takes a single entry of
+        sources and returns a pyrtz.curves.Curve object.
+        This should be a module level function so that
+        the container can be pickled
+
+        cache_size: The maximum number of curves held in
+        memory at once. When a new curve is loaded past
+        this limit the least recently used curve is
+        dropped. None keeps every loaded curve
+
+        ---------------------Returns---------------------
+
+        A new pyrtz.curves.LazyCurveDict object'''
+
+        self.sources=dict(sources)
+        self.loader=loader
+        self.cache_size=cache_size
+        self.loaded=collections.OrderedDict()
+        self.pinned=dict()
+        self.state=dict()
+        #the number of containers (this one and its views, see subset) holding each curve
+        self.refs=collections.Counter(self.sources.keys())
+
+    def __getitem__(self,key)->Curve:
+        if key in self.pinned:
+            return self.pinned[key]
+        if key in self.loaded:
+            self.loaded.move_to_end(key)
+            return self.loaded[key]
+
+        curve=self.loader(self.sources[key])
+        state=self.state.pop(key,{})
+        virt_defl_fit=state.pop('virt_defl_fit',None)
+        for attribute,value in state.items():
+            setattr(curve,attribute,value)
+        #the reloaded force is uncorrected, apply the stored correction again
+        if virt_defl_fit is not None:
+            curve._set_virt_defl(virt_defl_fit)
+        self.loaded[key]=curve
+        if self.cache_size is not None:
+            while len(self.loaded)>self.cache_size:
+                self._evict_one(next(iter(self.loaded)))
+        return curve
+
+    def __setitem__(self,key,curve):
+        '''Add an already loaded curve. Curves added this
+        way are never evicted'''
+
+        self.loaded.pop(key,None)
+        self.state.pop(key,None)
+        if key not in self.sources:
+            self.refs[key]+=1
+        self.sources[key]=None
+        self.pinned[key]=curve
+
+    def __delitem__(self,key):
+        del self.sources[key]
+        LazyCurveDict._release([key],self.refs,self.loaded,self.pinned,self.state)
+
+    @staticmethod
+    def _release(keys,refs,loaded,pinned,state):
+        '''Utility function for dropping curves which are no longer held by any container, the end user should not call this function'''
+
+        for key in keys:
+            refs[key]-=1
+            if refs[key]<=0:
+                #views created by subset may still hold curves dropped from another container
+                del refs[key]
+                loaded.pop(key,None)
+                pinned.pop(key,None)
+                state.pop(key,None)
+
+    def __iter__(self):
+        return iter(self.sources)
+
+    def __len__(self):
+        return len(self.sources)
+
+    def subset(self,keys):
+        '''Create a view of some of the curves in this
+        container. The view shares its loaded curves,
+        preserved attributes and memory bound with this
+        container, so curves loaded or modified through
+        either are seen by both. A curve removed from one
+        container is kept for as long as any other still
+        holds it
+
+        --------------------Arguments--------------------
+
+        keys: The unique identifiers of the curves to
+        include
+
+        ---------------------Returns---------------------
+
+        A new pyrtz.curves.LazyCurveDict object'''
+
+        view=LazyCurveDict({key:self.sources[key] for key in keys},self.loader,self.cache_size)
+        view.loaded=self.loaded
+        view.pinned=self.pinned
+        view.state=self.state
+        view.refs=self.refs
+        view.refs.update(view.sources.keys())
+        #the curves still held by the view are released when it is garbage collected
+        weakref.finalize(view,LazyCurveDict._release,view.sources,view.refs,view.loaded,view.pinned,view.state)
+        return view
+
+    def _evict_one(self,key):
+        '''Utility function for dropping a single loaded curve while keeping its preserved attributes, the end user should not call this function'''
+
+        curve=self.loaded.pop(key)
+        self.state[key]={a:getattr(curve,a) for a in self.preserved_attributes if getattr(curve,a,None) is not None}
+
+    def is_loaded(self,key)->bool:
+        '''Check whether a curve is currently held in memory
+
+        --------------------Arguments--------------------
+
+        key: The unique identifier of the curve
+
+        ---------------------Returns---------------------
+
+        True if the curve can be returned without loading
+        it'''
+
+        return key in self.pinned or key in self.loaded
+
+    def evict(self,keys=None):
+        '''Drop loaded curves from memory. Fit results and
+        contact points are kept and restored the next time
+        each curve is accessed
+
+        --------------------Arguments--------------------
+
+        keys: An iterable of unique identifiers to drop.
+        None drops every loaded curve. Curves which were
+        added directly (rather than loaded) are not
+        dropped
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        if keys is None:
+            keys=list(self.loaded.keys())
+        for key in keys:
+            if key in self.loaded:
+                self._evict_one(key)
+
+    def get_attribute(self,key,attribute):
+        '''Get one of the preserved attributes of a curve
+        without loading it
+
+        --------------------Arguments--------------------
+
+        key: The unique identifier of the curve
+
+        attribute: The name of the attribute, one of
+        LazyCurveDict.preserved_attributes
+
+        ---------------------Returns---------------------
+
+        The value of the attribute'''
+
+        if self.is_loaded(key):
+            return getattr(self[key],attribute)
+        if key not in self.sources:
+            raise KeyError(key)
+        return self.state.get(key,{}).get(attribute,getattr(Curve,attribute))
+
+    def set_attribute(self,key,attribute,value):
+        '''Set one of the preserved attributes of a curve
+        without loading it
+
+        --------------------Arguments--------------------
+
+        key: The unique identifier of the curve
+
+        attribute: The name of the attribute, one of
+        LazyCurveDict.preserved_attributes
+
+        value: The new value of the attribute
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        if self.is_loaded(key):
+            setattr(self[key],attribute,value)
+        elif key not in self.sources:
+            raise KeyError(key)
+        else:
+            self.state.setdefault(key,{})[attribute]=value
+
+class ChunkedTable:
+    '''A table stored on disk in chunks, with one .npy file
+    per column of each chunk, so that tables larger than
+    memory can be written and read one chunk at a time'''
+
+    def __init__(self,path):
+        '''Create a new pyrtz.curves.ChunkedTable or open an
+        existing one
+
+        --------------------Arguments--------------------
+
+        path: The directory holding the table, it is
+        created if it does not exist
+
+        ---------------------Returns---------------------
+
+        A pyrtz.curves.ChunkedTable object'''
+
+        self.path=os.path.abspath(path)
+        os.makedirs(self.path,exist_ok=True)
+        self.columns=None
+        self.lengths=[]
+        index_path=os.path.join(self.path,'chunks.json')
+        if os.path.exists(index_path):
+            with open(index_path,'rt') as f:
+                index=json.load(f)
+            self.columns=index['columns']
+            self.lengths=index['lengths']
+
+    def __len__(self):
+        return int(sum(self.lengths))
+
+    def __iter__(self):
+        '''Iterate over the chunks of this table as
+        pandas.DataFrames'''
+
+        for i in range(len(self.lengths)):
+            yield self.get_chunk(i)
+
+    def _file(self,i,j)->str:
+        '''Utility function for getting the path of column j of chunk i, the end user should not call this function'''
+
+        return os.path.join(self.path,f'chunk{i:06d}_col{j}.npy')
+
+    def append(self,frame):
+        '''Write a new chunk at the end of this table
+
+        --------------------Arguments--------------------
+
+        frame: A pandas.DataFrame with the same columns as
+        the chunks already in the table. Columns of python
+        objects (such as strings) are stored as fixed width
+        unicode strings
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        columns=[str(c) for c in frame.columns]
+        if self.columns is None:
+            self.columns=columns
+        elif columns!=self.columns:
+            raise Exception(f'Cannot append a chunk with columns {columns} to a table with columns {self.columns}')
+        i=len(self.lengths)
+        for j,values in enumerate(frame.to_dict('series').values()):
+            values=values.to_numpy()
+            if values.dtype==object:
+                #never pickled, so reading a table cannot run arbitrary code
+                values=values.astype(str)
+            np.save(self._file(i,j),values,allow_pickle=False)
+        self.lengths.append(len(frame))
+        #written last, chunks missing from the index are ignored
+        with open(os.path.join(self.path,'chunks.json'),'wt') as f:
+            json.dump(dict(columns=self.columns,lengths=self.lengths),f)
+
+    def get_chunk(self,i,mmap=True)->pd.DataFrame:
+        '''Read a single chunk of this table
+
+        --------------------Arguments--------------------
+
+        i: The position of the chunk
+
+        mmap: If True, the columns are memory mapped rather
+        than read into memory
+
+        ---------------------Returns---------------------
+
+        A pandas.DataFrame'''
+
+        return pd.DataFrame({name:self._load(i,j,mmap) for j,name in enumerate(self.columns)},copy=False)
+
+    def _load(self,i,j,mmap)->np.ndarray:
+        '''Utility function for reading column j of chunk i, the end user should not call this function'''
+
+        return np.load(self._file(i,j),mmap_mode='r' if mmap else None,allow_pickle=False)
+
+    def get_column(self,name)->np.ndarray:
+        '''Read one column of every chunk
+
+        --------------------Arguments--------------------
+
+        name: The name of the column
+
+        ---------------------Returns---------------------
+
+        A numpy.ndarray'''
+
+        j=self.columns.index(name)
+        return np.concatenate([self._load(i,j,True) for i in range(len(self.lengths))])
+
+    def to_dataframe(self)->pd.DataFrame:
+        '''Read the whole table into memory
+
+        ---------------------Returns---------------------
+
+        A pandas.DataFrame'''
+
+        return pd.DataFrame({name:self.get_column(name) for name in self.columns})
+
+def _blank(column):
+    '''Utility function for getting the value a FitTable column holds for curves which are not fitted, the end user should not call this function'''
+
+    return False if column.dtype==bool else np.nan
+
+class FitTable:
+    '''Columnar storage of the results of a single fit model
+    for many curves. Every scalar parameter of the fits is
+    kept in its own array, one row per curve. Boolean
+    parameters (such as warm_start) are stored as booleans,
+    False for curves which are not fitted. The fit dicts
+    themselves (and the fitted curves they hold) are not
+    kept'''
+
+    def __init__(self):
+        '''Construct a new, empty, pyrtz.curves.FitTable
+        object. This constructor should not usually be
+        called by an end user, CurveSet objects create one
+        table per fit model as fits are run
+
+        ---------------------Returns---------------------
+
+        A new pyrtz.curves.FitTable object'''
+
+        self.positions=dict()
+        self.columns=dict()
+        self.fitted=np.zeros(0,dtype=bool)
+        #the fit_generation of each curve when its fit was last read, see sync
+        self.generations=dict()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _row(self,key)->int:
+        '''Utility function for finding (or adding) the row of a curve, the end user should not call this function'''
+
+        row=self.positions.get(key)
+        if row is None:
+            row=len(self.positions)
+            self.positions[key]=row
+            if row>=len(self.fitted):
+                #grow every column geometrically so adding n rows is O(n)
+                capacity=max(16,2*len(self.fitted))
+                self.fitted=np.concatenate([self.fitted,np.zeros(capacity-len(self.fitted),dtype=bool)])
+                for name,column in self.columns.items():
+                    self.columns[name]=np.concatenate([column,np.full(capacity-len(column),_blank(column))])
+        return row
+
+    def set(self,key,fit):
+        '''Store the fit result of a single curve
+
+        --------------------Arguments--------------------
+
+        key: The unique identifier of the curve
+
+        fit: The fit result, a dict as stored in the
+        stiff_fit, biexponential_fit or exponential_fit
+        attribute of a curve. None marks the curve as not
+        fitted
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        row=self._row(key)
+        self.fitted[row]=fit is not None
+        for column in self.columns.values():
+            column[row]=_blank(column)
+        for name,value in (fit or {}).items():
+            if isinstance(value,(bool,np.bool_)):
+                if name not in self.columns:
+                    self.columns[name]=np.zeros(len(self.fitted),dtype=bool)
+                self.columns[name][row]=value
+            elif isinstance(value,(int,float,np.number)):
+                if name not in self.columns:
+                    self.columns[name]=np.full(len(self.fitted),np.nan)
+                self.columns[name][row]=value
+
+    def sync(self,keys,get_fit,generations,changed_only=False):
+        '''Store the current fit result of every given curve,
+        for example after curves were fit directly
+
+        --------------------Arguments--------------------
+
+        keys: The unique identifiers of the curves to update
+
+        get_fit: A function taking a unique identifier and
+        returning the current fit result of that curve
+
+        generations: The fit_generation of each curve in
+        keys
+
+        changed_only: If True, only read the fits of curves
+        whose fit_generation differs from the one recorded
+        when their fit was last read
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        for key,generation in zip(keys,generations):
+            if changed_only and self.generations.get(key,0)==generation:
+                continue
+            fit=get_fit(key)
+            if fit is not None or key in self.positions:
+                self.set(key,fit)
+            if generation:
+                self.generations[key]=generation
+            else:
+                self.generations.pop(key,None)
 
-    def get_exponential_fit_figure(self):
-        '''Get a figure illustrating the fit resulting from
-        the last call to self.fit_exponential
+    def get_columns(self,keys)->dict:
+        '''Gather the stored parameters of several curves
 
-        ---------------------Returns---------------------
-        A plotly.graph_objs._figure.Figure object
-        illustrating the current fit'''
+        --------------------Arguments--------------------
 
-        if not self.exponential_fit:
-            raise Exception('No exponential fit has yet been performed. Run fit_exponential method')
+        keys: The unique identifiers of the curves, these
+        must have been synced (see sync)
 
-        measured_curve=self.get_dwell().rename(columns={self.cols['z']:'z',self.cols['ind']:'ind',self.cols['t']:'t',self.cols['f']:'f'})
-        measured_curve.loc[:,'curve']='measured'
+        ---------------------Returns---------------------
 
-        fit_curve=self.exponential_fit['curve'].copy()
-        fit_curve.loc[:,'curve']='fit'
+        A dict mapping the name of every parameter to an
+        array with one entry per key (NaN, or False for
+        boolean parameters, for curves which are not
+        fitted) and 'fitted' to a boolean array'''
 
-        all_curves=pd.concat([measured_curve,fit_curve],ignore_index=True)
-        fig=px.scatter(all_curves,x='t',y='f',color='curve')
-        fig.update_xaxes(title={'text':'Time (s)'})
-        fig.update_yaxes(title={'text':'Force (N)'})
-        return fig
+        rows=np.array([self.positions.get(key,-1) for key in keys],dtype=np.int64)
+        present=rows>=0
+        if not self.positions:
+            return dict(fitted=present)
+        rows=np.where(present,rows,0)
+        columns={name:np.where(present,column[rows],_blank(column)) for name,column in self.columns.items()}
+        columns['fitted']=present&self.fitted[rows]
+        return columns
 
 class CurveSet:
     '''An object representing a set of force curves'''
 
     ident_labels=None
     curve_dict=None
+    load_errors=None
+    packed=None
+    fit_errors=None
+    fit_cache=None
+    fit_cache_stats=None
+    fit_tables=None
+    fit_table_stamps=None
+    ident_index=None
 
     def __init__(self,ident_labels,curve_dict):
         '''Construct a new pyrtz.curves.CurveSet object
@@ -394,8 +1728,128 @@ class CurveSet:
 
         return self.curve_dict.__iter__()
 
+    def save(self,path):
+        '''Save this CurveSet to a directory using the pyrtz
+        columnar format, which can be reopened (in whole or
+        in part) with pyrtz.curves.open_curveset. Unlike
+        pickle, this format does not depend on the installed
+        pandas version and fit results can be read without
+        loading any force curve data (see
+        pyrtz.curves.read_fit_results)
+
+        The directory contains:
+
+        manifest.json: the format name ('pyrtz-curveset'),
+        format version, ident_labels, the column names and
+        their little-endian numpy dtypes, the column roles
+        (z, t, f and ind) and the number of curves
+
+        curves.json: one entry per curve with its unique
+        identifier, filename, k, invOLS and notes
+
+        offsets.npy: curve i occupies rows offsets[i] to
+        offsets[i+1] of every column
+
+        dwell_ranges.npy: the (per curve) dwell_range of
+        every curve, one row per curve
+
+        contact_index.npy: the contact_index of every
+        curve, -1 where it has not been set
+
+        contact_confidence.npy: the contact_confidence of
+        every curve (see Curve.detect_contact_index), NaN
+        where it has not been set
+
+        virt_defl.npy: one row per curve holding the slope,
+        intercept and contact point of the correction made
+        by correct_virt_defl, NaN where the force has not
+        been corrected. The saved force is the corrected
+        force
+
+        columns/<name>.bin: every column of every curve
+        back to back as raw binary data, readable with
+        numpy.memmap using the dtype in the manifest
+
+        fits/<model>.npz: for each of the models 'stiff',
+        'biexponential' and 'exponential', one array per
+        fit parameter with one entry per curve (NaN where
+        the curve has not been fit) and a boolean array
+        'fitted'. Fitted curves used for plotting are not
+        saved
+
+        --------------------Arguments--------------------
+
+        path: The directory to create. It must not already
+        contain a saved CurveSet
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        keys=self.keys()
+        if not keys:
+            raise Exception('Cannot save an empty CurveSet')
+        if os.path.exists(os.path.join(path,'manifest.json')):
+            raise Exception(f'{path} already contains a saved CurveSet')
+        os.makedirs(os.path.join(path,'columns'),exist_ok=True)
+        os.makedirs(os.path.join(path,'fits'),exist_ok=True)
+
+        dtypes=None
+        column_files=dict()
+        offsets=[0]
+        dwell_ranges=[]
+        contact_index=[]
+        contact_confidence=[]
+        virt_defl=[]
+        curve_meta=[]
+        cols=None
+        try:
+            for key in keys:
+                curve=self[key]
+                if isinstance(curve,CompactCurve):
+                    columns=curve.columns
+                else:
+                    columns={str(c):curve.data[c].to_numpy() for c in curve.data.columns}
+                if dtypes is None:
+                    dtypes={name:np.asarray(a).dtype.newbyteorder('<') for name,a in columns.items()}
+                    cols=dict(curve.cols)
+                    for name in dtypes:
+                        column_files[name]=open(os.path.join(path,'columns',f'{name}.bin'),'wb')
+                for name,dtype in dtypes.items():
+                    column_files[name].write(np.ascontiguousarray(columns[name],dtype=dtype).tobytes())
+                offsets.append(offsets[-1]+len(columns[next(iter(dtypes))]))
+                dwell_ranges.append([int(a) for a in curve.dwell_range])
+                contact_index.append(-1 if curve.contact_index is None else int(curve.contact_index))
+                contact_confidence.append(np.nan if curve.contact_confidence is None else curve.contact_confidence)
+                fit=curve.virt_defl_fit
+                virt_defl.append([np.nan]*3 if fit is None else [fit['slope'],fit['intercept'],fit['contact_index']])
+                curve_meta.append(dict(ident=list(key),filename=curve.filename,k=curve.k,invOLS=curve.invOLS,parameters=curve.parameters))
+        finally:
+            for f in column_files.values():
+                f.close()
+
+        np.save(os.path.join(path,'offsets.npy'),np.array(offsets,dtype='<i8'))
+        np.save(os.path.join(path,'dwell_ranges.npy'),np.array(dwell_ranges,dtype='<i8'))
+        np.save(os.path.join(path,'contact_index.npy'),np.array(contact_index,dtype='<i8'))
+        np.save(os.path.join(path,'contact_confidence.npy'),np.array(contact_confidence,dtype='<f8'))
+        np.save(os.path.join(path,'virt_defl.npy'),np.array(virt_defl,dtype='<f8').reshape(-1,3))
+        for model in fit_models:
+            np.savez(os.path.join(path,'fits',f'{model}.npz'),**self._get_fit_table(model).get_columns(keys))
+        with open(os.path.join(path,'curves.json'),'wt') as cf:
+            json.dump(curve_meta,cf)
+        manifest=dict(format='pyrtz-curveset',
+                      version=curveset_format_version,
+                      ident_labels=list(self.ident_labels),
+                      columns={name:dtype.str for name,dtype in dtypes.items()},
+                      cols=cols,
+                      n_curves=len(keys))
+        #written last, a directory without a manifest is an incomplete save
+        with open(os.path.join(path,'manifest.json'),'wt') as mf:
+            json.dump(manifest,mf,indent=1)
+
     def pickle(self,filename):
-        '''Dump this curveset to a file
+        '''Dump this curveset to a file. See also save, which
+        writes a smaller, faster, version independent file
 
         --------------------Arguments--------------------
 
@@ -429,6 +1883,26 @@ class CurveSet:
 
         return self.curve_dict[index]
 
+    def add_curve(self,key,curve):
+        '''Add a curve to the CurveSet
+
+        --------------------Arguments--------------------
+
+        key: the unique identifier of the new curve, a
+        tuple with one entry per ident_label
+
+        curve: the pyrtz.curves.Curve object to add
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        if len(key)!=len(self.ident_labels):
+            raise Exception(f'key {key} does not match ident_labels {self.ident_labels}')
+        self.curve_dict[key]=curve
+        self.ident_index=None
+        self.fit_table_stamps=None
+
     def remove_curve(self,key):
         '''Drop a curve from the CurveSet
 
@@ -441,6 +1915,222 @@ class CurveSet:
         None'''
 
         del self.curve_dict[key]
+        self.ident_index=None
+        self.fit_table_stamps=None
+
+    def get_curve_attribute(self,key,attribute):
+        '''Get an attribute of a single curve. For lazily
+        loaded CurveSets, contact points and fit results
+        are returned without loading the curve itself
+
+        --------------------Arguments--------------------
+
+        key: the unique identifier of the curve
+
+        attribute: the name of the attribute to get, for
+        example 'contact_index' or 'stiff_fit'
+
+        ---------------------Returns---------------------
+
+        The value of the attribute'''
+
+        if isinstance(self.curve_dict,LazyCurveDict) and attribute in self.curve_dict.preserved_attributes:
+            return self.curve_dict.get_attribute(key,attribute)
+        return getattr(self[key],attribute)
+
+    def _get_ident_index(self)->dict:
+        '''Utility function for getting the index of the curves by the value of each ident_label, rebuilt after curves are added or removed, the end user should not call this function'''
+
+        #add_curve and remove_curve drop the index, the size catches changes made to curve_dict directly
+        if self.ident_index is None or self.ident_index['size']!=len(self.curve_dict):
+            index={label:dict() for label in self.ident_labels}
+            position=dict()
+            for key in self.curve_dict:
+                position[key]=len(position)
+                for label,ident in zip(self.ident_labels,key):
+                    index[label].setdefault(ident,[]).append(key)
+            self.ident_index=dict(size=len(position),index=index,position=position)
+        return self.ident_index['index']
+
+    def get_ident_values(self,label)->list:
+        '''Get the unique values of one of the ident_labels
+
+        --------------------Arguments--------------------
+
+        label: One of the ident_labels of this CurveSet
+
+        ---------------------Returns---------------------
+
+        A list of the values of label, in the order they
+        first appear in this CurveSet'''
+
+        if label not in self.ident_labels:
+            raise Exception(f'{label} is not an ident_label of this CurveSet')
+        return list(self._get_ident_index()[label].keys())
+
+    def subset(self,keys):
+        '''Create a CurveSet containing some of the curves
+        in this CurveSet. The curves are shared rather than
+        copied, so contact points and fits set through
+        either CurveSet are seen by both. Failed fits are
+        recorded in both (see get_fit_errors) and the fit
+        cache of this CurveSet is used
+
+        --------------------Arguments--------------------
+
+        keys: The unique identifiers of the curves to
+        include
+
+        ---------------------Returns---------------------
+
+        A new pyrtz.curves.CurveSet object'''
+
+        keys=list(keys)
+        if isinstance(self.curve_dict,LazyCurveDict):
+            curve_dict=self.curve_dict.subset(keys)
+        else:
+            curve_dict={key:self.curve_dict[key] for key in keys}
+        view=CurveSet(ident_labels=self.ident_labels,curve_dict=curve_dict)
+        if self.fit_errors is None:
+            self.fit_errors=dict()
+        if self.fit_cache_stats is None:
+            self.fit_cache_stats=dict()
+        view.fit_errors=self.fit_errors
+        view.fit_cache=self.fit_cache
+        view.fit_cache_stats=self.fit_cache_stats
+        if self.fit_tables is None:
+            self.fit_tables=dict()
+        view.fit_tables=self.fit_tables
+        return view
+
+    def iter_chunks(self,chunk_size,keep_fit_curves=False):
+        '''Iterate over this CurveSet in chunks of at most
+        chunk_size curves. Each chunk is a CurveSet sharing
+        its curves with this CurveSet (see subset). For
+        lazily loaded CurveSets, the curves of each chunk
+        are dropped from memory once the next chunk is
+        requested, keeping their contact points and fit
+        results (see pyrtz.curves.LazyCurveDict.evict)
+
+        --------------------Arguments--------------------
+
+        chunk_size: The maximum number of curves in each
+        chunk
+
+        keep_fit_curves: For lazily loaded CurveSets, the
+        fitted curves stored with each fit result (used by
+        the fit figure methods) are as large as the data
+        they were fit to, so they are dropped along with
+        the curves unless this is True
+
+        ---------------------Returns---------------------
+
+        A generator of pyrtz.curves.CurveSet objects'''
+
+        if chunk_size<1:
+            raise Exception('chunk_size must be at least 1')
+        keys=self.keys()
+        lazy=isinstance(self.curve_dict,LazyCurveDict)
+        for start in range(0,len(keys),chunk_size):
+            chunk_keys=keys[start:start+chunk_size]
+            chunk=self.subset(chunk_keys)
+            if lazy and chunk.curve_dict.cache_size is not None:
+                #the whole chunk is held while it is processed
+                chunk.curve_dict.cache_size=max(chunk.curve_dict.cache_size,len(chunk_keys))
+            try:
+                yield chunk
+            finally:
+                if lazy:
+                    self.curve_dict.evict(chunk_keys)
+                    if not keep_fit_curves:
+                        for key in chunk_keys:
+                            for attribute in fit_models.values():
+                                fit=self.curve_dict.get_attribute(key,attribute)
+                                if fit:
+                                    fit.pop('curve',None)
+
+    def _spill_chunks(self,method,chunk_size,path)->ChunkedTable:
+        '''Utility function for running a method returning a table on each chunk of this CurveSet and writing the results to disk, the end user should not call this function'''
+
+        if path is None:
+            raise Exception('A path to write the table to must be given when chunk_size is set')
+        if os.path.exists(os.path.join(path,'chunks.json')):
+            raise Exception(f'{path} already contains a table')
+        table=ChunkedTable(path)
+        for chunk in self.iter_chunks(chunk_size):
+            table.append(getattr(chunk,method)())
+        return table
+
+    def select(self,**criteria):
+        '''Select the curves whose idents have the given
+        values, for example curve_set.select(Sample='3') or
+        curve_set.select(Sample=['1','2'],Measurement='0')
+
+        --------------------Arguments--------------------
+
+        criteria: Keyword arguments whose names are
+        ident_labels and whose values are either a single
+        value or a list of values to accept. Labels which
+        are not valid python identifiers can be passed by
+        unpacking a dict
+
+        ---------------------Returns---------------------
+
+        A pyrtz.curves.CurveSet sharing its curves with
+        this CurveSet (see subset), containing the curves
+        matching every criterion in their original
+        order'''
+
+        index=self._get_ident_index()
+        position=self.ident_index['position']
+        matches=[]
+        for label,values in criteria.items():
+            if label not in self.ident_labels:
+                raise Exception(f'{label} is not an ident_label of this CurveSet')
+            if not isinstance(values,(list,tuple,set)):
+                values=[values]
+            #the index lists are in curve order, merging several keeps that order
+            keys=[key for value in dict.fromkeys(values) for key in index[label].get(value,[])]
+            if len(values)>1:
+                keys.sort(key=position.__getitem__)
+            matches.append(keys)
+        if not matches:
+            return self.subset(self.keys())
+        #filter the shortest list by the others
+        matches.sort(key=len)
+        others=[set(keys) for keys in matches[1:]]
+        return self.subset([key for key in matches[0] if all(key in keys for keys in others)])
+
+    def groupby(self,labels)->dict:
+        '''Split this CurveSet by the values of one or more
+        ident_labels
+
+        --------------------Arguments--------------------
+
+        labels: A single ident_label or a list of
+        ident_labels
+
+        ---------------------Returns---------------------
+
+        A dict whose keys are the values of labels (a tuple
+        of values if labels is a list) and whose values are
+        pyrtz.curves.CurveSet objects sharing their curves
+        with this CurveSet (see subset), in the order the
+        groups first appear'''
+
+        single=not isinstance(labels,(list,tuple))
+        if single:
+            labels=[labels]
+        for label in labels:
+            if label not in self.ident_labels:
+                raise Exception(f'{label} is not an ident_label of this CurveSet')
+        if single:
+            return {value:self.subset(keys) for value,keys in self._get_ident_index()[labels[0]].items()}
+        positions=[self.ident_labels.index(label) for label in labels]
+        groups=dict()
+        for key in self.keys():
+            groups.setdefault(tuple(key[i] for i in positions),[]).append(key)
+        return {group:self.subset(keys) for group,keys in groups.items()}
 
     def remove_unannotated(self):
         '''Drop all curves for which their contact point
@@ -457,13 +2147,118 @@ class CurveSet:
         
         idents_to_drop=[]
         for ident in self:
-            if self[ident].contact_index==0:
+            if self.get_curve_attribute(ident,'contact_index')==0:
                 idents_to_drop.append(ident)
 
         for i in idents_to_drop:
             self.remove_curve(i)
 
-    def correct_virt_defl(self):
+    def compact(self,dtype=None):
+        '''Replace every Curve in this CurveSet with an
+        equivalent pyrtz.curves.CompactCurve, which stores
+        its data as numpy arrays rather than a
+        pandas.DataFrame
+
+        --------------------Arguments--------------------
+
+        dtype: A numpy dtype (for example 'float32') to
+        store every column in. None keeps the existing
+        dtypes
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        if isinstance(self.curve_dict,LazyCurveDict):
+            raise Exception('Lazily loaded CurveSets cannot be compacted in place, pass compact=True to pyrtz.asylum.load_curveset_ibw instead')
+        for key in self.keys():
+            self.curve_dict[key]=CompactCurve.from_curve(self[key],dtype)
+
+    def pack(self,dtype=None):
+        '''Store the columns of every curve in this CurveSet
+        in one contiguous array per column (see
+        pyrtz.curves.PackedCurves) and replace each Curve
+        with a pyrtz.curves.CompactCurve whose columns are
+        views into those arrays. Packed CurveSets collate
+        their curves without copying them. Adding or
+        removing curves afterwards turns this off until
+        pack is called again
+
+        --------------------Arguments--------------------
+
+        dtype: A numpy dtype (for example 'float32') to
+        store every column in. None keeps the existing
+        dtypes
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        if isinstance(self.curve_dict,LazyCurveDict):
+            raise Exception('Lazily loaded CurveSets cannot be packed')
+        keys=self.keys()
+        curves=[self[key] for key in keys]
+        packed=PackedCurves.from_curves(keys,curves,dtype)
+        for key,curve,views in zip(keys,curves,packed.views):
+            compact=CompactCurve.from_curve(curve)
+            compact.columns=dict(views)
+            self.curve_dict[key]=compact
+        self.packed=packed
+
+    def get_packed(self):
+        '''Get the packed storage of this CurveSet, if it is
+        still in use
+
+        ---------------------Returns---------------------
+
+        The pyrtz.curves.PackedCurves object created by
+        the last call to pack, or None if the CurveSet has
+        not been packed or its curves have been changed
+        (added, removed or replaced) since'''
+
+        packed=self.packed
+        if packed is None or isinstance(self.curve_dict,LazyCurveDict) or len(self.curve_dict)!=len(packed):
+            return None
+        for key,views,dwell_range in zip(packed.keys,packed.views,packed.dwell_ranges):
+            curve=self.curve_dict.get(key)
+            if not isinstance(curve,CompactCurve) or curve.columns.keys()!=views.keys():
+                return None
+            if any(curve.columns[c] is not v for c,v in views.items()):
+                return None
+            if list(curve.dwell_range)!=list(dwell_range):
+                return None
+        return packed
+
+    def share(self,dtype=None)->SharedCurves:
+        '''Publish the columns of every curve in this
+        CurveSet in shared memory, so that worker processes
+        can read them without the curves being pickled. The
+        curves in this CurveSet are not changed. Unless the
+        CurveSet is packed, each curve is copied straight
+        into the shared blocks, and lazily loaded curves are
+        loaded one at a time (twice, once to size the blocks)
+
+        --------------------Arguments--------------------
+
+        dtype: A numpy dtype (for example 'float32') to
+        store every column in. None keeps the existing
+        dtypes. Ignored if the CurveSet is already packed
+
+        ---------------------Returns---------------------
+
+        A pyrtz.curves.SharedCurves object holding the
+        blocks, in the order of self.keys(). Its
+        descriptor can be sent to workers and passed to
+        pyrtz.curves.attach_shared_curves. Call its close
+        method once the workers are finished'''
+
+        packed=self.get_packed()
+        if packed is None or packed.keys!=self.keys():
+            #written straight into the blocks, without packing the curves first
+            return SharedCurves.from_curves(self.keys(),self,dtype)
+        return SharedCurves.from_packed(packed,[_curve_header(self[key]) for key in packed.keys])
+
+    def correct_virt_defl(self,chunk_size=None):
         '''Correct for non-zero slope of approach curves
         before contact point. This function fits a line
         to any points before the annotated contact point
@@ -472,22 +2267,88 @@ class CurveSet:
         in place. Note: this function will only update
         the 'f' column of curve.data.
 
+        The lines for every curve are fit together in
+        closed form. As with Curve.correct_virt_defl,
+        curves which have already been corrected using
+        their current contact point are skipped, so calling
+        this function again is cheap and never corrects a
+        curve twice
+
+        --------------------Arguments--------------------
+
+        chunk_size: If not None, process the curves in
+        chunks of at most this many curves (see
+        iter_chunks), so that lazily loaded CurveSets never
+        hold more than one chunk in memory
+
         ---------------------Returns---------------------
 
         None'''
 
-        for key in self:
-            self[key].correct_virt_defl()
+        if chunk_size is not None:
+            for chunk in self.iter_chunks(chunk_size):
+                chunk.correct_virt_defl()
+            return
+
+        keys=[]
+        z=[]
+        f=[]
+        for key in self.keys():
+            curve=self[key]
+            if curve.contact_index==None:
+                raise Exception(f'Contact index has not been set for curve {key}. Please update contact point annotations')
+            if curve.virt_defl_fit is not None and curve.virt_defl_fit['contact_index']==curve.contact_index:
+                continue
+            keys.append(key)
+            z.append(curve.get_array('z')[:curve.contact_index])
+            f.append(curve.get_raw_force()[:curve.contact_index])
+        if not keys:
+            return
+
+        #solve every curve at once
+        offsets=np.concatenate([[0],np.cumsum([len(a) for a in z])])
+        slope,intercept=pyrtz.fitting.line_fit_segments(np.concatenate(z),np.concatenate(f),offsets)
+        for i,key in enumerate(keys):
+            if not np.isfinite(slope[i]):
+                raise Exception(f'There are not enough points before the contact point of curve {key} to correct the virtual deflection')
+        for i,key in enumerate(keys):
+            curve=self[key]
+            curve._set_virt_defl(dict(slope=slope[i],intercept=intercept[i],contact_index=curve.contact_index))
+
+
+    def collate_curves(self,chunk_size=None,path=None)->pd.DataFrame:
+        '''Return all the force curves contained in this
+        CurveSet as a single pandas.DataFrame. If the
+        CurveSet has been packed (see pack) the force
+        curve columns of the result share memory with the
+        curves themselves and the ident columns are
+        categorical, so the result should be treated as
+        read-only
+
+        --------------------Arguments--------------------
 
+        chunk_size: If not None, collate the curves in
+        chunks of at most this many curves (see
+        iter_chunks) and write each chunk to path rather
+        than returning a single pandas.DataFrame
 
-    def collate_curves(self)->pd.DataFrame:
-        '''Return all the force curves contained in this
-        CurveSet as a single pandas.DataFrame
+        path: The directory to write the chunks to, only
+        used if chunk_size is not None
 
         ---------------------Returns---------------------
 
         A pandas.DataFrame containing every force curve
-        in the CurveSet'''
+        in the CurveSet, or a pyrtz.curves.ChunkedTable if
+        chunk_size is not None'''
+
+        if chunk_size is not None:
+            return self._spill_chunks('collate_curves',chunk_size,path)
+
+        packed=self.get_packed()
+        if packed is not None:
+            collated=dict(packed.columns)
+            collated.update(packed.ident_columns(self.ident_labels))
+            return pd.DataFrame(collated,copy=False)
 
         all_curves=[]
         for ident in self.keys():
@@ -497,64 +2358,173 @@ class CurveSet:
             all_curves.append(this_curve)
         return pd.concat(all_curves,ignore_index=True)
 
-    #def normalize_curves(curves,idents,t_col='t',z_col='zSensr',f_col='force'):
-    def normalize_curves(self)->pd.DataFrame:
+    def normalize_curves(self,chunk_size=None,path=None)->pd.DataFrame:
         '''Normalize all curves so that the trigger point
         corresponds to t=0, z=0, ind=0, f=0 and return all the
         resulting normalized force curves as a single
-        pandas.DataFrame
+        pandas.DataFrame. The trigger point of each curve is
+        the first row at which its force is largest, curves
+        whose force is entirely NaN are left out. Each curve
+        is read twice, once to size the result and once to
+        fill it in, so lazily loaded CurveSets never hold
+        every curve at once
+
+        --------------------Arguments--------------------
+
+        chunk_size: If not None, normalize the curves in
+        chunks of at most this many curves (see
+        iter_chunks) and write each chunk to path rather
+        than returning a single pandas.DataFrame
+
+        path: The directory to write the chunks to, only
+        used if chunk_size is not None
 
         ---------------------Returns---------------------
 
         A pandas.DataFrame containing every force curve
         in the CurveSet normalized so that the trigger
-        point corresponds to t=0, z=0, f=0'''
-
-        curves=self.collate_curves()
-        idents=list(self.ident_labels)
-        cols=self[self.keys()[0]].cols
-        t_col=cols['t']
-        z_col=cols['z']
-        ind_col=cols['ind']
-        f_col=cols['f']
-        desired_cols=[*idents,t_col,z_col,ind_col,f_col]
-        curves=curves.loc[:,desired_cols]
-
-        maxf=curves.loc[:,[*idents,f_col]].groupby(idents).agg(np.max).reset_index()
-        maxf_cols=list(maxf.columns)
-        for i in range(len(maxf_cols)):
-            if maxf_cols[i]==f_col:
-                maxf_cols[i]='max_f'
-
-        maxf.columns=maxf_cols
-
-        curves=pd.merge(curves,maxf)
-        norm_vals=curves.query(f'{f_col}==max_f')
-        norm_vals=norm_vals.loc[:,[*idents,t_col,ind_col,z_col]]
-        norm_cols=list(norm_vals.columns)
-        for j in range(len(norm_cols)):
-            if norm_cols[j]==t_col:
-                norm_cols[j]='t0'
-            elif norm_cols[j]==ind_col:
-                norm_cols[j]='ind0'
-            elif norm_cols[j]==z_col:
-                norm_cols[j]='z0'
-
-        norm_vals.columns=norm_cols
-
-        curves=pd.merge(curves,norm_vals)
-        curves.loc[:,'t_norm']=curves.loc[:,t_col]-curves.loc[:,'t0']
-        curves.loc[:,'z_norm']=curves.loc[:,z_col]-curves.loc[:,'z0']
-        curves.loc[:,'ind_norm']=curves.loc[:,ind_col]-curves.loc[:,'ind0']
-        curves.loc[:,'f_norm']=curves.loc[:,f_col]-curves.loc[:,'max_f']
-
-        curves=curves.loc[:,[*idents,'t_norm','z_norm','ind_norm','f_norm']]
-
-        return curves
-
-    def plot_traj(self,group,filename='characteristic_trajectories.html',round_dec=4):
+        point corresponds to t=0, z=0, f=0, or a
+        pyrtz.curves.ChunkedTable if chunk_size is not
+        None'''
+
+        if chunk_size is not None:
+            return self._spill_chunks('normalize_curves',chunk_size,path)
+
+        keys=self.keys()
+        roles=['t','z','ind','f']
+        #first pass: only the size, dtypes and trigger point of each curve are kept, so
+        #lazily loaded curves are never all in memory at once
+        triggers=[]
+        lengths=[]
+        dtypes={role:[] for role in roles}
+        for key in keys:
+            curve=self[key]
+            f=curve.get_array('f')
+            if len(f)==0 or np.isnan(f).all():
+                trigger=None
+            elif np.isnan(f).any():
+                trigger=int(np.nanargmax(f))
+            else:
+                trigger=int(np.argmax(f))
+            triggers.append(trigger)
+            lengths.append(len(f) if trigger is not None else 0)
+            for role in roles:
+                dtypes[role].append(curve.get_array(role).dtype)
+            del curve,f
+        offsets=np.concatenate([[0],np.cumsum(lengths)]).astype(np.int64)
+
+        #second pass: fill one preallocated array per column, curve by curve, subtracting the trigger point
+        normalized={role:np.empty(offsets[-1],dtype=np.result_type(*dtypes[role]) if keys else float) for role in roles}
+        for i,(key,trigger) in enumerate(zip(keys,triggers)):
+            if trigger is None:
+                continue
+            curve=self[key]
+            for role in roles:
+                array=curve.get_array(role)
+                np.subtract(array,array[trigger],out=normalized[role][offsets[i]:offsets[i+1]])
+        normalized={f'{role}_norm':column for role,column in normalized.items()}
+
+        curves=dict()
+        for j,label in enumerate(self.ident_labels):
+            values=np.empty(len(keys),dtype=object)
+            values[:]=[key[j] for key in keys]
+            curves[label]=np.repeat(values,lengths)
+        curves.update(normalized)
+        return pd.DataFrame(curves,copy=False)
+
+    def get_trajectories(self,group,quantiles=None,dt=None,round_dec=4)->pd.DataFrame:
+        '''Compute the characteristic force curve of each
+        unique value of group. Every curve is normalized (see
+        normalize_curves), interpolated onto a common time
+        grid and the requested quantiles of the normalized
+        force are computed at every time on the grid, so
+        curves do not need to share sample times
+
+        --------------------Arguments--------------------
+
+        group: The ident_label for which unique values
+        correspond to different experimental conditions
+
+        quantiles: A dict whose keys are metric names and
+        whose values are quantiles between 0 and 1. None
+        uses {'upper':0.75,'median':0.5,'lower':0.25}
+
+        dt: The spacing of the time grid. None uses the
+        median sampling interval of the curves. Each group
+        is interpolated onto the whole multiples of dt
+        spanned by its own curves
+
+        round_dec: The number of decimal places the times
+        in the returned t_norm column are rounded to. The
+        grid itself is not rounded, so this should resolve
+        dt
+
+        ---------------------Returns---------------------
+
+        A pandas.DataFrame with the columns group, t_norm,
+        f_norm and metric (the name of the quantile), with
+        one row per metric, value of group and time at
+        which at least one curve of that group has data'''
+
+        if group not in self.ident_labels:
+            raise Exception(f'{group} is not an ident_label of this CurveSet')
+        if quantiles is None:
+            quantiles={'upper':0.75,'median':0.5,'lower':0.25}
+        #curves are read one group at a time
+        groups=dict()
+        for value,keys in self._get_ident_index()[group].items():
+            groups.setdefault(str(value),[]).extend(keys)
+
+        def normalized(key):
+            curve=self[key]
+            t=np.asarray(curve.get_array('t'),dtype=float)
+            f=np.asarray(curve.get_array('f'),dtype=float)
+            if len(f)<2 or np.all(np.isnan(f)):
+                return None
+            #normalize to the trigger point
+            trigger=int(np.nanargmax(f))
+            return t-t[trigger],f-f[trigger]
+
+        if dt is None:
+            intervals=[]
+            for key in self.keys():
+                curve=normalized(key)
+                if curve is not None:
+                    intervals.append(np.median(np.diff(curve[0])))
+            if not intervals:
+                raise Exception('No curves with data to compute trajectories from')
+            dt=np.median(intervals)
+        if not dt>0:
+            raise Exception(f'dt must be positive, not {dt}')
+
+        names=list(quantiles.keys())
+        results={name:[] for name in names}
+        for g in sorted(groups):
+            members=[curve for curve in map(normalized,groups[g]) if curve is not None]
+            if not members:
+                continue
+            t_min=min(t[0] for t,f in members)
+            t_max=max(t[-1] for t,f in members)
+            #grid points are whole multiples of dt so the trigger point (t=0) is on the grid
+            grid=np.arange(np.ceil(np.round(t_min/dt,6)),np.floor(np.round(t_max/dt,6))+1)*dt
+            resampled=np.empty((len(members),len(grid)))
+            for i,(t,f) in enumerate(members):
+                resampled[i]=np.interp(grid,t,f)
+                #leave a little slack so rounding error does not drop the first and last samples
+                resampled[i,(grid<t[0]-dt*1e-6)|(grid>t[-1]+dt*1e-6)]=np.nan
+            del members
+            has_data=np.any(~np.isnan(resampled),axis=0)
+            values=np.nanquantile(resampled[:,has_data],[quantiles[name] for name in names],axis=0)
+            times=np.round(grid[has_data],round_dec)
+            for name,value in zip(names,values):
+                results[name].append(pd.DataFrame({group:g,'t_norm':times,'f_norm':value,'metric':name}))
+        if not results[names[0]]:
+            raise Exception('No curves with data to compute trajectories from')
+        return pd.concat([frame for name in names for frame in results[name]],ignore_index=True)
+
+    def plot_traj(self,group,filename='characteristic_trajectories.html',round_dec=4,dt=None,plot=True):
         '''Plot the characteristic force curves for each
-        unique value of group.
+        unique value of group. See get_trajectories
 
         --------------------Arguments--------------------
 
@@ -568,25 +2538,23 @@ class CurveSet:
         round_dec: The number of decimal places to round
         the times of each sample to
 
+        dt: The spacing of the common time grid the curves
+        are interpolated onto. None uses the median sampling
+        interval of the curves
+
+        plot: If False, only compute the trajectories
+
         ---------------------Returns---------------------
 
-        None'''
+        A pandas.DataFrame containing the upper quartile,
+        median and lower quartile of the normalized force
+        of each group, see get_trajectories'''
 
-        data=self.normalize_curves()
+        all_metrics=self.get_trajectories(group,dt=dt,round_dec=round_dec)
+        if not plot:
+            return all_metrics
         time_col='t_norm'
         f_col='f_norm'
-        data.loc[:,group]=[str(a) for a in data.loc[:,group]]
-        data=data.loc[:,[group,time_col,f_col]]
-        data.loc[:,time_col]=[np.round(a,round_dec) for a in data.loc[:,time_col]]
-        upper=data.groupby([group,time_col]).agg(lambda x: np.quantile(x,.75)).reset_index()
-        median=data.groupby([group,time_col]).agg(lambda x: np.quantile(x,.5)).reset_index()
-        lower=data.groupby([group,time_col]).agg(lambda x: np.quantile(x,.25)).reset_index()
-
-        upper.loc[:,'metric']='upper'
-        median.loc[:,'metric']='median'
-        lower.loc[:,'metric']='lower'
-
-        all_metrics=pd.concat([upper,median,lower],ignore_index=True)
 
         traces=[]
         all_groups=list(set(all_metrics.loc[:,group]))
@@ -634,7 +2602,10 @@ class CurveSet:
         None'''
 
         for key in cp_dict:
-            self[key].set_contact_index(cp_dict[key])
+            if isinstance(self.curve_dict,LazyCurveDict):
+                self.curve_dict.set_attribute(key,'contact_index',cp_dict[key])
+            else:
+                self[key].set_contact_index(cp_dict[key])
 
     def update_cp_annotations_from_file(self,cp_file):
         '''Update the stored contact point for every
@@ -660,7 +2631,192 @@ class CurveSet:
 
         self.update_cp_annotations(anno_tuple_dict)
 
-    def fit_all_stiff(self,probe_diameter,fit_range=[0,1]):
+    def detect_contact_points(self,baseline_fraction=0.25,review_below=0.99,overwrite=True):
+        '''Automatically find the contact point of every
+        curve in this CurveSet, see
+        pyrtz.curves.Curve.detect_contact_index
+
+        --------------------Arguments--------------------
+
+        baseline_fraction: The fraction of each approach
+        used for the initial fit of the line before contact
+
+        review_below: Curves whose confidence is below this
+        value are marked for review in the returned table
+
+        overwrite: If False, curves which already have a
+        contact point are left unchanged. Curves whose
+        contact point is None or 0 (the value pyrtz.annocp
+        uses for curves which have not been annotated) are
+        always detected
+
+        ---------------------Returns---------------------
+
+        A pandas.DataFrame with one row per curve containing
+        its unique identifier, contact_index,
+        contact_confidence and whether it needs_review.
+        Curves for which no contact point could be found
+        keep their previous contact point and have a
+        confidence of 0. Curves without a confidence (those
+        left unchanged because overwrite is False) are also
+        marked for review. Use export_cp_annotations to
+        review the results in pyrtz.annocp'''
+
+        entries=[]
+        for key in self.keys():
+            contact_index=self.get_curve_attribute(key,'contact_index')
+            if not overwrite and contact_index:
+                confidence=self.get_curve_attribute(key,'contact_confidence')
+            else:
+                try:
+                    contact_index,confidence=self[key].detect_contact_index(baseline_fraction)
+                except Exception:
+                    confidence=0.0
+                    self[key].contact_confidence=confidence
+            entry={label:ident for label,ident in zip(self.ident_labels,key)}
+            entry['contact_index']=contact_index
+            entry['contact_confidence']=np.nan if confidence is None else confidence
+            entries.append(entry)
+        results=pd.DataFrame(entries,columns=[*self.ident_labels,'contact_index','contact_confidence'])
+        results['contact_index']=results['contact_index'].astype('Int64')
+        #a missing confidence (NaN) also needs review
+        results['needs_review']=~(results['contact_confidence']>=review_below)
+        return results
+
+    def export_cp_annotations(self,cp_file):
+        '''Write the contact point of every curve in this
+        CurveSet to a .json file in the format created by
+        pyrtz.annocp. Passing this file to pyrtz.annocp
+        (annotations=cp_file) allows automatically detected
+        contact points to be reviewed and corrected. Curves
+        without a contact point are written as 0
+        (unannotated)
+
+        --------------------Arguments--------------------
+
+        cp_file: The .json file to create
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        annotations=dict()
+        for key in self.keys():
+            contact_index=self.get_curve_attribute(key,'contact_index')
+            annotations[repr(key)]=0 if contact_index is None else int(contact_index)
+        with open(cp_file,'wt') as cf:
+            json.dump(annotations,cf)
+
+    def set_fit_cache(self,cache):
+        '''Set the cache used to store and reuse the results
+        of fit_all, fit_all_stiff, fit_all_biexponential and
+        fit_all_exponential. A fit is only reused if the data
+        it was fit to and the arguments of the fit are
+        unchanged
+
+        --------------------Arguments--------------------
+
+        cache: A pyrtz.fitcache.FitCache object, or the
+        path of a database file to open one at. None uses
+        pyrtz.fitcache.default_cache (which is only
+        available once pyrtz.asylum.set_cache_dir has been
+        called) and False turns caching off
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        if isinstance(cache,(str,os.PathLike)):
+            cache=pyrtz.fitcache.FitCache(cache)
+        self.fit_cache=cache
+
+    def _get_fit_cache(self):
+        '''Utility function for finding the fit cache in use, the end user should not call this function'''
+
+        if self.fit_cache is False:
+            return None
+        if self.fit_cache is None:
+            return pyrtz.fitcache.default_cache()
+        return self.fit_cache
+
+    def _read_fit_cache(self,cache,model,cache_keys)->dict:
+        '''Utility function for looking up fit results and counting cache hits and misses, the end user should not call this function'''
+
+        if cache is None:
+            return dict()
+        cached=cache.get_many(cache_keys)
+        if self.fit_cache_stats is None:
+            self.fit_cache_stats=dict()
+        stats=self.fit_cache_stats.setdefault(model,dict(hits=0,misses=0))
+        stats['hits']+=len(cached)
+        stats['misses']+=len(cache_keys)-len(cached)
+        return cached
+
+    def get_fit_cache_stats(self)->pd.DataFrame:
+        '''Report how many fits of each model have been read
+        from the fit cache (hits) and how many had to be
+        computed (misses), see set_fit_cache
+
+        ---------------------Returns---------------------
+
+        A pandas.DataFrame with one row per model'''
+
+        rows=[dict(model=model,**stats) for model,stats in (self.fit_cache_stats or {}).items()]
+        return pd.DataFrame(rows,columns=['model','hits','misses'])
+
+    def _record_fit_error(self,key,model,error,on_error):
+        '''Utility function for handling a failed fit, the end user should not call this function'''
+
+        if on_error=='raise':
+            raise error
+        if self.fit_errors is None:
+            self.fit_errors=dict()
+        self.fit_errors.setdefault(key,dict())[model]=error
+
+    def _clear_fit_error(self,key,model):
+        '''Utility function for forgetting an earlier failure of a fit which has now succeeded, the end user should not call this function'''
+
+        if self.fit_errors and key in self.fit_errors:
+            self.fit_errors[key].pop(model,None)
+            if not self.fit_errors[key]:
+                del self.fit_errors[key]
+
+    def _store_fit(self,key,model,fit):
+        '''Utility function for storing a successful fit on its curve and in the fit table of its model, the end user should not call this function'''
+
+        if isinstance(self.curve_dict,LazyCurveDict):
+            #do not load a curve which has been dropped from memory just to store its fit
+            self.curve_dict.set_attribute(key,fit_models[model],fit)
+        else:
+            setattr(self[key],fit_models[model],fit)
+        if self.fit_tables is None:
+            self.fit_tables=dict()
+        self.fit_tables.setdefault(model,FitTable()).set(key,fit)
+        self._clear_fit_error(key,model)
+
+    def _get_fit_table(self,model)->FitTable:
+        '''Utility function for getting the fit table of a model, brought up to date with the fits stored on each curve, the end user should not call this function'''
+
+        if self.fit_tables is None:
+            self.fit_tables=dict()
+        if self.fit_table_stamps is None:
+            self.fit_table_stamps=dict()
+        table=self.fit_tables.setdefault(model,FitTable())
+        #fits run by this CurveSet update the table as they are stored (see _store_fit). Every
+        #fit is read from the curves again after curves were added or removed, otherwise only
+        #those of curves which have been fit directly since they were last read
+        keys=self.keys()
+        attribute=fit_models[model]
+        if isinstance(self.curve_dict,LazyCurveDict):
+            generations=[self.curve_dict.get_attribute(key,'fit_generation') for key in keys]
+        else:
+            generations=[getattr(self.curve_dict[key],'fit_generation',0) for key in keys]
+        changed_only=self.fit_table_stamps.get(model)==len(self.curve_dict)
+        table.sync(keys,lambda key:self.get_curve_attribute(key,attribute),generations,changed_only)
+        self.fit_table_stamps[model]=len(self.curve_dict)
+        return table
+
+    def fit_all_stiff(self,probe_diameter,fit_range=[0,1],on_error='raise',chunk_size=None):
         '''Fit all force curves in this CurveSet using the
         hertz contact model for an elastic sphere
         indenting an elastic half space
@@ -684,37 +2840,332 @@ class CurveSet:
         long as the second number is larger than the
         first
 
+        on_error: Either 'raise' or 'record'. If 'record',
+        curves which cannot be fit are skipped and the
+        exception is stored in self.fit_errors (see
+        get_fit_errors) instead of stopping the fits
+
+        The model is linear in the reduced modulus, so the
+        curves are solved together in closed form, in
+        blocks so that only a bounded number of fit windows
+        are held at once. The results are identical to
+        calling fit_stiffness on each curve
+
+        chunk_size: If not None, process the curves in
+        chunks of at most this many curves (see
+        iter_chunks), so that lazily loaded CurveSets never
+        hold more than one chunk in memory
+
         ---------------------Returns---------------------
 
         None'''
 
-        for key in self:
-            self[key].fit_stiffness(probe_diameter,fit_range)
+        if chunk_size is not None:
+            for chunk in self.iter_chunks(chunk_size):
+                chunk.fit_all_stiff(probe_diameter,fit_range,on_error)
+            return
 
-    def fit_all_biexponential(self):
+        r=probe_diameter/2
+        cache=self._get_fit_cache()
+        #each curve is read once, fit windows are only held until their block is solved
+        pending=[]
+        for key in self.keys():
+            curve=self[key]
+            try:
+                if curve.contact_index==None:
+                    raise Exception(f'Contact index has not been set for curve {key}, stiffness fits cannot continue')
+                approach_end=curve.dwell_range[0]+1
+                indent_raw=curve.get_array('ind')[curve.contact_index:approach_end]
+                force_raw=curve.get_array('f')[curve.contact_index:approach_end]
+                indent_norm_fit,force_norm_fit,imin,imax=_stiff_window(indent_raw,force_raw,fit_range)
+                if imax<=imin:
+                    raise Exception(f'No data points fall inside fit_range for curve {key}, stiffness fits cannot continue')
+            except Exception as e:
+                self._record_fit_error(key,'stiff',e,on_error)
+                continue
+            cache_key=None
+            if cache is not None:
+                cache_key=pyrtz.fitcache.fit_key('stiff',(indent_raw,force_raw),probe_diameter=float(probe_diameter),
+                                                 fit_range=[float(a) for a in fit_range],
+                                                 contact_index=int(curve.contact_index))
+            meta=dict(contact_index=int(curve.contact_index),fit_start=imin,fit_stop=imax,r=r)
+            pending.append((key,indent_norm_fit,force_norm_fit,meta,cache_key))
+            if len(pending)>=stiff_fit_block:
+                self._solve_stiff_block(pending,cache,r)
+                pending=[]
+        if pending:
+            self._solve_stiff_block(pending,cache,r)
+
+    def _solve_stiff_block(self,pending,cache,r):
+        '''Utility function for solving the stiffness fits of a block of curves together and storing them, the end user should not call this function
+
+        pending is a list of (key,indent_norm_fit,force_norm_fit,meta,cache_key)
+        tuples, meta holding the entries of stiff_fit other than the fit itself'''
+
+        cached=self._read_fit_cache(cache,'stiff',[entry[4] for entry in pending])
+        todo=[i for i,entry in enumerate(pending) if entry[4] not in cached]
+        fits=dict()
+        if todo:
+            offsets=np.concatenate([[0],np.cumsum([len(pending[i][1]) for i in todo])])
+            estar,estar_err,sse=pyrtz.fitting.hertz_fit_segments(np.concatenate([pending[i][1] for i in todo]),
+                                                                 np.concatenate([pending[i][2] for i in todo]),offsets,r)
+            fits={i:(estar[j],estar_err[j]) for j,i in enumerate(todo)}
+
+        new_fits=dict()
+        for i,(key,indent_norm_fit,force_norm_fit,meta,cache_key) in enumerate(pending):
+            if i in fits:
+                estar_fit,estar_err=fits[i]
+            else:
+                estar_fit,estar_err=cached[cache_key]['estar'],cached[cache_key]['estar_err']
+            stiff_fit=dict(estar=estar_fit,estar_err=estar_err,**meta)
+            self._store_fit(key,'stiff',stiff_fit)
+            if cache is not None and i in fits:
+                new_fits[cache_key]=stiff_fit
+        if cache is not None:
+            cache.put_many(new_fits)
+
+    def _fit_all_dwell(self,models,workers,executor,on_error,transport='pickle',warm_start=None,group_by=None,chunk_size=None,group_seeds=None):
+        '''Utility function for running dwell region fits on every curve, optionally in a pool of workers, the end user should not call this function'''
+
+        if transport not in ('pickle','shared'):
+            raise Exception(f"transport must be 'pickle' or 'shared', not {transport}")
+        if warm_start not in (None,'previous','group'):
+            raise Exception(f"warm_start must be None, 'previous' or 'group', not {warm_start}")
+        if chunk_size is not None:
+            group_seeds=self._chunked_group_seeds(models,workers,executor,on_error,transport,warm_start,group_by)
+            for chunk in self.iter_chunks(chunk_size):
+                chunk._fit_all_dwell(models,workers,executor,on_error,transport,warm_start,group_by,group_seeds=group_seeds)
+            return
+
+        keys=self.keys()
+
+        #fits which are already cached are not sent to the workers
+        cache=self._get_fit_cache()
+        cache_keys=dict()
+        todo={key:list(models) for key in keys}
+        if cache is not None:
+            for key in keys:
+                curve=self[key]
+                start,stop=curve.dwell_range[0],curve.dwell_range[1]+1
+                arrays=(curve.get_array('t')[start:stop],curve.get_array('f')[start:stop])
+                for model in models:
+                    cache_keys[key,model]=pyrtz.fitcache.fit_key(model,arrays)
+            for model in models:
+                cached=self._read_fit_cache(cache,model,[cache_keys[key,model] for key in keys])
+                for key in keys:
+                    fit=cached.get(cache_keys[key,model])
+                    if fit is None:
+                        continue
+                    curve=self[key]
+                    fit['curve']=_dwell_fit_curve(curve.get_dwell(),curve.cols['t'],curve.cols['f'],model,fit)
+                    self._store_fit(key,model,fit)
+                    todo[key].remove(model)
+        todo={key:todo_models for key,todo_models in todo.items() if todo_models}
+
+        p0s=dict()
+        if warm_start=='previous':
+            for key,todo_models in todo.items():
+                for model in todo_models:
+                    p0s[key,model]=_warm_start_params(model,self.get_curve_attribute(key,fit_models[model]))
+        elif warm_start=='group':
+            group_of=self._warm_start_groups(group_by)
+            if group_seeds is None:
+                seeds,pilots=self._seed_groups(models,group_of,todo,
+                                               lambda pilots:self._run_dwell_fits(pilots,dict(),workers,executor,on_error,transport,cache,cache_keys))
+            else:
+                #seeded by the CurveSet this chunk belongs to
+                seeds,pilots=group_seeds
+            todo={key:[m for m in todo_models if m not in pilots.get(key,[])] for key,todo_models in todo.items()}
+            todo={key:todo_models for key,todo_models in todo.items() if todo_models}
+            for key,todo_models in todo.items():
+                for model in todo_models:
+                    p0s[key,model]=seeds.get((group_of[key],model))
+        self._run_dwell_fits(todo,p0s,workers,executor,on_error,transport,cache,cache_keys)
+
+    def _seed_groups(self,models,group_of,todo,run_pilots)->tuple:
+        '''Utility function for finding the warm start seed of every group, fitting one curve of each unseeded group first, the end user should not call this function'''
+
+        seeds=self._warm_start_seeds(models,group_of)
+        #fit one curve per unseeded group first, the rest of the group starts from it
+        pilots=dict()
+        for key,todo_models in todo.items():
+            for model in todo_models:
+                if (group_of[key],model) not in seeds:
+                    seeds[group_of[key],model]=None
+                    pilots.setdefault(key,[]).append(model)
+        if pilots:
+            run_pilots(pilots)
+            seeds=self._warm_start_seeds(models,group_of)
+        return seeds,pilots
+
+    def _chunked_group_seeds(self,models,workers,executor,on_error,transport,warm_start,group_by):
+        '''Utility function for seeding warm_start='group' fits once for every chunk of this CurveSet, the end user should not call this function'''
+
+        if warm_start!='group':
+            return None
+
+        def run_pilots(pilots):
+            for model in models:
+                keys=[key for key,pilot_models in pilots.items() if model in pilot_models]
+                if keys:
+                    self.subset(keys)._fit_all_dwell([model],workers,executor,on_error,transport)
+
+        #seeding each chunk separately would make the fits depend on chunk_size
+        return self._seed_groups(models,self._warm_start_groups(group_by),{key:list(models) for key in self.keys()},run_pilots)
+
+    def _warm_start_groups(self,group_by)->dict:
+        '''Utility function for finding the warm start group of every curve, the end user should not call this function'''
+
+        if group_by is None:
+            group_by=self.ident_labels[:-1]
+        for label in group_by:
+            if label not in self.ident_labels:
+                raise Exception(f'{label} is not an ident_label of this CurveSet')
+        positions=[self.ident_labels.index(label) for label in group_by]
+        return {key:tuple(key[i] for i in positions) for key in self.keys()}
+
+    def _warm_start_seeds(self,models,group_of)->dict:
+        '''Utility function for computing the median existing fit parameters of each warm start group, the end user should not call this function'''
+
+        params=dict()
+        for key,group in group_of.items():
+            for model in models:
+                p=_warm_start_params(model,self.get_curve_attribute(key,fit_models[model]))
+                if p is not None:
+                    params.setdefault((group,model),[]).append(p)
+        return {group_model:np.median(np.stack(p),axis=0) for group_model,p in params.items()}
+
+    def _run_dwell_fits(self,todo,p0s,workers,executor,on_error,transport,cache,cache_keys):
+        '''Utility function for fitting the given models of the given curves and merging the results, the end user should not call this function'''
+
+        if not todo:
+            return
+        if transport=='shared' and workers!=1 and executor=='process' and len(todo)>1:
+            positions={key:i for i,key in enumerate(self.keys())}
+            with self.share() as shared:
+                tasks=[(shared.descriptor,positions[key],shared.headers[positions[key]],todo_models,
+                        {model:p0s.get((key,model)) for model in todo_models}) for key,todo_models in todo.items()]
+                results=pyrtz.utils.map_parallel(_fit_dwell_shared_worker,tasks,workers,executor)
+        else:
+            tasks=[(*_dwell_task(self[key]),todo_models,{model:p0s.get((key,model)) for model in todo_models}) for key,todo_models in todo.items()]
+            results=pyrtz.utils.map_parallel(_fit_dwell_worker,tasks,workers,executor)
+        if on_error=='raise':
+            #nothing is merged from a run which is going to raise
+            for fits,errors in results:
+                for error in errors.values():
+                    raise error
+        new_fits=dict()
+        for key,(fits,errors) in zip(todo,results):
+            for model,fit in fits.items():
+                self._store_fit(key,model,fit)
+                if cache is not None:
+                    new_fits[cache_keys[key,model]]=fit
+            for model,error in errors.items():
+                self._record_fit_error(key,model,error,on_error)
+        if cache is not None:
+            cache.put_many(new_fits)
+
+    def fit_all_biexponential(self,workers=1,executor='process',on_error='raise',transport='pickle',warm_start=None,group_by=None,chunk_size=None):
         '''Fit the dwell region of every curve contained in
         this CurveSet to a biexponential decay function
 
+        --------------------Arguments--------------------
+
+        workers: The number of workers to fit curves with.
+        The default of 1 fits every curve in the calling
+        process, None uses one worker per available cpu
+
+        executor: Either 'process' or 'thread', the kind of
+        worker pool used when workers is not 1
+
+        transport: How curves are sent to worker processes.
+        'pickle' sends a copy of each curve, 'shared'
+        publishes the columns of every curve in shared
+        memory once (see share) and only sends their
+        location. Only used when executor is 'process'
+
+        warm_start: How the initial guesses of each fit are
+        chosen. None uses guesses based on the time taken to
+        relax by 63%. 'previous' starts from the existing
+        fit of each curve, for example from an earlier run.
+        'group' starts from the median of the existing fits
+        of the curves in the same group (see group_by); in
+        groups with no existing fits one curve is fit first
+        to seed the others. Curves without a warm start, or
+        whose warm started fit fails, use the default
+        guesses
+
+        group_by: The ident_labels defining the groups used
+        by warm_start='group'. None uses every ident_label
+        except the last
+
+        on_error: Either 'raise' or 'record'. If 'record',
+        curves which cannot be fit are skipped and the
+        exception is stored in self.fit_errors (see
+        get_fit_errors) instead of stopping the fits
+
+        chunk_size: If not None, process the curves in
+        chunks of at most this many curves (see
+        iter_chunks), so that lazily loaded CurveSets never
+        hold more than one chunk in memory
+
         ---------------------Returns---------------------
 
         None'''
 
-        for key in self:
-            self[key].fit_biexponential()
-
+        self._fit_all_dwell(['biexponential'],workers,executor,on_error,transport,warm_start,group_by,chunk_size)
 
-    def fit_all_exponential(self):
+    def fit_all_exponential(self,workers=1,executor='process',on_error='raise',transport='pickle',warm_start=None,group_by=None,chunk_size=None):
         '''Fit the dwell region of every curve contained in
         this CurveSet to an exponential decay function
 
+        --------------------Arguments--------------------
+
+        workers: The number of workers to fit curves with.
+        The default of 1 fits every curve in the calling
+        process, None uses one worker per available cpu
+
+        executor: Either 'process' or 'thread', the kind of
+        worker pool used when workers is not 1
+
+        transport: How curves are sent to worker processes.
+        'pickle' sends a copy of each curve, 'shared'
+        publishes the columns of every curve in shared
+        memory once (see share) and only sends their
+        location. Only used when executor is 'process'
+
+        warm_start: How the initial guesses of each fit are
+        chosen. None uses guesses based on the time taken to
+        relax by 63%. 'previous' starts from the existing
+        fit of each curve, for example from an earlier run.
+        'group' starts from the median of the existing fits
+        of the curves in the same group (see group_by); in
+        groups with no existing fits one curve is fit first
+        to seed the others. Curves without a warm start, or
+        whose warm started fit fails, use the default
+        guesses
+
+        group_by: The ident_labels defining the groups used
+        by warm_start='group'. None uses every ident_label
+        except the last
+
+        on_error: Either 'raise' or 'record'. If 'record',
+        curves which cannot be fit are skipped and the
+        exception is stored in self.fit_errors (see
+        get_fit_errors) instead of stopping the fits
+
+        chunk_size: If not None, process the curves in
+        chunks of at most this many curves (see
+        iter_chunks), so that lazily loaded CurveSets never
+        hold more than one chunk in memory
+
         ---------------------Returns---------------------
 
         None'''
 
-        for key in self:
-            self[key].fit_exponential()
+        self._fit_all_dwell(['exponential'],workers,executor,on_error,transport,warm_start,group_by,chunk_size)
 
-    def fit_all(self,probe_diameter,fit_range=[0,1]):
+    def fit_all(self,probe_diameter,fit_range=[0,1],workers=1,executor='process',on_error='raise',transport='pickle',warm_start=None,group_by=None,chunk_size=None):
         '''Fit this force curve using the hertz contact model
         for an elastic sphere indenting an elastic half space
         and then fit the dwell region of each curve contained
@@ -740,79 +3191,252 @@ class CurveSet:
         long as the second number is larger than the
         first
 
+        workers: The number of workers used for the dwell
+        region fits. The default of 1 fits every curve in
+        the calling process, None uses one worker per
+        available cpu. The stiffness fits are solved in
+        closed form in the calling process
+
+        executor: Either 'process' or 'thread', the kind of
+        worker pool used when workers is not 1
+
+        transport: How curves are sent to worker processes.
+        'pickle' sends a copy of each curve, 'shared'
+        publishes the columns of every curve in shared
+        memory once (see share) and only sends their
+        location. Only used when executor is 'process'
+
+        warm_start: How the initial guesses of each fit are
+        chosen. None uses guesses based on the time taken to
+        relax by 63%. 'previous' starts from the existing
+        fit of each curve, for example from an earlier run.
+        'group' starts from the median of the existing fits
+        of the curves in the same group (see group_by); in
+        groups with no existing fits one curve is fit first
+        to seed the others. Curves without a warm start, or
+        whose warm started fit fails, use the default
+        guesses
+
+        group_by: The ident_labels defining the groups used
+        by warm_start='group'. None uses every ident_label
+        except the last
+
+        on_error: Either 'raise' or 'record'. If 'record',
+        a fit which fails for a curve is skipped and the
+        exception is stored in self.fit_errors (see
+        get_fit_errors) while every other fit continues
+
+        chunk_size: If not None, process the curves in
+        chunks of at most this many curves (see
+        iter_chunks), so that lazily loaded CurveSets never
+        hold more than one chunk in memory
+
         ---------------------Returns---------------------
 
         None'''
 
-        self.fit_all_stiff(probe_diameter,fit_range)
-        self.fit_all_biexponential()
-        self.fit_all_exponential()
+        if chunk_size is not None:
+            models=['biexponential','exponential']
+            group_seeds=self._chunked_group_seeds(models,workers,executor,on_error,transport,warm_start,group_by)
+            #run every fit on a chunk while its curves are loaded
+            for chunk in self.iter_chunks(chunk_size):
+                chunk.fit_all_stiff(probe_diameter,fit_range,on_error)
+                chunk._fit_all_dwell(models,workers,executor,on_error,transport,warm_start,group_by,group_seeds=group_seeds)
+            return
+
+        self.fit_all_stiff(probe_diameter,fit_range,on_error)
+        self._fit_all_dwell(['biexponential','exponential'],workers,executor,on_error,transport,warm_start,group_by)
+
+    def contact_sensitivity(self,probe_diameter,fit_range=[0,1],window=50,per_candidate=False)->pd.DataFrame:
+        '''Measure how sensitive the fitted modulus of every
+        curve in this CurveSet is to its contact point, see
+        pyrtz.curves.Curve.contact_sensitivity. Curves whose
+        contact point has not been set are skipped
+
+        --------------------Arguments--------------------
+
+        probe_diameter: The diameter of the indenting
+        sphere, in meters
+
+        fit_range: The portion of the force curve to fit,
+        as in fit_all_stiff
+
+        window: The number of rows either side of each
+        contact point to try
+
+        per_candidate: If True, return every candidate fit
+        rather than a summary per curve
+
+        ---------------------Returns---------------------
+
+        A pandas.DataFrame. By default it has one row per
+        curve with its unique identifier, contact_index,
+        the estar fit at that contact point and the
+        minimum, maximum and standard deviation of estar
+        over the window (estar_min, estar_max, estar_std)
+        along with estar_spread, (estar_max-estar_min)/estar.
+        If per_candidate is True it contains the unique
+        identifier of the curve followed by the columns
+        returned by Curve.contact_sensitivity'''
+
+        entries=[]
+        for key in self.keys():
+            if self.get_curve_attribute(key,'contact_index') is None:
+                continue
+            sweep=self[key].contact_sensitivity(probe_diameter,fit_range,window)
+            idents={label:ident for label,ident in zip(self.ident_labels,key)}
+            if per_candidate:
+                entries.append(sweep.assign(**idents)[[*self.ident_labels,*sweep.columns]])
+                continue
+            estar=sweep['estar'].to_numpy()
+            at_contact=estar[sweep['offset'].to_numpy()==0]
+            estar_fit=at_contact[0] if len(at_contact) else np.nan
+            finite=estar[np.isfinite(estar)]
+            if len(finite):
+                estar_min,estar_max,estar_std=finite.min(),finite.max(),finite.std()
+            else:
+                estar_min=estar_max=estar_std=np.nan
+            entries.append(pd.DataFrame(dict(**{label:[ident] for label,ident in idents.items()},
+                                             contact_index=[self.get_curve_attribute(key,'contact_index')],
+                                             estar=[estar_fit],estar_min=[estar_min],estar_max=[estar_max],
+                                             estar_std=[estar_std],estar_spread=[(estar_max-estar_min)/estar_fit])))
+        if not entries:
+            raise Exception('No curves in this CurveSet have a contact point, the contact point sensitivity cannot be computed')
+        return pd.concat(entries,ignore_index=True)
+
+    def fit_range_sweep(self,probe_diameter,fit_ranges)->pd.DataFrame:
+        '''Repeat the stiffness fit of every curve in this
+        CurveSet for many fit_range windows, see
+        pyrtz.curves.Curve.fit_range_sweep. Curves whose
+        contact point has not been set are skipped
+
+        --------------------Arguments--------------------
+
+        probe_diameter: The diameter of the indenting
+        sphere, in meters
+
+        fit_ranges: A sequence of fit_range windows, each
+        a [start,stop] pair as in fit_all_stiff
+
+        ---------------------Returns---------------------
+
+        A pandas.DataFrame with one row per curve and fit
+        range containing the unique identifier of the curve
+        followed by the columns returned by
+        Curve.fit_range_sweep'''
+
+        entries=[]
+        for key in self.keys():
+            if self.get_curve_attribute(key,'contact_index') is None:
+                continue
+            sweep=self[key].fit_range_sweep(probe_diameter,fit_ranges)
+            idents={label:ident for label,ident in zip(self.ident_labels,key)}
+            entries.append(sweep.assign(**idents)[[*self.ident_labels,*sweep.columns]])
+        if not entries:
+            raise Exception('No curves in this CurveSet have a contact point, stiffness fits cannot continue')
+        return pd.concat(entries,ignore_index=True)
+
+    def get_fit_errors(self)->pd.DataFrame:
+        '''Export the fits which failed when run with
+        on_error='record' as a pandas.DataFrame
+
+        ---------------------Returns---------------------
+
+        A pandas.DataFrame with one row per failed fit,
+        containing the unique identifier of the curve,
+        the model which failed and the exception raised'''
+
+        rows=[]
+        for key,errors in (self.fit_errors or {}).items():
+            for model,error in errors.items():
+                row={label:ident for label,ident in zip(self.ident_labels,key)}
+                row.update(model=model,error=type(error).__name__,message=str(error))
+                rows.append(row)
+        return pd.DataFrame(rows,columns=[*self.ident_labels,'model','error','message'])
+
+    def _fit_results(self,models)->pd.DataFrame:
+        '''Utility function for building a table of the stored parameters of those of the given models which have been fit to at least one curve, the end user should not call this function'''
+
+        keys=self.keys()
+        results={label:[key[i] for key in keys] for i,label in enumerate(self.ident_labels)}
+        fitted=np.zeros(len(keys),dtype=bool)
+        for model in models:
+            columns=self._get_fit_table(model).get_columns(keys)
+            if not columns['fitted'].any():
+                continue
+            fitted|=columns['fitted']
+            for name in result_params[model]:
+                results[name]=columns.get(name,np.full(len(keys),np.nan))
+        return pd.DataFrame(results).loc[fitted].reset_index(drop=True)
+
+    def get_fit_status(self)->pd.DataFrame:
+        '''Report which fits have been performed on each
+        curve in this CurveSet
+
+        ---------------------Returns---------------------
+
+        A pandas.DataFrame with one row per curve and one
+        column per fit model ('stiff', 'biexponential' and
+        'exponential'). Each entry is 'fitted', 'failed'
+        if the last attempt to fit the curve raised an
+        exception (see get_fit_errors) or 'not fitted'
+        if it has not been fit'''
+
+        keys=self.keys()
+        status={label:[key[i] for key in keys] for i,label in enumerate(self.ident_labels)}
+        for model in fit_models:
+            fitted=self._get_fit_table(model).get_columns(keys)['fitted']
+            failed=np.array([model in (self.fit_errors or {}).get(key,{}) for key in keys],dtype=bool)
+            status[model]=np.where(failed,'failed',np.where(fitted,'fitted','not fitted'))
+        return pd.DataFrame(status)
 
     def get_stiff_results(self)->pd.DataFrame:
         '''Export the results of fit_all_stiff as a
-        pandas.DataFrame. If fit_all_stiff has not yet
-        been called on this CurveSet this method will
-        raise an exception
+        pandas.DataFrame. If no curve in this CurveSet has
+        been fit this method will raise an exception.
 
         ---------------------Returns---------------------
 
         A pandas.DataFrame containing the fit parameters
-        for every Curve in this CurveSet'''
+        for every fitted Curve in this CurveSet, see
+        get_fit_status'''
 
-        entries=[]
-        for key in self:
-            df_dict={}
-            for label,ident in zip(self.ident_labels,key):
-                df_dict[label]=[ident]
-            df_dict['estar']=[self[key].stiff_fit['estar']]
-            entries.append(pd.DataFrame(df_dict))
-        return(pd.concat(entries,ignore_index=True))
+        results=self._fit_results(['stiff'])
+        if results.empty:
+            raise Exception('Stiffness fits have not been run. Please run fit_all_stiff before attempting to export results')
+        return results
 
     def get_biexponential_results(self)->pd.DataFrame:
         '''Export the results of fit_all_biexponential
-        as a pandas.DataFrame. If fit_all_biexponential
-        has not yet been called on this CurveSet, this
-        method will raise an exception
+        as a pandas.DataFrame. If no curve in this CurveSet
+        has been fit this method will raise an exception.
 
         ---------------------Returns---------------------
 
         A pandas.DataFrame containing the fit parameters
-        for every Curve in this CurveSet'''
+        for every fitted Curve in this CurveSet, see
+        get_fit_status'''
 
-        entries=[]
-        for key in self:
-            df_dict={}
-            for label,ident in zip(self.ident_labels,key):
-                df_dict[label]=[ident]
-            df_dict['tau1']=[self[key].biexponential_fit['tau1']]
-            df_dict['tau2']=[self[key].biexponential_fit['tau2']]
-            df_dict['tau_fast']=[self[key].biexponential_fit['tau_fast']]
-            df_dict['tau_slow']=[self[key].biexponential_fit['tau_slow']]
-            df_dict['A']=[self[key].biexponential_fit['A']]
-            df_dict['C']=[self[key].biexponential_fit['C']]
-            entries.append(pd.DataFrame(df_dict))
-        return(pd.concat(entries,ignore_index=True))
+        results=self._fit_results(['biexponential'])
+        if results.empty:
+            raise Exception('Biexponential fits have not been run. Please run fit_all_biexponential before attempting to export results')
+        return results
 
     def get_exponential_results(self)->pd.DataFrame:
         '''Export the results of fit_all_exponential
-        as a pandas.DataFrame. If fit_all_exponential
-        has not yet been called on this CurveSet, this
-        method will raise an exception
+        as a pandas.DataFrame. If no curve in this CurveSet
+        has been fit this method will raise an exception.
 
         ---------------------Returns---------------------
 
         A pandas.DataFrame containing the fit parameters
-        for every Curve in this CurveSet'''
+        for every fitted Curve in this CurveSet, see
+        get_fit_status'''
 
-        entries=[]
-        for key in self:
-            df_dict={}
-            for label,ident in zip(self.ident_labels,key):
-                df_dict[label]=[ident]
-            df_dict['tau0']=[self[key].exponential_fit['tau0']]
-            df_dict['C0']=[self[key].exponential_fit['C0']]
-            entries.append(pd.DataFrame(df_dict))
-        return(pd.concat(entries,ignore_index=True))
+        results=self._fit_results(['exponential'])
+        if results.empty:
+            raise Exception('Exponential fits have not been run. Please run fit_all_exponential before attempting to export results')
+        return results
 
     def get_all_results(self)->pd.DataFrame:
         '''Export the results of all fits which have been
@@ -821,33 +3445,23 @@ class CurveSet:
         ---------------------Returns---------------------
 
         A pandas.DataFrame containing the fit parameters
-        for every Curve in this CurveSet'''
-        all_results=[]
-        try:
-            stiff_results=self.get_stiff_results()
-            all_results.append(stiff_results)
-        except TypeError: #This is the exception that happens when the fits have not yet been run
-            pass
-        try:
-            biexponential_results=self.get_biexponential_results()
-            all_results.append(biexponential_results)
-        except TypeError: #This is the exception that happens when the fits have not yet been run
-            pass
-        try:
-            exponential_results=self.get_exponential_results()
-            all_results.append(exponential_results)
-        except TypeError: #This is the exception that happens when the fits have not yet been run
-            pass
-        if len(all_results)<1:
+        of every model which has been fit to at least one
+        Curve in this CurveSet, with one row per Curve
+        which has been fit. Parameters of models which have
+        not been fit to a Curve are NaN, see
+        get_fit_status.
+
+        Behaviour change: this method and the
+        get_*_results methods now leave out curves which
+        have not been fit instead of raising an exception,
+        and this table is the union of the fitted curves of
+        every model rather than the models fit to every
+        curve'''
+
+        results=self._fit_results(list(fit_models))
+        if results.empty:
             raise Exception('No fits have yet been run. Please run a fit before attempting to export results')
-
-        elif len(all_results)==1:
-            return all_results[0]
-        else:
-            res=all_results.pop(0)
-            while all_results:
-                res=pd.merge(res,all_results.pop(0))
-        return res
+        return results
 
     def export_stiffness_fit_report(self,filepath):
         '''Create a .pdf document displaying all
@@ -941,3 +3555,203 @@ class CurveSet:
             merger.append(this_fit_fig_pdf)
 
         merger.write(filepath)
+
+def _read_manifest(path):
+    '''Utility function for reading and checking the manifest of a saved CurveSet, the end user should not call this function'''
+
+    manifest_path=os.path.join(path,'manifest.json')
+    if not os.path.exists(manifest_path):
+        raise Exception(f'{path} does not contain a saved CurveSet')
+    with open(manifest_path,'rt') as mf:
+        manifest=json.load(mf)
+    if manifest.get('format')!='pyrtz-curveset':
+        raise Exception(f'{path} does not contain a saved CurveSet')
+    if manifest['version']>curveset_format_version:
+        raise Exception(f"{path} was saved with a newer version of pyrtz (format version {manifest['version']}), please upgrade pyrtz")
+    return manifest
+
+def _read_curve_keys(path):
+    '''Utility function for reading the unique identifiers of every curve in a saved CurveSet, the end user should not call this function'''
+
+    with open(os.path.join(path,'curves.json'),'rt') as cf:
+        curve_meta=json.load(cf)
+    return [tuple(meta['ident']) for meta in curve_meta],curve_meta
+
+def read_fit_results(path,model=None)->pd.DataFrame:
+    '''Read the fit results stored in a CurveSet saved with
+    pyrtz.curves.CurveSet.save without loading any force
+    curve data
+
+    --------------------Arguments--------------------
+
+    path: The directory the CurveSet was saved to
+
+    model: One of 'stiff', 'biexponential' or
+    'exponential' to read the results of a single
+    model. None reads all of them
+
+    ---------------------Returns---------------------
+
+    A pandas.DataFrame with one column per ident_label
+    and one column per fit parameter. If model is given
+    only fitted curves are included, otherwise every
+    curve is included with NaN (or NA for boolean
+    parameters such as warm_start) for missing fits'''
+
+    manifest=_read_manifest(path)
+    keys,curve_meta=_read_curve_keys(path)
+    models=list(fit_models) if model is None else [model]
+    table={label:[key[j] for key in keys] for j,label in enumerate(manifest['ident_labels'])}
+    keep=np.zeros(len(keys),dtype=bool) if model is not None else np.ones(len(keys),dtype=bool)
+    for m in models:
+        if m not in fit_models:
+            raise Exception(f"model must be one of {list(fit_models)}, not {m}")
+        with np.load(os.path.join(path,'fits',f'{m}.npz')) as fits:
+            for name in fits.files:
+                if name=='fitted':
+                    continue
+                if fits[name].dtype==bool:
+                    #NA rather than False for curves without this fit
+                    table[name]=pd.array(fits[name],dtype='boolean')
+                    table[name][~fits['fitted']]=pd.NA
+                else:
+                    table[name]=fits[name]
+            if model is not None:
+                keep=fits['fitted']
+    return pd.DataFrame(table).loc[keep,:].reset_index(drop=True)
+
+def open_curveset(path,keys=None,mmap=True)->CurveSet:
+    '''Open a CurveSet saved with pyrtz.curves.CurveSet.save
+
+    --------------------Arguments--------------------
+
+    path: The directory the CurveSet was saved to
+
+    keys: A list of unique identifiers of the curves to
+    load. None loads every curve
+
+    mmap: If True, the force curve columns are memory
+    mapped rather than read into memory, so only the
+    parts which are used are read from disk. Changes
+    made to the curves are never written back to the
+    saved files
+
+    ---------------------Returns---------------------
+
+    A pyrtz.curves.CurveSet whose curves are
+    pyrtz.curves.CompactCurve objects. If every curve is
+    loaded the CurveSet is packed (see CurveSet.pack).
+    Fitted curves are not saved, so the fit figure
+    methods require the fits to be run again'''
+
+    manifest=_read_manifest(path)
+    all_keys,curve_meta=_read_curve_keys(path)
+    offsets=np.load(os.path.join(path,'offsets.npy'))
+    dwell_ranges=np.load(os.path.join(path,'dwell_ranges.npy'))
+    contact_index=np.load(os.path.join(path,'contact_index.npy'))
+    #not written by older versions of pyrtz
+    confidence_path=os.path.join(path,'contact_confidence.npy')
+    contact_confidence=np.load(confidence_path) if os.path.exists(confidence_path) else np.full(len(contact_index),np.nan)
+    virt_defl_path=os.path.join(path,'virt_defl.npy')
+    virt_defl=np.load(virt_defl_path) if os.path.exists(virt_defl_path) else np.full((len(contact_index),3),np.nan)
+
+    if keys is None:
+        indices=list(range(len(all_keys)))
+    else:
+        positions={key:i for i,key in enumerate(all_keys)}
+        indices=[positions[tuple(key)] for key in keys]
+
+    columns=dict()
+    for name,dtype in manifest['columns'].items():
+        column_path=os.path.join(path,'columns',f'{name}.bin')
+        if mmap:
+            columns[name]=np.memmap(column_path,dtype=np.dtype(dtype),mode='c',shape=(int(offsets[-1]),))
+        else:
+            columns[name]=np.fromfile(column_path,dtype=np.dtype(dtype))
+
+    fits=dict()
+    for model in fit_models:
+        with np.load(os.path.join(path,'fits',f'{model}.npz')) as model_fits:
+            fits[model]={name:model_fits[name] for name in model_fits.files}
+
+    cols=manifest['cols']
+    curve_dict=dict()
+    for i in indices:
+        meta=curve_meta[i]
+        curve_columns={name:column[offsets[i]:offsets[i+1]] for name,column in columns.items()}
+        curve=CompactCurve(filename=meta['filename'],columns=curve_columns,parameters=meta['parameters'],
+                           z_col=cols['z'],t_col=cols['t'],f_col=cols['f'],ind_col=cols['ind'],
+                           invOLS=meta['invOLS'],k=meta['k'],dwell_range=dwell_ranges[i])
+        if contact_index[i]>=0:
+            curve.contact_index=int(contact_index[i])
+        if np.isfinite(contact_confidence[i]):
+            curve.contact_confidence=float(contact_confidence[i])
+        if np.isfinite(virt_defl[i,0]):
+            curve.virt_defl_fit=dict(slope=virt_defl[i,0],intercept=virt_defl[i,1],contact_index=int(virt_defl[i,2]))
+        for model,attribute in fit_models.items():
+            if fits[model]['fitted'][i]:
+                fit={name:fits[model][name][i] for name in fits[model] if name!='fitted'}
+                #flags such as warm_start come back as booleans rather than numbers
+                setattr(curve,attribute,{name:bool(value) if isinstance(value,np.bool_) else value for name,value in fit.items()})
+        curve_dict[all_keys[i]]=curve
+
+    curveset=CurveSet(ident_labels=tuple(manifest['ident_labels']),curve_dict=curve_dict)
+    curveset.load_errors=dict()
+    if keys is None:
+        packed=PackedCurves(all_keys,columns,offsets,dwell_ranges)
+        for key,views in zip(all_keys,packed.views):
+            curve_dict[key].columns=dict(views)
+        curveset.packed=packed
+    return curveset
+
+def _dwell_task(curve)->tuple:
+    '''Utility function for collecting the parts of a curve needed to fit its dwell region in a worker, the end user should not call this function
+
+    Returns a (header,columns) tuple, columns holding only the time and force
+    of the dwell region'''
+
+    start,stop=curve.dwell_range[0],curve.dwell_range[1]+1
+    return _curve_header(curve),{curve.cols[c]:curve.get_array(c)[start:stop] for c in ('t','f')}
+
+def _fit_dwell_curve(curve,models,p0s)->tuple:
+    '''Utility function for running the dwell region fits of a single curve, the end user should not call this function
+
+    p0s is a dict of initial guesses keyed by model name. Returns a
+    (fits,errors) tuple of dicts keyed by model name'''
+
+    fits=dict()
+    errors=dict()
+    for model in models:
+        try:
+            getattr(curve,fit_methods[model])(p0=p0s.get(model))
+            fits[model]=getattr(curve,fit_models[model])
+        except Exception as e:
+            errors[model]=e
+    return fits,errors
+
+def _fit_dwell_worker(task):
+    '''Utility function for running the dwell region fits of a single curve inside a worker pool, the end user should not call this function
+
+    task is a (header,columns,models,p0s) tuple built by _dwell_task, so only
+    the dwell region is sent to the worker'''
+
+    header,columns,models,p0s=task
+    start,stop=header['dwell_range']
+    cols=header['cols']
+    curve=CompactCurve(filename=header['filename'],columns=columns,parameters=dict(),
+                       z_col=cols['z'],t_col=cols['t'],f_col=cols['f'],ind_col=cols['ind'],
+                       invOLS=header['invOLS'],k=header['k'],dwell_range=[0,stop-start])
+    curve.track_fits=False
+    fits,errors=_fit_dwell_curve(curve,models,p0s)
+    for fit in fits.values():
+        #number the rows of the fitted curve as in the whole force curve
+        fit['curve'].index=fit['curve'].index+start
+    return fits,errors
+
+def _fit_dwell_shared_worker(task):
+    '''Utility function for running the dwell region fits of a single curve published by CurveSet.share inside a worker pool, the end user should not call this function
+
+    task is a (descriptor,index,header,models,p0s) tuple'''
+
+    descriptor,i,header,models,p0s=task
+    return _fit_dwell_curve(_shared_curve(descriptor,i,header),models,p0s)
@@ -0,0 +1,239 @@
+'Persistent cache of fit results, keyed by the data and arguments of each fit'
+
+import sqlite3
+import hashlib
+import json
+import time
+import os
+import numpy as np
+
+#Changing the fitting code should invalidate old entries, bump this when it does
+fit_cache_version=1
+
+#FitCache objects opened by default_cache, keyed by database path
+_default_caches=dict()
+
+def fit_key(model,arrays,**arguments)->str:
+    '''Compute the cache key of a single fit
+
+    --------------------Arguments--------------------
+
+    model: The name of the model being fit (for
+    example 'stiff' or 'biexponential')
+
+    arrays: A sequence of numpy arrays containing the
+    data the fit uses
+
+    arguments: Any other values the fit result depends
+    on (for example probe_diameter), these must be
+    serializable as JSON
+
+    ---------------------Returns---------------------
+
+    A string containing a hash of all of the above'''
+
+    h=hashlib.sha1()
+    h.update(json.dumps([fit_cache_version,model,arguments],sort_keys=True,default=float).encode())
+    for array in arrays:
+        array=np.ascontiguousarray(array)
+        h.update(f'|{array.dtype.str}|{array.shape}|'.encode())
+        h.update(array.data)
+    return h.hexdigest()
+
+def _to_json(fit)->dict:
+    '''Utility function for converting the numpy scalars in a fit dict to python values, the end user should not call this function'''
+
+    converted=dict()
+    for name,value in fit.items():
+        if isinstance(value,np.integer):
+            value=int(value)
+        elif isinstance(value,np.floating):
+            value=float(value)
+        converted[name]=value
+    return converted
+
+class FitCache:
+    '''A size bounded store of fit results in an sqlite
+    database. When more than max_entries results are
+    stored the least recently used ones are discarded'''
+
+    def __init__(self,path,max_entries=100000):
+        '''Construct a new pyrtz.fitcache.FitCache object
+
+        --------------------Arguments--------------------
+
+        path: Path to the sqlite database file, it is
+        created if it does not exist
+
+        max_entries: The maximum number of fit results
+        to keep
+
+        ---------------------Returns---------------------
+
+        A new pyrtz.fitcache.FitCache object'''
+
+        self.path=os.path.abspath(path)
+        self.max_entries=max_entries
+        self.hits=0
+        self.misses=0
+        self._conn=None
+        self._pid=None
+
+    def __getstate__(self):
+        #sqlite connections cannot be pickled, a new one is opened when needed
+        state=self.__dict__.copy()
+        state['_conn']=None
+        state['_pid']=None
+        return state
+
+    def _connection(self):
+        '''Utility function for opening the database, the end user should not call this function'''
+
+        if self._conn is None or self._pid!=os.getpid():
+            directory=os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory,exist_ok=True)
+            self._conn=sqlite3.connect(self.path,timeout=30)
+            self._conn.execute('CREATE TABLE IF NOT EXISTS fits (key TEXT PRIMARY KEY, fit TEXT NOT NULL, used REAL NOT NULL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS fits_used ON fits (used)')
+            self._conn.commit()
+            self._pid=os.getpid()
+        return self._conn
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM fits').fetchone()[0]
+
+    def get_many(self,keys)->dict:
+        '''Look up several fit results at once
+
+        --------------------Arguments--------------------
+
+        keys: A sequence of keys created by
+        pyrtz.fitcache.fit_key
+
+        ---------------------Returns---------------------
+
+        A dict mapping each key which was found to its
+        fit result. self.hits and self.misses are
+        updated'''
+
+        keys=list(keys)
+        conn=self._connection()
+        found=dict()
+        #stay under the sqlite limit on the number of parameters in a query
+        for start in range(0,len(keys),500):
+            chunk=keys[start:start+500]
+            query=f'SELECT key, fit FROM fits WHERE key IN ({",".join("?"*len(chunk))})'
+            for key,fit in conn.execute(query,chunk):
+                #fits computed by pyrtz hold numpy floats, return the same types
+                found[key]={n:(np.float64(v) if isinstance(v,float) else v) for n,v in json.loads(fit).items()}
+        if found:
+            now=time.time()
+            conn.executemany('UPDATE fits SET used=? WHERE key=?',[(now,key) for key in found])
+            conn.commit()
+        self.hits+=len(found)
+        self.misses+=len(keys)-len(found)
+        return found
+
+    def get(self,key):
+        '''Look up a single fit result
+
+        --------------------Arguments--------------------
+
+        key: A key created by pyrtz.fitcache.fit_key
+
+        ---------------------Returns---------------------
+
+        The fit result (a dict) or None if key is not in
+        the cache'''
+
+        return self.get_many([key]).get(key)
+
+    def put_many(self,fits):
+        '''Store several fit results at once, discarding the
+        least recently used results if the cache is full
+
+        --------------------Arguments--------------------
+
+        fits: A dict mapping keys created by
+        pyrtz.fitcache.fit_key to fit results. Fit results
+        are dicts of numbers and strings, any entry named
+        'curve' is not stored
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        if not fits:
+            return
+        conn=self._connection()
+        now=time.time()
+        rows=[(key,json.dumps(_to_json({n:v for n,v in fit.items() if n!='curve'})),now) for key,fit in fits.items()]
+        conn.executemany('INSERT OR REPLACE INTO fits (key, fit, used) VALUES (?,?,?)',rows)
+        excess=conn.execute('SELECT COUNT(*) FROM fits').fetchone()[0]-self.max_entries
+        if excess>0:
+            conn.execute('DELETE FROM fits WHERE key IN (SELECT key FROM fits ORDER BY used LIMIT ?)',(excess,))
+        conn.commit()
+
+    def put(self,key,fit):
+        '''Store a single fit result, see put_many
+
+        --------------------Arguments--------------------
+
+        key: A key created by pyrtz.fitcache.fit_key
+
+        fit: The fit result
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        self.put_many({key:fit})
+
+    def clear(self):
+        '''Delete every stored fit result and reset the hit
+        and miss counts
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        conn=self._connection()
+        conn.execute('DELETE FROM fits')
+        conn.commit()
+        self.hits=0
+        self.misses=0
+
+    def close(self):
+        '''Close the connection to the database. It is
+        reopened if the cache is used again
+
+        ---------------------Returns---------------------
+
+        None'''
+
+        if self._conn is not None:
+            self._conn.close()
+        self._conn=None
+        self._pid=None
+
+def default_cache():
+    '''Get the fit cache used by pyrtz.curves.CurveSet when
+    none has been set with CurveSet.set_fit_cache. This is
+    stored as fits.sqlite in the directory used to cache
+    parsed .ibw files (see pyrtz.asylum.set_cache_dir)
+
+    ---------------------Returns---------------------
+
+    A pyrtz.fitcache.FitCache object, or None if no
+    cache directory has been set'''
+
+    #imported here, pyrtz.asylum imports pyrtz.curves which imports this module
+    import pyrtz.asylum
+    cache_dir=pyrtz.asylum.get_cache_dir()
+    if not cache_dir:
+        return None
+    path=os.path.join(cache_dir,'fits.sqlite')
+    if path not in _default_caches:
+        _default_caches[path]=FitCache(path)
+    return _default_caches[path]
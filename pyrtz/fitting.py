@@ -0,0 +1,622 @@
+'Vectorized numerical routines used by the fitting methods in pyrtz.curves'
+
+import numpy as np
+import scipy.optimize
+
+#Number of candidate contact points fit together by hertz_contact_sweep
+contact_sweep_block=64
+
+def hertz_force(indentation,e_star,r):
+    '''Force predicted by the hertz model for an elastic
+    sphere indenting an elastic half space. Negative
+    indentations (no contact) give zero force
+
+    --------------------Arguments--------------------
+
+    indentation: Indentation depth(s), in meters
+
+    e_star: The reduced modulus, in pascals
+
+    r: The radius of the indenting sphere, in meters
+
+    ---------------------Returns---------------------
+
+    The force at each indentation, in newtons'''
+
+    return (4/3)*e_star*(r**0.5)*(np.clip(indentation,0,None)**1.5)
+
+def hertz_window(force_norm,fit_range):
+    '''Find the rows of a contact region to use in a
+    stiffness fit. This matches the fit_range handling of
+    pyrtz.curves.Curve.fit_stiffness: each bound is the
+    first row at which the force reaches the given fraction
+    of the final force (or 0 if it is never reached)
+
+    --------------------Arguments--------------------
+
+    force_norm: The force in the contact region,
+    relative to the force at the contact point
+
+    fit_range: A sequence of fractions of the final
+    force. Usually two entries, [start,stop], but any
+    number of fractions are accepted
+
+    ---------------------Returns---------------------
+
+    An integer array containing the row for each entry
+    in fit_range'''
+
+    force_norm=np.asarray(force_norm)
+    thresholds=force_norm[-1]*np.asarray(fit_range,dtype=float)
+    #the first row reaching a threshold is the first row where the running maximum reaches it
+    running_max=np.maximum.accumulate(force_norm)
+    rows=np.searchsorted(running_max,thresholds,side='left')
+    rows[rows==len(force_norm)]=0
+    return rows
+
+def hertz_fit_segments(indent_norm,force_norm,offsets,r):
+    '''Least squares fit of the hertz model to many
+    segments at once. The model is linear in e_star, so each
+    segment is solved exactly in closed form
+
+    --------------------Arguments--------------------
+
+    indent_norm: The indentation of every segment, back
+    to back, relative to the contact point
+
+    force_norm: The force of every segment, back to
+    back, relative to the contact point
+
+    offsets: An integer array of length (number of
+    segments)+1, segment i occupying rows offsets[i] to
+    offsets[i+1]
+
+    r: The radius of the indenting sphere, in meters
+
+    ---------------------Returns---------------------
+
+    A (estar,estar_err,sse) tuple of arrays with one
+    entry per segment: the fitted reduced modulus, its
+    standard error (as reported by
+    scipy.optimize.curve_fit) and the sum of squared
+    residuals'''
+
+    offsets=np.asarray(offsets,dtype=np.int64)
+    lengths=np.diff(offsets)
+    n=len(lengths)
+    segment=np.repeat(np.arange(n),lengths)
+    x=hertz_force(np.asarray(indent_norm,dtype=float),1,r)
+    y=np.asarray(force_norm,dtype=float)
+
+    sxx=np.bincount(segment,x*x,minlength=n)
+    sxy=np.bincount(segment,x*y,minlength=n)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        estar=sxy/sxx
+        residual=y-estar[segment]*x
+        sse=np.bincount(segment,residual*residual,minlength=n)
+        estar_err=np.sqrt(sse/(lengths-1)/sxx)
+    return estar,estar_err,sse
+
+def hertz_fit(indent_norm,force_norm,r):
+    '''Least squares fit of the hertz model to a single
+    segment. See hertz_fit_segments
+
+    --------------------Arguments--------------------
+
+    indent_norm: The indentation relative to the contact
+    point
+
+    force_norm: The force relative to the contact point
+
+    r: The radius of the indenting sphere, in meters
+
+    ---------------------Returns---------------------
+
+    A (estar,estar_err,sse) tuple'''
+
+    estar,estar_err,sse=hertz_fit_segments(indent_norm,force_norm,[0,len(indent_norm)],r)
+    return estar[0],estar_err[0],sse[0]
+
+def _varpro(theta0,bounds,model):
+    '''Utility function for solving a separable least squares problem by variable projection, the end user should not call this function
+
+    model(theta) must return (y_tilde,basis,partials) where the residual for
+    linear coefficients c is y_tilde-basis@c and partials(c) returns the
+    derivative of that residual with respect to theta at fixed c (one column
+    per entry of theta). Returns (theta,c,scipy.optimize.OptimizeResult)'''
+
+    last=dict()
+    def solve(theta):
+        key=tuple(theta)
+        if last.get('key')!=key:
+            y_tilde,basis,partials=model(theta)
+            c=np.linalg.lstsq(basis,y_tilde,rcond=None)[0]
+            last.update(key=key,basis=basis,c=c,residual=y_tilde-basis@c,partials=partials)
+        return last
+
+    def fun(theta):
+        return solve(theta)['residual']
+
+    def jac(theta):
+        s=solve(theta)
+        #Kaufman's approximation: project the fixed-coefficient derivative onto the complement of the basis
+        d=s['partials'](s['c'])
+        return d-s['basis']@np.linalg.lstsq(s['basis'],d,rcond=None)[0]
+
+    result=scipy.optimize.least_squares(fun,theta0,jac=jac,bounds=bounds,method='trf')
+    return result.x,solve(result.x)['c'],result
+
+def _force_scale(f):
+    '''Utility function for choosing a unit to express forces in during a fit, the end user should not call this function'''
+
+    scale=np.max(np.abs(f)) if len(f) else 0
+    return scale if scale>0 and np.isfinite(scale) else 1.0
+
+def exponential_model(t,f0,tau0,C):
+    '''The single exponential relaxation model fit by
+    pyrtz.curves.Curve.fit_exponential
+
+    --------------------Arguments--------------------
+
+    t: Time since the start of the dwell region
+
+    f0: The force at the start of the dwell region
+
+    tau0: The decay rate
+
+    C: The force after complete relaxation
+
+    ---------------------Returns---------------------
+
+    The force at each time in t'''
+
+    return (f0-C)*np.exp(-1*t*tau0)+C
+
+def biexponential_model(t,f0,tau1,tau2,A,C):
+    '''The biexponential relaxation model fit by
+    pyrtz.curves.Curve.fit_biexponential
+
+    --------------------Arguments--------------------
+
+    t: Time since the start of the dwell region
+
+    f0: The force at the start of the dwell region
+
+    tau1, tau2: The two decay rates
+
+    A: The fraction of the relaxation with rate tau1
+
+    C: The force after complete relaxation
+
+    ---------------------Returns---------------------
+
+    The force at each time in t'''
+
+    return (f0-C)*(A*np.exp(-1*t*tau1)+(1-A)*np.exp(-1*t*tau2))+C
+
+def fit_exponential(t,f,f0,tau0_guess):
+    '''Fit exponential_model to a relaxation curve. The
+    model is linear in C, so C is eliminated by variable
+    projection and only the decay rate is solved for
+    iteratively, using an analytic jacobian
+
+    --------------------Arguments--------------------
+
+    t: Time since the start of the dwell region
+
+    f: The measured force
+
+    f0: The force at the start of the dwell region
+
+    tau0_guess: Initial guess for the decay rate
+
+    ---------------------Returns---------------------
+
+    A dict containing the fitted tau0 and C0 and the
+    number of residual (nfev) and jacobian (njev)
+    evaluations used'''
+
+    t=np.asarray(t,dtype=float)
+    #forces are ~1e-9 N, work in units of the largest force so the solver tolerances are meaningful
+    scale=_force_scale(f)
+    f=np.asarray(f,dtype=float)/scale
+    f0=f0/scale
+
+    def model(theta):
+        e=np.exp(-1*t*theta[0])
+        #f-f0*e = C*(1-e)
+        return f-f0*e,(1-e)[:,None],lambda c: ((f0-c[0])*t*e)[:,None]
+
+    theta,c,result=_varpro([tau0_guess],([0],[np.inf]),model)
+    return dict(tau0=theta[0],C0=c[0]*scale,nfev=result.nfev,njev=result.njev)
+
+def fit_biexponential(t,f,f0,p0):
+    '''Fit biexponential_model to a relaxation curve. For
+    fixed decay rates the model is linear in (f0-C)*A and
+    C, so these are eliminated by variable projection and
+    only the two rates are solved for iteratively, using
+    an analytic jacobian. If the projected solution does
+    not satisfy 0<=A<=1 the full bounded problem is solved
+    starting from it, also with an analytic jacobian
+
+    --------------------Arguments--------------------
+
+    t: Time since the start of the dwell region
+
+    f: The measured force
+
+    f0: The force at the start of the dwell region
+
+    p0: Initial guesses for [tau1,tau2,A,C]
+
+    ---------------------Returns---------------------
+
+    A dict containing the fitted tau1, tau2, A and C,
+    the number of residual (nfev) and jacobian (njev)
+    evaluations used and the method which produced the
+    result ('varpro' or 'bounded')'''
+
+    t=np.asarray(t,dtype=float)
+    #forces are ~1e-9 N, work in units of the largest force so the solver tolerances are meaningful
+    scale=_force_scale(f)
+    f=np.asarray(f,dtype=float)/scale
+    f0=f0/scale
+    p0=[p0[0],p0[1],p0[2],p0[3]/scale]
+
+    def model(theta):
+        e1=np.exp(-1*t*theta[0])
+        e2=np.exp(-1*t*theta[1])
+        #f-f0*e2 = u*(e1-e2)+C*(1-e2) with u=(f0-C)*A
+        basis=np.stack([e1-e2,1-e2],axis=1)
+        partials=lambda c: np.stack([c[0]*t*e1,(f0-c[0]-c[1])*t*e2],axis=1)
+        return f-f0*e2,basis,partials
+
+    theta,c,result=_varpro(p0[:2],([0,0],[np.inf,np.inf]),model)
+    nfev=result.nfev
+    njev=result.njev
+    tau1,tau2=theta
+    u,C=c
+    A=u/(f0-C) if f0!=C else np.nan
+    if result.success and 0<=A<=1:
+        return dict(tau1=tau1,tau2=tau2,A=A,C=C*scale,nfev=nfev,njev=njev,method='varpro')
+
+    def residual(p):
+        return biexponential_model(t,f0,*p)-f
+
+    def jac(p):
+        tau1,tau2,A,C=p
+        e1=np.exp(-1*t*tau1)
+        e2=np.exp(-1*t*tau2)
+        return np.stack([-(f0-C)*A*t*e1,
+                         -(f0-C)*(1-A)*t*e2,
+                         (f0-C)*(e1-e2),
+                         1-(A*e1+(1-A)*e2)],axis=1)
+
+    if result.success and np.isfinite(A):
+        start=[tau1,tau2,np.clip(A,0,1),C]
+    else:
+        start=list(p0)
+    bounds=([0,0,0,-np.inf],[np.inf,np.inf,1,np.inf])
+    result=scipy.optimize.least_squares(residual,start,jac=jac,bounds=bounds,method='trf')
+    tau1,tau2,A,C=result.x
+    return dict(tau1=tau1,tau2=tau2,A=A,C=C*scale,nfev=nfev+result.nfev,njev=njev+result.njev,method='bounded')
+
+def _suffix_sums(a):
+    '''Utility function for computing the sum of every suffix of an array (entry i is the sum of a[i:]), the end user should not call this function'''
+
+    return np.cumsum(a[::-1])[::-1]
+
+def contact_scores(x,y,min_points=2):
+    '''Score every candidate contact point of an approach
+    curve. For a candidate row c, y is modelled as a
+    constant before c and as a line through (x[c],constant)
+    after it: after contact the hertz model is linear in
+    x if y is force**(2/3). All candidates are scored in a
+    single pass using suffix sums
+
+    --------------------Arguments--------------------
+
+    x: The indentation at each row
+
+    y: Force**(2/3) at each row, relative to the baseline
+
+    min_points: The minimum number of rows on each side
+    of a candidate
+
+    ---------------------Returns---------------------
+
+    An array with the sum of squared residuals of the
+    model for each candidate row. Candidates too close to
+    either end, or for which the slope after contact is
+    not positive, are given np.inf'''
+
+    x=np.asarray(x,dtype=float)
+    y=np.asarray(y,dtype=float)
+    n=len(x)
+    if n==0:
+        return np.zeros(0)
+    #center and scale so the suffix sums do not lose precision
+    x=x-x[0]
+    x_scale=np.max(np.abs(x)) or 1.0
+    x=x/x_scale
+    y_scale=np.max(np.abs(y)) or 1.0
+    y=y/y_scale
+
+    k=n-np.arange(n)
+    sx=_suffix_sums(x)
+    sxx=_suffix_sums(x*x)
+    sy=_suffix_sums(y)
+    sxy=_suffix_sums(x*y)
+    total_y=sy[0]
+    total_yy=np.sum(y*y)
+
+    #h is x-x[c] after the candidate and 0 before it
+    h=sx-k*x
+    hh=sxx-2*x*sx+k*x*x
+    yh=sxy-x*sy
+    with np.errstate(divide='ignore',invalid='ignore'):
+        det=n*hh-h*h
+        m=(total_y*hh-h*yh)/det
+        a=(n*yh-h*total_y)/det
+        sse=total_yy-m*total_y-a*yh
+    rows=np.arange(n)
+    valid=(rows>=min_points)&(k>=min_points)&(det>0)&(a>0)&np.isfinite(sse)
+    return np.where(valid,np.maximum(sse,0),np.inf)*y_scale*y_scale
+
+def detect_contact(z,x,f,baseline_fraction=0.25):
+    '''Find the contact point of an approach curve. A line
+    in z is fit to the force before contact (the same
+    baseline removed by
+    pyrtz.curves.Curve.correct_virt_defl) and every row is
+    scored as the contact point using contact_scores. The
+    baseline is first fit to the leading baseline_fraction
+    of the curve and then refit to every row before the
+    detected contact point, which is then found again.
+    Runs in O(n)
+
+    --------------------Arguments--------------------
+
+    z: The z position at each row of the approach
+
+    x: The indentation at each row of the approach
+
+    f: The force at each row of the approach
+
+    baseline_fraction: The fraction of the approach used
+    for the first baseline fit
+
+    ---------------------Returns---------------------
+
+    A (contact_index,confidence) tuple. confidence is the
+    fraction of the variance of force**(2/3) explained by
+    the model, between 0 and 1. contact_index is None if
+    no candidate could be scored'''
+
+    z=np.asarray(z,dtype=float)
+    x=np.asarray(x,dtype=float)
+    f=np.asarray(f,dtype=float)
+    n=len(f)
+    if n<4:
+        return None,0.0
+    baseline_rows=max(2,int(baseline_fraction*n))
+    for attempt in range(2):
+        zb=z[:baseline_rows]-z[0]
+        fb=f[:baseline_rows]
+        zb_mean=zb.mean()
+        szz=np.sum((zb-zb_mean)**2)
+        slope=np.sum((zb-zb_mean)*(fb-fb.mean()))/szz if szz>0 else 0.0
+        baseline=fb.mean()+slope*(z-z[0]-zb_mean)
+        y=np.clip(f-baseline,0,None)**(2/3)
+        sse=contact_scores(x,y)
+        contact_index=int(np.argmin(sse))
+        if not np.isfinite(sse[contact_index]):
+            return None,0.0
+        baseline_rows=max(2,contact_index)
+    sst=np.sum((y-y.mean())**2)
+    confidence=float(np.clip(1-sse[contact_index]/sst,0,1)) if sst>0 else 0.0
+    return contact_index,confidence
+
+def _hertz_from_sums(sxx,sxy,syy,n_points):
+    '''Utility function for computing hertz fits from their least squares sums, the end user should not call this function
+
+    sxx, sxy and syy are sums of x*x, x*y and y*y over each fit window, x
+    being hertz_force(indentation,1,r) and y the force. Returns a dict of
+    estar, estar_err and sse, NaN where a window is empty'''
+
+    with np.errstate(divide='ignore',invalid='ignore'):
+        estar=np.where(n_points>0,sxy/sxx,np.nan)
+        sse=np.where(n_points>0,np.maximum(syy-sxy*estar,0),np.nan)
+        estar_err=np.sqrt(sse/(n_points-1)/sxx)
+    return dict(estar=estar,estar_err=estar_err,sse=sse)
+
+def hertz_contact_sweep(indentation,force,candidates,r,fit_range=[0,1]):
+    '''Fit the hertz model (as in
+    pyrtz.curves.Curve.fit_stiffness) for many candidate
+    contact points of the same approach curve at once. Each
+    candidate gets its own fit window (see hertz_window) and
+    closed form least squares fit. The hertz model depends
+    on the indentation past each candidate, so the
+    candidates are fit in vectorized blocks of
+    contact_sweep_block (in order along the curve) to
+    bound the memory used
+
+    --------------------Arguments--------------------
+
+    indentation: The indentation at each row of the
+    approach
+
+    force: The force at each row of the approach
+
+    candidates: The rows to try as the contact point
+
+    r: The radius of the indenting sphere, in meters
+
+    fit_range: A two entry sequence defining the portion
+    of the force curve to fit as a ratio of the maximum
+    force, as in fit_stiffness
+
+    ---------------------Returns---------------------
+
+    A dict of arrays with one entry per candidate: estar,
+    estar_err, sse (the sum of squared residuals) and
+    n_points (the number of rows fit). Candidates with no
+    rows to fit have NaN estar, estar_err and sse'''
+
+    indentation=np.asarray(indentation,dtype=float)
+    force=np.asarray(force,dtype=float)
+    candidates=np.asarray(candidates,dtype=np.int64)
+    n=len(force)
+    if np.any(candidates<0) or np.any(candidates>=n):
+        raise Exception('Every candidate contact point must be a row of the approach')
+    results=dict(estar=np.full(len(candidates),np.nan),estar_err=np.full(len(candidates),np.nan),
+                 sse=np.full(len(candidates),np.nan),n_points=np.zeros(len(candidates),dtype=np.int64))
+    #neighbouring candidates share most of their rows
+    order=np.argsort(candidates,kind='stable')
+    for i in range(0,len(order),contact_sweep_block):
+        block=order[i:i+contact_sweep_block]
+        for name,values in _hertz_contact_block(indentation,force,candidates[block],r,fit_range).items():
+            results[name][block]=values
+    return results
+
+def _hertz_contact_block(indentation,force,candidates,r,fit_range):
+    '''Utility function for fitting one block of hertz_contact_sweep, the end user should not call this function
+
+    Every array has one row per candidate and one column per row of the
+    curve from the first candidate on'''
+
+    n=len(force)
+    first=candidates.min()
+    offset=candidates-first
+    columns=np.arange(n-first)
+    after=columns[None,:]>=offset[:,None]
+    force_norm=np.where(after,force[None,first:]-force[candidates][:,None],0)
+
+    #fit window of every candidate, as in hertz_window
+    running_max=np.maximum.accumulate(np.where(after,force_norm,-np.inf),axis=1)
+    rows=[]
+    for bound in fit_range:
+        bound_rows=(running_max<force_norm[:,-1:]*bound).sum(axis=1)-offset
+        bound_rows[bound_rows==n-candidates]=0
+        rows.append(bound_rows)
+    start=offset+rows[0]
+    stop=offset+np.maximum(rows[1],rows[0])
+    inside=(columns[None,:]>=start[:,None])&(columns[None,:]<stop[:,None])
+
+    x=np.where(inside,hertz_force(indentation[None,first:]-indentation[candidates][:,None],1,r),0)
+    y=np.where(inside,force_norm,0)
+    n_points=stop-start
+    sxx=np.sum(x*x,axis=1)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        estar=np.where(n_points>0,np.sum(x*y,axis=1)/sxx,np.nan)
+        #summing the residuals directly avoids the cancellation in syy-sxy*estar
+        sse=np.where(n_points>0,np.sum((y-estar[:,None]*x)**2,axis=1),np.nan)
+        estar_err=np.sqrt(sse/(n_points-1)/sxx)
+    return dict(estar=estar,estar_err=estar_err,sse=sse,n_points=n_points)
+
+def hertz_range_sweep(indentation,force,fit_ranges,r):
+    '''Fit the hertz model (as in
+    pyrtz.curves.Curve.fit_stiffness) to the contact region
+    of a curve for many fit_range windows at once. Every
+    window boundary is found with a single searchsorted
+    (see hertz_window) and each fit is computed from
+    cumulative sums along the curve
+
+    --------------------Arguments--------------------
+
+    indentation: The indentation of the contact region,
+    starting at the contact point
+
+    force: The force of the contact region, starting at
+    the contact point
+
+    fit_ranges: A sequence of [start,stop] pairs, each
+    defining a portion of the force curve to fit as a
+    ratio of the maximum force
+
+    r: The radius of the indenting sphere, in meters
+
+    ---------------------Returns---------------------
+
+    A dict of arrays with one entry per fit range: estar,
+    estar_err, sse (the sum of squared residuals),
+    n_points (the number of rows fit) and the first and
+    last (exclusive) rows fit, start and stop. Fit ranges
+    with no rows to fit have NaN estar, estar_err and
+    sse'''
+
+    indentation=np.asarray(indentation,dtype=float)
+    force=np.asarray(force,dtype=float)
+    fit_ranges=np.asarray(fit_ranges,dtype=float).reshape(-1,2)
+    indent_norm=indentation-indentation[0]
+    force_norm=force-force[0]
+
+    rows=hertz_window(force_norm,fit_ranges.ravel()).reshape(-1,2)
+    start=rows[:,0]
+    stop=np.maximum(rows[:,1],start)
+
+    x=hertz_force(indent_norm,1,r)
+    def window_sums(a):
+        a=np.concatenate([[0],np.cumsum(a)])
+        return a[stop]-a[start]
+    sxx=window_sums(x*x)
+    sxy=window_sums(x*force_norm)
+    syy=window_sums(force_norm*force_norm)
+    return dict(**_hertz_from_sums(sxx,sxy,syy,stop-start),n_points=stop-start,start=start,stop=stop)
+
+def line_fit_segments(x,y,offsets):
+    '''Least squares fit of a straight line to many
+    segments at once, solved in closed form
+
+    --------------------Arguments--------------------
+
+    x: The independent variable of every segment, back
+    to back
+
+    y: The dependent variable of every segment, back to
+    back
+
+    offsets: An integer array of length (number of
+    segments)+1, segment i occupying rows offsets[i] to
+    offsets[i+1]
+
+    ---------------------Returns---------------------
+
+    A (slope,intercept) tuple of arrays with one entry
+    per segment. Both are NaN for segments with fewer
+    than two distinct x values'''
+
+    offsets=np.asarray(offsets,dtype=np.int64)
+    lengths=np.diff(offsets)
+    n=len(lengths)
+    segment=np.repeat(np.arange(n),lengths)
+    x=np.asarray(x,dtype=float)
+    y=np.asarray(y,dtype=float)
+
+    with np.errstate(divide='ignore',invalid='ignore'):
+        x_mean=np.bincount(segment,x,minlength=n)/lengths
+        y_mean=np.bincount(segment,y,minlength=n)/lengths
+        #center each segment so the sums do not lose precision
+        dx=x-x_mean[segment]
+        dy=y-y_mean[segment]
+        sxx=np.bincount(segment,dx*dx,minlength=n)
+        sxy=np.bincount(segment,dx*dy,minlength=n)
+        slope=np.where(sxx>0,sxy/sxx,np.nan)
+        intercept=y_mean-slope*x_mean
+    return slope,intercept
+
+def line_fit(x,y):
+    '''Least squares fit of a straight line to a single
+    segment. See line_fit_segments
+
+    --------------------Arguments--------------------
+
+    x: The independent variable
+
+    y: The dependent variable
+
+    ---------------------Returns---------------------
+
+    A (slope,intercept) tuple'''
+
+    slope,intercept=line_fit_segments(x,y,[0,len(x)])
+    return slope[0],intercept[0]
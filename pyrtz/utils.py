@@ -1,3 +1,6 @@
+import concurrent.futures
+import os
+
 def get_equivalent_diameter_sphere_on_sphere(d_probe,d_cell):
     '''Hertzian contact between to spheres is the 
     same as that between a sphere and a half space
@@ -23,3 +26,45 @@ def get_equivalent_diameter_sphere_on_sphere(d_probe,d_cell):
     r_inv=(1/r_probe)+(1/r_cell)
 
     return 2*(1/r_inv)
+
+def map_parallel(func,items,workers=1,executor='process'):
+    '''Apply func to every entry of items, optionally
+    spreading the work over a pool of workers
+
+    --------------------Arguments--------------------
+
+    func: The function to apply. When executor is
+    'process' this must be a module level function so
+    that it can be sent to the worker processes
+
+    items: A sequence of arguments, func will be called
+    once for each entry
+
+    workers: The number of workers to use. 1 runs
+    everything in the calling process, None uses one
+    worker per available cpu
+
+    executor: Either 'process' or 'thread', selecting
+    the kind of pool used when workers is not 1
+
+    ---------------------Returns---------------------
+
+    A list containing the result of func for each entry
+    of items, in the same order as items'''
+
+    items=list(items)
+    if workers is None:
+        workers=os.cpu_count() or 1
+    if workers==1 or len(items)<2:
+        return [func(a) for a in items]
+
+    if executor=='process':
+        pool_class=concurrent.futures.ProcessPoolExecutor
+    elif executor=='thread':
+        pool_class=concurrent.futures.ThreadPoolExecutor
+    else:
+        raise Exception(f"executor must be 'process' or 'thread', not {executor}")
+
+    chunksize=max(1,len(items)//(4*workers))
+    with pool_class(max_workers=workers) as pool:
+        return list(pool.map(func,items,chunksize=chunksize))
@@ -0,0 +1,64 @@
+'Synthetic Asylum .ibw files for the loading tests'
+
+import os
+import struct
+import numpy as np
+from synthetic import make_curve
+
+#Igor wave type codes
+_wave_types={np.dtype('<f4'):2,np.dtype('<f8'):4}
+
+def write_ibw(path,columns,labels,sample_time,notes,dtype='<f4'):
+    '''Write a version 5 .ibw file holding a single 2D wave
+    with one labelled column per entry in columns and the
+    given notes (a dict)'''
+
+    dtype=np.dtype(dtype)
+    data=np.stack(columns,axis=1).astype(dtype)
+    n_rows,n_cols=data.shape
+    #Igor stores multidimensional waves in column-major order
+    wave_data=data.T.tobytes()
+    note=b'\r'.join(f'{key}: {value}'.encode() for key,value in notes.items())
+    #the first label names the dimension itself
+    dim_labels=b''.join(label.encode().ljust(32,b'\x00') for label in ['',*labels])
+
+    wave_header=bytearray(320)
+    struct.pack_into('<i',wave_header,12,n_rows*n_cols)
+    struct.pack_into('<h',wave_header,16,_wave_types[dtype])
+    wave_header[28:32]=b'wave'
+    struct.pack_into('<4i',wave_header,68,n_rows,n_cols,0,0)
+    struct.pack_into('<4d',wave_header,84,sample_time,1,1,1)
+    bin_header=bytearray(64)
+    struct.pack_into('<h',bin_header,0,5)
+    struct.pack_into('<i',bin_header,4,len(wave_header)+len(wave_data))
+    struct.pack_into('<i',bin_header,12,len(note))
+    struct.pack_into('<4i',bin_header,36,0,len(dim_labels),0,0)
+    #the 16 bit words of both headers sum to zero
+    checksum=sum(struct.unpack('<192h',bytes(bin_header+wave_header)))
+    struct.pack_into('<H',bin_header,2,-checksum&0xffff)
+    with open(path,'wb') as f:
+        f.write(bytes(bin_header+wave_header)+wave_data+note+dim_labels)
+
+def write_curve_ibw(path,seed=0,**kwargs):
+    '''Write the synthetic curve built by
+    synthetic.make_curve to a .ibw file in the layout used
+    by Asylum AFMs'''
+
+    curve=make_curve(seed=seed,**kwargs)
+    defl=curve.data['f'].to_numpy()/curve.k
+    z=curve.data['z'].to_numpy()
+    dt=curve.data['t'].iloc[1]
+    dwell_time=(curve.dwell_range[1]-curve.dwell_range[0])*dt
+    notes=dict(SpringConstant=curve.k,InvOLS=curve.invOLS,DwellTime=dwell_time,Temp='25 C')
+    write_ibw(path,[z+1e-7,defl,z],['Raw','Defl','ZSnsr'],dt,notes)
+
+def make_ibw_folder(folder,n_samples=2,n_measurements=3,**kwargs):
+    '''Write one synthetic .ibw file per (Sample,Measurement)
+    into folder, named as in the load_curveset_ibw example'''
+
+    os.makedirs(folder,exist_ok=True)
+    for s in range(n_samples):
+        for m in range(n_measurements):
+            seed=s*n_measurements+m
+            write_curve_ibw(os.path.join(folder,f'Sample{s}Measurement{m}.ibw'),seed=seed,estar=1000.+500*s+10*m,**kwargs)
+    return folder
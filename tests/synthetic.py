@@ -0,0 +1,41 @@
+'Synthetic force curves for the tests'
+
+import numpy as np
+import pandas as pd
+import pyrtz.curves
+
+def make_curve(seed=0,estar=1000.,contact_index=1200,n_approach=2000,n_dwell=1000,n_retract=1500,
+               dt=1e-3,k=0.05,r=2.5e-6,noise=2e-11):
+    '''Build a pyrtz.curves.Curve holding a hertzian approach
+    with a sloped baseline, a biexponential dwell and a
+    linear retract'''
+
+    rng=np.random.default_rng(seed)
+    z_contact=1e-6
+    z_baseline=np.linspace(0,z_contact,contact_index,endpoint=False)
+    defl_baseline=z_baseline*1e-4
+    delta=np.linspace(0,1.5e-6,n_approach-contact_index)
+    defl_contact=(4/3)*estar*np.sqrt(r)*delta**1.5/k+z_contact*1e-4
+    z=np.concatenate([z_baseline,z_contact+delta+defl_contact])
+    defl=np.concatenate([defl_baseline,defl_contact])
+    t_dwell=np.arange(1,n_dwell+1)*dt
+    defl_trigger=defl[-1]
+    defl_dwell=defl_trigger*(0.25*np.exp(-t_dwell*20)+0.25*np.exp(-t_dwell*2)+0.5)
+    z=np.concatenate([z,np.full(n_dwell,z[-1]),np.linspace(z[-1],0,n_retract)])
+    defl=np.concatenate([defl,defl_dwell,np.linspace(defl_dwell[-1],0,n_retract)])
+    defl=defl+rng.normal(0,noise,defl.shape)
+    data=pd.DataFrame(dict(z=z,t=np.arange(len(z))*dt,f=defl*k,ind=z-defl))
+    trigger_index=int(np.argmax(defl))
+    return pyrtz.curves.Curve(filename=f'curve{seed}.ibw',data=data,parameters={},z_col='z',t_col='t',f_col='f',
+                              ind_col='ind',invOLS=5e-8,k=k,dwell_range=[trigger_index,trigger_index+n_dwell])
+
+def make_curveset(n_samples=2,n_measurements=3,**kwargs)->pyrtz.curves.CurveSet:
+    '''Build a CurveSet of synthetic curves keyed by
+    (Sample,Measurement)'''
+
+    curves=dict()
+    for s in range(n_samples):
+        for m in range(n_measurements):
+            seed=s*n_measurements+m
+            curves[(str(s),str(m))]=make_curve(seed=seed,estar=1000.+500*s+10*m,**kwargs)
+    return pyrtz.curves.CurveSet(ident_labels=['Sample','Measurement'],curve_dict=curves)
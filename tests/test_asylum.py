@@ -0,0 +1,150 @@
+import os
+import tarfile
+import zipfile
+import pytest
+import numpy as np
+import pyrtz.asylum
+from ibw_files import make_ibw_folder,write_curve_ibw
+
+columns=['z','t','f','ind']
+
+#small curves for the tests which load many files
+small_curve=dict(contact_index=60,n_approach=100,n_dwell=50,n_retract=50)
+
+def assert_curves_equal(a,b):
+    for col in columns:
+        np.testing.assert_array_equal(a.get_array(col),b.get_array(col))
+    assert a.dwell_range==b.dwell_range
+    assert a.parameters==b.parameters
+
+def assert_curvesets_equal(a,b):
+    assert a.keys()==b.keys()
+    for key in a.keys():
+        assert_curves_equal(a[key],b[key])
+
+def test_native_matches_igor2(tmp_path):
+    path=str(tmp_path/'curve.ibw')
+    write_curve_ibw(path)
+    native=pyrtz.asylum.load_ibw(path,use_cache=False)
+    igor=pyrtz.asylum.load_ibw(path,use_cache=False,engine='igor2')
+    for col in columns:
+        np.testing.assert_allclose(native.get_array(col),igor.get_array(col),rtol=1e-6)
+    assert native.dwell_range==igor.dwell_range
+    assert native.parameters==igor.parameters
+    assert native.k==igor.k and native.invOLS==igor.invOLS
+
+def test_cache_hit_and_miss(tmp_path,monkeypatch):
+    path=str(tmp_path/'curve.ibw')
+    write_curve_ibw(path)
+    cache_dir=str(tmp_path/'cache')
+    parsed=pyrtz.asylum.load_ibw(path,cache_dir=cache_dir)
+    assert sorted(os.path.splitext(name)[1] for name in os.listdir(cache_dir))==['.json','.npy']
+
+    def no_parse(*args,**kwargs):
+        raise AssertionError('the file was parsed again')
+    monkeypatch.setattr(pyrtz.asylum,'_parse_ibw',no_parse)
+    assert_curves_equal(pyrtz.asylum.load_ibw(path,cache_dir=cache_dir),parsed)
+    assert_curves_equal(pyrtz.asylum.load_ibw(path,cache_dir=cache_dir,mmap=True),parsed)
+
+    #an edited file is a cache miss
+    stat=os.stat(path)
+    os.utime(path,ns=(stat.st_atime_ns,stat.st_mtime_ns+10**9))
+    with pytest.raises(AssertionError):
+        pyrtz.asylum.load_ibw(path,cache_dir=cache_dir)
+
+def test_corrupt_cache_entry_is_parsed_again(tmp_path):
+    path=str(tmp_path/'curve.ibw')
+    write_curve_ibw(path)
+    cache_dir=str(tmp_path/'cache')
+    parsed=pyrtz.asylum.load_ibw(path,cache_dir=cache_dir)
+    entry=[os.path.join(cache_dir,name) for name in os.listdir(cache_dir) if name.endswith('.npy')][0]
+    with open(entry,'r+b') as f:
+        f.truncate(100)
+    assert_curves_equal(pyrtz.asylum.load_ibw(path,cache_dir=cache_dir),parsed)
+    #the entry has been replaced
+    assert_curves_equal(pyrtz.asylum.load_ibw(path,cache_dir=cache_dir),parsed)
+
+def test_archives_match_folder(tmp_path):
+    folder=make_ibw_folder(str(tmp_path/'exp'),**small_curve)
+    expected=pyrtz.asylum.load_curveset_ibw(folder,['Sample','Measurement'])
+    zip_path=str(tmp_path/'exp.zip')
+    tar_path=str(tmp_path/'exp.tar.gz')
+    with zipfile.ZipFile(zip_path,'w') as zf, tarfile.open(tar_path,'w:gz') as tf:
+        for name in sorted(os.listdir(folder)):
+            zf.write(os.path.join(folder,name),f'exp/{name}')
+            tf.add(os.path.join(folder,name),f'exp/{name}')
+    assert_curvesets_equal(pyrtz.asylum.load_curveset_ibw(zip_path,['Sample','Measurement']),expected)
+    assert_curvesets_equal(pyrtz.asylum.load_curveset_ibw(tar_path,['Sample','Measurement']),expected)
+    lazy=pyrtz.asylum.load_curveset_ibw(zip_path,['Sample','Measurement'],lazy=True)
+    assert_curvesets_equal(lazy,expected)
+    pyrtz.asylum.close_archives(zip_path)
+
+def test_parallel_load_matches_serial(tmp_path):
+    folder=make_ibw_folder(str(tmp_path/'exp'),**small_curve)
+    expected=pyrtz.asylum.load_curveset_ibw(folder,['Sample','Measurement'])
+    parallel=pyrtz.asylum.load_curveset_ibw(folder,['Sample','Measurement'],workers=2,executor='thread')
+    assert_curvesets_equal(parallel,expected)
+
+def test_load_errors_are_recorded(tmp_path):
+    folder=make_ibw_folder(str(tmp_path/'exp'),n_samples=1,**small_curve)
+    with open(os.path.join(folder,'Sample0Measurement1.ibw'),'wb') as f:
+        f.write(b'not an ibw file')
+    with pytest.raises(Exception):
+        pyrtz.asylum.load_curveset_ibw(folder,['Sample','Measurement'])
+    curve_set=pyrtz.asylum.load_curveset_ibw(folder,['Sample','Measurement'],on_error='record')
+    assert curve_set.keys()==[('0','0'),('0','2')]
+    assert list(curve_set.load_errors)==[('0','1')]
+
+def test_lazy_eviction(tmp_path):
+    folder=make_ibw_folder(str(tmp_path/'exp'),**small_curve)
+    expected=pyrtz.asylum.load_curveset_ibw(folder,['Sample','Measurement'])
+    lazy=pyrtz.asylum.load_curveset_ibw(folder,['Sample','Measurement'],lazy=True,cache_size=2)
+    for key in lazy.keys():
+        lazy[key].contact_index=60
+        assert len(lazy.curve_dict.loaded)<=2
+    #evicted curves are parsed again and keep their contact points
+    assert_curvesets_equal(lazy,expected)
+    assert all(lazy[key].contact_index==60 for key in lazy.keys())
+
+def test_load_more_files_than_fd_limit(tmp_path,monkeypatch):
+    resource=pytest.importorskip('resource')
+    n_files=300
+    folder=make_ibw_folder(str(tmp_path/'exp'),n_samples=n_files,n_measurements=1,**small_curve)
+    cache_dir=str(tmp_path/'cache')
+    soft,hard=resource.getrlimit(resource.RLIMIT_NOFILE)
+    open_fds=len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else 32
+    resource.setrlimit(resource.RLIMIT_NOFILE,(min(open_fds+n_files//2,hard),hard))
+    try:
+        parsed=pyrtz.asylum.load_curveset_ibw(folder,['Sample','Measurement'],cache_dir=cache_dir)
+        #every file is served from the cache
+        def no_parse(*args,**kwargs):
+            raise AssertionError('the file was parsed again')
+        monkeypatch.setattr(pyrtz.asylum,'_parse_ibw',no_parse)
+        cached=pyrtz.asylum.load_curveset_ibw(folder,['Sample','Measurement'],cache_dir=cache_dir)
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE,(soft,hard))
+    assert len(parsed.keys())==n_files
+    assert_curvesets_equal(cached,parsed)
+
+def test_scan_curveset_ibw(tmp_path):
+    folder=make_ibw_folder(str(tmp_path/'exp'),**small_curve)
+    table=pyrtz.asylum.scan_curveset_ibw(folder,['Sample','Measurement'])
+    assert list(table.columns[:5])==['Sample','Measurement','filename','n_samples','sample_time']
+    assert (table['n_samples']==200).all()
+    np.testing.assert_allclose(table['SpringConstant'],0.05)
+    assert table['Temp'].tolist()==['25 C']*6
+
+def test_watcher_loads_settled_files(tmp_path):
+    folder=make_ibw_folder(str(tmp_path/'exp'),n_samples=1,n_measurements=2)
+    watcher=pyrtz.asylum.CurveSetWatcher(folder,['Sample','Measurement'],settle_time=0,
+                                         fits={'fit_stiffness':{'probe_diameter':5e-6}})
+    #the first poll only records the size of each file
+    assert watcher.poll()==[]
+    assert watcher.poll()==[('0','0'),('0','1')]
+    assert watcher.errors=={}
+    for key in watcher.curveset.keys():
+        assert watcher.curveset[key].contact_index
+        assert watcher.curveset[key].stiff_fit['estar']>0
+    write_curve_ibw(os.path.join(folder,'Sample0Measurement2.ibw'),seed=2)
+    watcher.poll()
+    assert watcher.poll()==[('0','2')]
@@ -0,0 +1,36 @@
+import numpy as np
+from synthetic import make_curve,make_curveset
+
+def test_detect_contact_index():
+    curve=make_curve()
+    contact_index,confidence=curve.detect_contact_index()
+    assert abs(contact_index-1200)<=5
+    assert confidence>0.99
+    assert curve.contact_confidence==confidence
+
+def test_detect_contact_points_unannotated():
+    #pyrtz.annocp stores curves which have not been annotated as 0
+    curve_set=make_curveset()
+    curve_set.update_cp_annotations({key:0 for key in curve_set})
+    results=curve_set.detect_contact_points(overwrite=False)
+    assert np.all(np.abs(results['contact_index'].to_numpy()-1200)<=5)
+    assert not results['needs_review'].any()
+
+def test_detect_contact_points_keeps_annotations():
+    curve_set=make_curveset()
+    curve_set.update_cp_annotations({key:1000 for key in curve_set})
+    results=curve_set.detect_contact_points(overwrite=False)
+    assert np.all(results['contact_index']==1000)
+    #no confidence is known for these curves
+    assert results['needs_review'].all()
+
+def test_detect_contact_points_failure():
+    curve_set=make_curveset(n_samples=1,n_measurements=2)
+    keys=curve_set.keys()
+    curve_set[keys[0]].contact_confidence=0.5
+    curve_set[keys[0]].data.loc[:,'f']=np.nan
+    results=curve_set.detect_contact_points()
+    assert curve_set[keys[0]].contact_confidence==0
+    assert results.loc[0,'contact_confidence']==0
+    assert results.loc[0,'needs_review']
+    assert not results.loc[1,'needs_review']
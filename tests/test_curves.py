@@ -0,0 +1,167 @@
+import pytest
+import numpy as np
+import pyrtz.curves
+from synthetic import make_curve,make_curveset
+from test_fitting import scipy_hertz_fit,r
+
+def annotated_curveset(**kwargs):
+    curve_set=make_curveset(**kwargs)
+    curve_set.update_cp_annotations({key:1200 for key in curve_set})
+    curve_set.correct_virt_defl()
+    return curve_set
+
+def test_fit_stiffness_matches_curve_fit():
+    curve=make_curve()
+    curve.contact_index=1200
+    curve.correct_virt_defl()
+    curve.fit_stiffness(2*r,[0.1,0.9])
+    approach_end=curve.dwell_range[0]+1
+    estar,estar_err,n_points=scipy_hertz_fit(curve.get_array('ind')[:approach_end],curve.get_array('f')[:approach_end],1200,[0.1,0.9])
+    np.testing.assert_allclose(curve.stiff_fit['estar'],estar,rtol=1e-6)
+    np.testing.assert_allclose(curve.stiff_fit['estar_err'],estar_err,rtol=1e-4)
+    assert curve.stiff_fit['fit_stop']-curve.stiff_fit['fit_start']==n_points
+
+def test_fit_all_stiff_matches_fit_stiffness(monkeypatch):
+    #use several blocks
+    monkeypatch.setattr(pyrtz.curves,'stiff_fit_block',4)
+    curve_set=annotated_curveset(n_measurements=5)
+    curve_set.fit_all_stiff(2*r,[0,1])
+    results=curve_set.get_stiff_results()
+    for i,key in enumerate(curve_set.keys()):
+        fit=curve_set[key].stiff_fit
+        curve_set[key].fit_stiffness(2*r,[0,1])
+        assert fit['estar']==curve_set[key].stiff_fit['estar']
+        assert fit['estar_err']==curve_set[key].stiff_fit['estar_err']
+        assert results.loc[i,'estar']==fit['estar']
+
+def test_stiffness_fit_curve():
+    curve_set=annotated_curveset(n_samples=1,n_measurements=1)
+    curve_set.fit_all_stiff(2*r)
+    curve=curve_set[curve_set.keys()[0]]
+    fit=curve.stiff_fit
+    fit_curve=pyrtz.curves._stiff_fit_curve(curve)
+    assert len(fit_curve)==fit['fit_stop']-fit['fit_start']
+    #the synthetic curve follows the hertz model closely
+    rows=slice(1200+fit['fit_start'],1200+fit['fit_stop'])
+    np.testing.assert_allclose(fit_curve['ind'].to_numpy(),curve.get_array('ind')[rows])
+    np.testing.assert_allclose(fit_curve['f'].to_numpy(),curve.get_array('f')[rows],atol=2e-10)
+
+def test_fit_all_dwell_matches_fit_methods():
+    curve_set=annotated_curveset(n_samples=1,n_measurements=2)
+    curve_set.fit_all_biexponential()
+    curve_set.fit_all_exponential()
+    for key in curve_set.keys():
+        curve=make_curve(seed=int(key[1]),estar=1000.+10*int(key[1]))
+        curve.contact_index=1200
+        curve.correct_virt_defl()
+        curve.fit_biexponential()
+        curve.fit_exponential()
+        for name in ('tau1','tau2','A','C'):
+            assert curve.biexponential_fit[name]==curve_set[key].biexponential_fit[name]
+        for name in ('tau0','C0'):
+            assert curve.exponential_fit[name]==curve_set[key].exponential_fit[name]
+
+def test_share_matches_curves():
+    curve_set=make_curveset()
+    with curve_set.share('float32') as shared:
+        packed=pyrtz.curves.attach_shared_curves(shared.descriptor)
+        for i,key in enumerate(curve_set.keys()):
+            curve=curve_set[key]
+            assert shared.headers[i]['dwell_range']==list(curve.dwell_range)
+            for column in curve.data.columns:
+                np.testing.assert_array_equal(packed.views[i][column],curve.data[column].to_numpy().astype('float32'))
+
+def test_chunked_group_warm_start_matches_unchunked():
+    results=[]
+    for chunk_size in (None,1,4):
+        curve_set=annotated_curveset(n_measurements=4)
+        curve_set.fit_all_exponential(warm_start='group',chunk_size=chunk_size)
+        results.append([(curve_set[key].exponential_fit['tau0'],curve_set[key].exponential_fit['warm_start']) for key in curve_set.keys()])
+    assert results[1]==results[0]
+    assert results[2]==results[0]
+
+def test_chunked_table_strings_are_not_pickled(tmp_path):
+    curve_set=make_curveset()
+    table=curve_set.collate_curves(chunk_size=2,path=str(tmp_path/'table'))
+    j=table.columns.index('Sample')
+    assert np.load(table._file(0,j),allow_pickle=False).dtype.kind=='U'
+    assert list(table.to_dataframe()['Sample'])==list(curve_set.collate_curves()['Sample'])
+
+def test_select_keeps_curves_removed_from_parent():
+    sources={(str(s),str(m)):3*s+m for s in range(2) for m in range(3)}
+    curve_set=pyrtz.curves.CurveSet(['Sample','Measurement'],pyrtz.curves.LazyCurveDict(sources,make_curve,cache_size=2))
+    curve_set.update_cp_annotations({key:1200 for key in curve_set})
+    view=curve_set.select(Sample='1')
+    curve_set.remove_curve(('1','1'))
+    assert view[('1','1')].contact_index==1200
+    assert curve_set.select(Sample=['1','0'],Measurement=['2','0']).keys()==[('0','0'),('0','2'),('1','0'),('1','2')]
+
+def test_fit_all_dwell_raise_merges_nothing():
+    curve_set=annotated_curveset()
+    keys=curve_set.keys()
+    curve_set[keys[-1]].data['f']=np.nan
+    with pytest.raises(Exception):
+        curve_set.fit_all_exponential()
+    assert all(curve_set[key].exponential_fit is None for key in keys)
+
+def test_stiff_results_include_standard_error(tmp_path):
+    curve_set=annotated_curveset()
+    curve_set.fit_all_stiff(2*r)
+    estar_err=[curve_set[key].stiff_fit['estar_err'] for key in curve_set.keys()]
+    assert curve_set.get_stiff_results()['estar_err'].tolist()==estar_err
+    assert curve_set.get_all_results()['estar_err'].tolist()==estar_err
+    curve_set.save(str(tmp_path/'saved'))
+    reopened=pyrtz.curves.open_curveset(str(tmp_path/'saved'))
+    assert reopened.get_stiff_results()['estar_err'].tolist()==estar_err
+
+def test_fit_table_reads_curves_only_after_direct_fits(monkeypatch):
+    curve_set=annotated_curveset()
+    curve_set.fit_all_stiff(2*r)
+    curve_set.get_stiff_results()
+    reads=[]
+    get_curve_attribute=curve_set.get_curve_attribute
+    monkeypatch.setattr(curve_set,'get_curve_attribute',lambda key,attribute:reads.append(key) or get_curve_attribute(key,attribute))
+    curve_set.get_stiff_results()
+    assert reads==[]
+    key=curve_set.keys()[0]
+    curve_set[key].fit_stiffness(2*r,[0.2,0.8])
+    results=curve_set.get_stiff_results()
+    assert results['estar'][0]==curve_set[key].stiff_fit['estar']
+    #only the curve which was fit directly is read again
+    assert reads==[key]
+    #fits on the curves of another CurveSet do not resync this one
+    other=annotated_curveset(n_samples=1,n_measurements=1)
+    other[other.keys()[0]].fit_stiffness(2*r)
+    curve_set.get_stiff_results()
+    assert reads==[key]
+
+def test_normalize_curves_skips_all_nan_force():
+    curve_set=make_curveset()
+    keys=curve_set.keys()
+    curve_set[keys[0]].data['f']=np.nan
+    normalized=curve_set.normalize_curves()
+    assert len(normalized)==sum(len(curve_set[key].data) for key in keys[1:])
+    assert not normalized['Measurement'][normalized['Sample']=='0'].eq('0').any()
+
+def test_get_trajectories_uses_each_group_span_and_fine_dt():
+    size=dict(n_approach=200,contact_index=120,n_dwell=100)
+    curve_dict={('0','0'):make_curve(seed=0,n_retract=150,**size),('1','0'):make_curve(seed=1,n_retract=50,**size)}
+    curve_set=pyrtz.curves.CurveSet(['Sample','Measurement'],curve_dict)
+    trajectories=curve_set.get_trajectories('Sample',dt=5e-5,round_dec=6)
+    median=trajectories[trajectories['metric']=='median']
+    for sample,curve in (('0',curve_dict[('0','0')]),('1',curve_dict[('1','0')])):
+        times=median.loc[median['Sample']==sample,'t_norm'].to_numpy()
+        t=curve.get_array('t')-curve.get_array('t')[np.argmax(curve.get_array('f'))]
+        np.testing.assert_allclose([times[0],times[-1]],[t[0],t[-1]],atol=5e-5)
+        np.testing.assert_allclose(np.diff(times),5e-5,atol=1e-6)
+
+def test_save_keeps_boolean_fit_parameters(tmp_path):
+    curve_set=annotated_curveset()
+    keys=curve_set.keys()
+    curve_set.subset(keys[1:]).fit_all_exponential(warm_start='group')
+    curve_set.save(str(tmp_path/'saved'))
+    reopened=pyrtz.curves.open_curveset(str(tmp_path/'saved'))
+    for key in keys[1:]:
+        assert reopened[key].exponential_fit['warm_start'] is curve_set[key].exponential_fit['warm_start']
+    results=pyrtz.curves.read_fit_results(str(tmp_path/'saved'))
+    assert results['warm_start'].isna().tolist()==[True]+[False]*(len(keys)-1)
@@ -0,0 +1,122 @@
+import numpy as np
+import scipy.optimize
+import pyrtz.fitting
+from synthetic import make_curve
+
+r=2.5e-6
+
+def contact_region(seed=0,contact_index=1200):
+    curve=make_curve(seed=seed,contact_index=contact_index)
+    approach_end=curve.dwell_range[0]+1
+    return curve.get_array('ind')[:approach_end],curve.get_array('f')[:approach_end]
+
+def scipy_hertz_fit(indentation,force,contact_index,fit_range):
+    '''The original per-curve fit: hertz_window then scipy.optimize.curve_fit,
+    iterated to a tight tolerance'''
+
+    indent_norm=indentation[contact_index:]-indentation[contact_index]
+    force_norm=force[contact_index:]-force[contact_index]
+    imin,imax=pyrtz.fitting.hertz_window(force_norm,fit_range)
+    popt,pcov=scipy.optimize.curve_fit(lambda x,e_star: pyrtz.fitting.hertz_force(x,e_star,r),
+                                       indent_norm[imin:imax],force_norm[imin:imax],p0=[1000],
+                                       xtol=1e-14,ftol=1e-14,gtol=1e-14)
+    return popt[0],np.sqrt(pcov[0,0]),imax-imin
+
+def test_hertz_window():
+    force=np.array([0,1,3,2,4,5,10.])
+    rows=pyrtz.fitting.hertz_window(force,[0,0.25,0.5,1])
+    #the first row reaching each fraction of the final force
+    assert list(rows)==[0,2,5,6]
+
+def test_hertz_fit_segments_matches_curve_fit():
+    segments=[contact_region(seed) for seed in range(3)]
+    indent=[]
+    force=[]
+    expected=[]
+    for indentation,f in segments:
+        indent_norm=indentation[1200:]-indentation[1200]
+        force_norm=f[1200:]-f[1200]
+        imin,imax=pyrtz.fitting.hertz_window(force_norm,[0,1])
+        indent.append(indent_norm[imin:imax])
+        force.append(force_norm[imin:imax])
+        expected.append(scipy_hertz_fit(indentation,f,1200,[0,1]))
+    offsets=np.concatenate([[0],np.cumsum([len(a) for a in indent])])
+    estar,estar_err,sse=pyrtz.fitting.hertz_fit_segments(np.concatenate(indent),np.concatenate(force),offsets,r)
+    np.testing.assert_allclose(estar,[e[0] for e in expected],rtol=1e-6)
+    np.testing.assert_allclose(estar_err,[e[1] for e in expected],rtol=1e-4)
+
+def test_hertz_contact_sweep_matches_curve_fit():
+    indentation,force=contact_region()
+    candidates=np.arange(1180,1221,5)
+    for fit_range in ([0,1],[0.2,0.8]):
+        sweep=pyrtz.fitting.hertz_contact_sweep(indentation,force,candidates,r,fit_range)
+        for i,c in enumerate(candidates):
+            estar,estar_err,n_points=scipy_hertz_fit(indentation,force,c,fit_range)
+            assert sweep['n_points'][i]==n_points
+            np.testing.assert_allclose(sweep['estar'][i],estar,rtol=1e-6)
+            np.testing.assert_allclose(sweep['estar_err'][i],estar_err,rtol=1e-4)
+            #the residuals of the sweep's own estimate, summed directly
+            indent_norm=indentation[c:]-indentation[c]
+            force_norm=force[c:]-force[c]
+            imin,imax=pyrtz.fitting.hertz_window(force_norm,fit_range)
+            residual=force_norm[imin:imax]-pyrtz.fitting.hertz_force(indent_norm[imin:imax],sweep['estar'][i],r)
+            np.testing.assert_allclose(sweep['sse'][i],np.sum(residual**2),rtol=1e-12)
+
+def test_hertz_contact_sweep_blocks(monkeypatch):
+    indentation,force=contact_region()
+    candidates=np.array([1210,1190,1200,1185,1215])
+    sweep=pyrtz.fitting.hertz_contact_sweep(indentation,force,candidates,r)
+    monkeypatch.setattr(pyrtz.fitting,'contact_sweep_block',2)
+    blocked=pyrtz.fitting.hertz_contact_sweep(indentation,force,candidates,r)
+    for name in sweep:
+        np.testing.assert_allclose(blocked[name],sweep[name],rtol=1e-12)
+
+def test_hertz_range_sweep_matches_curve_fit():
+    indentation,force=contact_region()
+    fit_ranges=[[0,1],[0,0.5],[0.25,0.75],[0.5,1]]
+    sweep=pyrtz.fitting.hertz_range_sweep(indentation[1200:],force[1200:],fit_ranges,r)
+    for i,fit_range in enumerate(fit_ranges):
+        estar,estar_err,n_points=scipy_hertz_fit(indentation,force,1200,fit_range)
+        assert sweep['n_points'][i]==n_points
+        np.testing.assert_allclose(sweep['estar'][i],estar,rtol=1e-6)
+        np.testing.assert_allclose(sweep['estar_err'][i],estar_err,rtol=1e-4)
+
+def test_line_fit_segments_matches_polyfit():
+    rng=np.random.default_rng(0)
+    x=[rng.normal(size=n)+1e3 for n in (5,50,500)]
+    y=[3*a-2+rng.normal(size=len(a)) for a in x]
+    offsets=np.concatenate([[0],np.cumsum([len(a) for a in x])])
+    slope,intercept=pyrtz.fitting.line_fit_segments(np.concatenate(x),np.concatenate(y),offsets)
+    for i in range(len(x)):
+        expected=np.polyfit(x[i],y[i],1)
+        np.testing.assert_allclose([slope[i],intercept[i]],expected,rtol=1e-8)
+
+def dwell_region(seed=0):
+    curve=make_curve(seed=seed)
+    start,stop=curve.dwell_range[0],curve.dwell_range[1]+1
+    t=curve.get_array('t')[start:stop]
+    f=curve.get_array('f')[start:stop]
+    return t-t[0],f
+
+def test_fit_exponential_matches_curve_fit():
+    t,f=dwell_region()
+    fit=pyrtz.fitting.fit_exponential(t,f,f[0],5)
+    model=lambda t,tau0,C: pyrtz.fitting.exponential_model(t,f[0],tau0,C)
+    popt,pcov=scipy.optimize.curve_fit(model,t,f,p0=[5,f[-1]])
+    sse=np.sum((model(t,fit['tau0'],fit['C0'])-f)**2)
+    sse_scipy=np.sum((model(t,*popt)-f)**2)
+    #variable projection finds at least as good a minimum
+    assert sse<=sse_scipy*(1+1e-9)
+    np.testing.assert_allclose([fit['tau0'],fit['C0']],popt,rtol=1e-4)
+
+def test_fit_biexponential_matches_curve_fit():
+    t,f=dwell_region()
+    p0=[30,1,0.5,f[-1]]
+    fit=pyrtz.fitting.fit_biexponential(t,f,f[0],p0)
+    model=lambda t,tau1,tau2,A,C: pyrtz.fitting.biexponential_model(t,f[0],tau1,tau2,A,C)
+    popt,pcov=scipy.optimize.curve_fit(model,t,f,p0=p0,bounds=([0,0,0,-np.inf],[np.inf,np.inf,1,np.inf]))
+    sse=np.sum((model(t,fit['tau1'],fit['tau2'],fit['A'],fit['C'])-f)**2)
+    sse_scipy=np.sum((model(t,*popt)-f)**2)
+    assert sse<=sse_scipy*(1+1e-9)
+    #the synthetic relaxation has rates of 20/s and 2/s
+    np.testing.assert_allclose(sorted([fit['tau1'],fit['tau2']]),[2,20],rtol=0.05)